@@ -1,21 +1,26 @@
-import json
+import os
 import uuid
+from typing import Iterator
 
 from .editor import Command, OHEditor
 from .encoding import EncodingManager, with_encoding
 from .exceptions import ToolError
 from .file_cache import FileCache
-from .results import ToolResult
+from .results import ResultMode, ToolResult
 
-_GLOBAL_EDITOR = OHEditor()
+_GLOBAL_EDITOR = OHEditor(
+    encoding_cache_path=os.environ.get('OH_EDITOR_ENCODING_CACHE') or None
+)
 
 __all__ = [
     'Command',
     'OHEditor',
     'ToolError',
     'ToolResult',
+    'ResultMode',
     'FileCache',
     'file_editor',
+    'file_editor_stream',
     'EncodingManager',
     'with_encoding',
 ]
@@ -30,7 +35,7 @@ def _make_api_tool_result(tool_result: ToolResult) -> str:
     return tool_result.output
 
 
-def file_editor(
+def file_editor_stream(
     command: Command,
     path: str,
     file_text: str | None = None,
@@ -39,7 +44,18 @@ def file_editor(
     new_str: str | None = None,
     insert_line: int | None = None,
     enable_linting: bool = False,
-) -> str:
+    page_size: int | None = None,
+    cursor: str | None = None,
+    edits: list[dict[str, str]] | None = None,
+    patch: str | None = None,
+    result_mode: ResultMode = 'full',
+) -> Iterator[str]:
+    """Run a file editor command and yield its output envelope in chunks.
+
+    Joining the chunks gives the same output as `file_editor`, but the result is
+    serialized as the chunks are consumed, so writing them out one by one (e.g. to
+    a socket or a file) never holds a serialized copy of the whole result.
+    """
     result: ToolResult | None = None
     try:
         result = _GLOBAL_EDITOR(
@@ -51,6 +67,11 @@ def file_editor(
             new_str=new_str,
             insert_line=insert_line,
             enable_linting=enable_linting,
+            page_size=page_size,
+            cursor=cursor,
+            edits=edits,
+            patch=patch,
+            result_mode=result_mode,
         )
     except ToolError as e:
         result = ToolResult(error=e.message)
@@ -58,19 +79,42 @@ def file_editor(
     formatted_output_and_error = _make_api_tool_result(result)
     marker_id = uuid.uuid4().hex
 
-    def json_generator():
-        yield '{'
-        first = True
-        for key, value in result.to_dict().items():
-            if not first:
-                yield ','
-            first = False
-            yield f'"{key}": {json.dumps(value)}'
-        yield f', "formatted_output_and_error": {json.dumps(formatted_output_and_error)}'
-        yield '}'
+    yield f'<oh_aci_output_{marker_id}>\n'
+    yield from result.iter_json(
+        {'formatted_output_and_error': formatted_output_and_error}
+    )
+    yield f'\n</oh_aci_output_{marker_id}>'
+
 
-    return (
-        f'<oh_aci_output_{marker_id}>\n'
-        + ''.join(json_generator())
-        + f'\n</oh_aci_output_{marker_id}>'
+def file_editor(
+    command: Command,
+    path: str,
+    file_text: str | None = None,
+    view_range: list[int] | None = None,
+    old_str: str | None = None,
+    new_str: str | None = None,
+    insert_line: int | None = None,
+    enable_linting: bool = False,
+    page_size: int | None = None,
+    cursor: str | None = None,
+    edits: list[dict[str, str]] | None = None,
+    patch: str | None = None,
+    result_mode: ResultMode = 'full',
+) -> str:
+    return ''.join(
+        file_editor_stream(
+            command=command,
+            path=path,
+            file_text=file_text,
+            view_range=view_range,
+            old_str=old_str,
+            new_str=new_str,
+            insert_line=insert_line,
+            enable_linting=enable_linting,
+            page_size=page_size,
+            cursor=cursor,
+            edits=edits,
+            patch=patch,
+            result_mode=result_mode,
+        )
     )
@@ -1,2 +1,3 @@
 MAX_RESPONSE_LEN_CHAR: int = 16000
 SNIPPET_CONTEXT_WINDOW: int = 4
+DIRECTORY_PAGE_SIZE: int = 200
@@ -0,0 +1,296 @@
+"""In-memory cache of decoded file contents and their line offsets."""
+
+import codecs
+import os
+from array import array
+from itertools import accumulate, count, islice
+from operator import add
+from pathlib import Path
+from typing import Tuple
+
+from cachetools import LRUCache
+
+# (st_dev, st_ino, st_size, st_mtime_ns, encoding)
+ContentKey = Tuple[int, int, int, int, str]
+# (st_dev, st_ino, st_size, st_mtime_ns)
+FileKey = Tuple[int, int, int, int]
+
+# Stateful codecs can not be decoded starting from an arbitrary line
+_STATEFUL_CODEC_PREFIXES = ('iso2022', 'utf_7', 'hz')
+
+
+class FileContent:
+    """Decoded content of a file with a lazily built index of line start offsets."""
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, text: str):
+        self.text = text
+        self._line_starts: array | None = None
+
+    @property
+    def line_starts(self) -> array:
+        """Offsets of the first character of every line in `text`.
+
+        The offsets are computed in bulk from the lengths of the split lines rather
+        than by walking the content line by line. The array always has one more entry
+        than there are newlines; when the content ends with a newline, the last entry
+        points at the (empty) remainder after it.
+        """
+        if self._line_starts is None:
+            text = self.text
+            line_starts = array('q', [0])
+            # Split the text a chunk at a time so the lines of the whole text are
+            # never held at once; a line start is right after each newline
+            for offset in range(0, len(text), self.CHUNK_SIZE):
+                pieces = text[offset : offset + self.CHUNK_SIZE].split('\n')
+                line_starts.extend(
+                    map(
+                        add,
+                        islice(accumulate(map(len, pieces)), len(pieces) - 1),
+                        count(offset + 1),
+                    )
+                )
+            self._line_starts = line_starts
+        return self._line_starts
+
+    @property
+    def num_lines(self) -> int:
+        """Number of lines, counted the same way iterating over the file object would."""
+        num_lines = len(self.line_starts)
+        if not self.text or self.text.endswith('\n'):
+            num_lines -= 1
+        return num_lines
+
+    def get_line_offset(self, line: int) -> int:
+        """Get the offset of the first character of a 1-based line.
+
+        Returns the length of the content if it has fewer lines.
+        """
+        if line <= 1:
+            return 0
+        line_starts = self.line_starts
+        if line > len(line_starts):
+            return len(self.text)
+        return line_starts[line - 1]
+
+    def get_line_range(self, start_line: int, end_line: int) -> str:
+        """Get lines `start_line` to `end_line` (1-based, inclusive), newlines included."""
+        if end_line < start_line:
+            return ''
+        return self.text[
+            self.get_line_offset(start_line) : self.get_line_offset(end_line + 1)
+        ]
+
+
+class LineIndex:
+    """Byte offsets of the line starts of a file, built without decoding it.
+
+    This lets a line range be read and decoded on its own, so viewing part of a
+    large file does not require holding its whole decoded content in memory.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, line_starts: array, size: int):
+        self.line_starts = line_starts
+        self.size = size
+
+    @classmethod
+    def build(cls, path: Path) -> 'LineIndex | None':
+        """Scan the raw bytes of a file for newlines, one chunk at a time.
+
+        Returns None if the file contains carriage returns, since reading it in text
+        mode would translate them into extra line breaks.
+        """
+        line_starts = array('q', [0])
+        offset = 0
+        with open(path, 'rb') as f:
+            while chunk := f.read(cls.CHUNK_SIZE):
+                if b'\r' in chunk:
+                    return None
+                pieces = chunk.split(b'\n')
+                # A line starts right after each newline in the chunk
+                line_starts.extend(
+                    map(
+                        add,
+                        islice(accumulate(map(len, pieces)), len(pieces) - 1),
+                        count(offset + 1),
+                    )
+                )
+                offset += len(chunk)
+        return cls(line_starts, offset)
+
+    @property
+    def num_lines(self) -> int:
+        """Number of lines, counted the same way iterating over the file object would."""
+        num_lines = len(self.line_starts)
+        if self.line_starts[-1] == self.size:
+            num_lines -= 1
+        return num_lines
+
+    def get_line_offset(self, line: int) -> int:
+        """Get the byte offset of the first byte of a 1-based line."""
+        if line <= 1:
+            return 0
+        if line > len(self.line_starts):
+            return self.size
+        return self.line_starts[line - 1]
+
+    def read_line_range(
+        self, path: Path, start_line: int, end_line: int, encoding: str
+    ) -> str:
+        """Read and decode lines `start_line` to `end_line` (1-based, inclusive)."""
+        if end_line < start_line:
+            return ''
+        start = self.get_line_offset(start_line)
+        end = self.get_line_offset(end_line + 1)
+        with open(path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode(encoding)
+
+
+def supports_line_index(encoding: str) -> bool:
+    """Check whether lines of text in this encoding can be found by scanning bytes.
+
+    This holds when a newline is the single byte 0x0A and the codec is stateless,
+    which is the case for UTF-8, ASCII and the single- and double-byte legacy
+    encodings, but not for UTF-16/32 or EBCDIC code pages.
+    """
+    try:
+        codec_name = codecs.lookup(encoding).name
+        newline = '\n'.encode(encoding)
+    except (LookupError, UnicodeError):
+        return False
+    return newline == b'\n' and not codec_name.replace('-', '_').startswith(
+        _STATEFUL_CODEC_PREFIXES
+    )
+
+
+class ContentCache:
+    """Bounded LRU cache of decoded file contents, keyed by file identity.
+
+    Entries are keyed by (device, inode, size, mtime_ns, encoding), so a file that
+    changes on disk is simply looked up under a new key. Only the most recent entry
+    is kept for each path to avoid holding on to stale versions of large files.
+
+    Decoded content is only cached when a command had to decode the whole file
+    anyway. Counting lines and reading line ranges of files that are not cached use
+    a byte-level `LineIndex` instead, which costs 8 bytes per line.
+    """
+
+    # Default maximum number of cached characters across all entries
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+    # Default maximum number of cached line indexes
+    DEFAULT_MAX_LINE_INDEXES = 128
+
+    def __init__(self, max_size: int | None = None):
+        self._cache: LRUCache[ContentKey, FileContent] = LRUCache(
+            maxsize=max_size or self.DEFAULT_MAX_SIZE,
+            getsizeof=lambda content: max(len(content.text), 1),
+        )
+        self._keys_by_path: dict[str, ContentKey] = {}
+        self._line_indexes: LRUCache[FileKey, LineIndex | None] = LRUCache(
+            maxsize=self.DEFAULT_MAX_LINE_INDEXES
+        )
+
+    @staticmethod
+    def _make_key(stat: os.stat_result, encoding: str) -> ContentKey:
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, encoding)
+
+    def _get_line_index(self, key: ContentKey, path: Path) -> LineIndex | None:
+        file_key = key[:4]
+        if file_key not in self._line_indexes:
+            self._line_indexes[file_key] = LineIndex.build(path)
+        return self._line_indexes[file_key]
+
+    def _store(self, path: Path, key: ContentKey, content: FileContent) -> None:
+        path_str = str(path)
+        old_key = self._keys_by_path.pop(path_str, None)
+        if old_key is not None and old_key != key:
+            self._cache.pop(old_key, None)
+        try:
+            self._cache[key] = content
+        except ValueError:
+            # Content is larger than the whole cache
+            return
+        self._keys_by_path[path_str] = key
+
+    def get(
+        self, path: Path, encoding: str, stat: os.stat_result | None = None
+    ) -> FileContent:
+        """Get the decoded content of a file, reading it only if it changed on disk.
+
+        `stat` can be given to reuse a stat result the caller already has.
+        """
+        key = self._make_key(stat or os.stat(path), encoding)
+        content = self._cache.get(key)
+        if content is None:
+            with open(path, 'r', encoding=encoding) as f:
+                content = FileContent(f.read())
+            self._store(path, key, content)
+        return content
+
+    def count_lines(
+        self, path: Path, encoding: str, stat: os.stat_result | None = None
+    ) -> int:
+        """Count the lines of a file without decoding it, unless it is cached."""
+        stat = stat or os.stat(path)
+        key = self._make_key(stat, encoding)
+        content = self._cache.get(key)
+        if content is None and supports_line_index(encoding):
+            line_index = self._get_line_index(key, path)
+            if line_index is not None:
+                return line_index.num_lines
+        return self.get(path, encoding, stat).num_lines
+
+    def read_line_range(
+        self,
+        path: Path,
+        encoding: str,
+        start_line: int,
+        end_line: int,
+        stat: os.stat_result | None = None,
+    ) -> str:
+        """Read lines `start_line` to `end_line` (1-based, inclusive) of a file.
+
+        This is a slice of the cached content if there is one, otherwise only the
+        bytes of the requested lines are read and decoded.
+        """
+        stat = stat or os.stat(path)
+        key = self._make_key(stat, encoding)
+        content = self._cache.get(key)
+        if content is None and supports_line_index(encoding):
+            line_index = self._get_line_index(key, path)
+            if line_index is not None:
+                return line_index.read_line_range(path, start_line, end_line, encoding)
+        return self.get(path, encoding, stat).get_line_range(start_line, end_line)
+
+    def update(
+        self,
+        path: Path,
+        encoding: str,
+        content: FileContent,
+        stat: os.stat_result | None = None,
+    ) -> None:
+        """Record content that was just written to a file, so it is not read back."""
+        # Reading in text mode translates line endings, so content with carriage
+        # returns would not read back identically
+        if '\r' in content.text or os.linesep != '\n':
+            self.invalidate(path)
+            return
+        self._store(path, self._make_key(stat or os.stat(path), encoding), content)
+
+    def invalidate(self, path: Path) -> None:
+        """Drop the cached content of a file."""
+        key = self._keys_by_path.pop(str(path), None)
+        if key is not None:
+            self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._keys_by_path.clear()
+        self._line_indexes.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
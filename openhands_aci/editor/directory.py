@@ -0,0 +1,236 @@
+"""In-process directory listing used by the `view` command."""
+
+import base64
+import binascii
+import json
+import os
+from dataclasses import dataclass, field
+from itertools import chain, islice
+from pathlib import Path
+from typing import Iterator
+
+# (path, is_dir, path components relative to the root)
+WalkEntry = tuple[str, bool, tuple[str, ...]]
+
+
+@dataclass
+class DirectoryListing:
+    """Result of listing a directory tree, in the same order `find ... | sort` gives."""
+
+    # (path, is_dir) of every visible entry, starting with the root itself
+    entries: list[tuple[str, bool]] = field(default_factory=list)
+    # Number of hidden entries directly inside the root
+    hidden_count: int = 0
+    # Messages for directories that could not be read
+    errors: list[str] = field(default_factory=list)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a directory listing cursor can not be decoded."""
+
+
+def _is_hidden(name: str) -> bool:
+    return name.startswith('.')
+
+
+def _scan(path: str, errors: list[str]) -> list[os.DirEntry]:
+    try:
+        with os.scandir(path) as it:
+            return list(it)
+    except OSError as e:
+        errors.append(f'Cannot list {path}: {e.strerror}')
+        return []
+
+
+def _walk_sorted(
+    entries: list[os.DirEntry],
+    rel_parts: tuple[str, ...],
+    max_depth: int,
+    ancestors: frozenset[tuple[int, int]],
+    errors: list[str],
+    after: tuple[str, ...] = (),
+) -> Iterator[WalkEntry]:
+    """Yield the visible descendants of a directory in sorted full-path order.
+
+    Sorting full paths does not visit a directory right before its children (e.g.
+    `a-b` sorts between `a` and `a/b`), so each subdirectory is scheduled under the
+    key `name + '/'`, which is exactly where its whole subtree sorts among its
+    siblings.
+
+    If `after` is given, only entries that sort after that relative path are
+    yielded, and only the directories on the way to it are scanned again.
+    """
+    depth = len(rel_parts) + 1
+    tokens: list[tuple[str, os.DirEntry, bool]] = []
+    for entry in entries:
+        if _is_hidden(entry.name):
+            continue
+        tokens.append((entry.name, entry, False))
+        if depth < max_depth and entry.is_dir():
+            tokens.append((entry.name + '/', entry, True))
+    tokens.sort(key=lambda token: token[0])
+
+    for key, entry, is_subtree in tokens:
+        subtree_after: tuple[str, ...] = ()
+        if after:
+            if len(after) == 1:
+                # The entry itself was the last one listed, its subtree was not
+                if key <= after[0]:
+                    continue
+            elif key < after[0] + '/':
+                continue
+            elif key == after[0] + '/':
+                subtree_after = after[1:]
+
+        if not is_subtree:
+            yield entry.path, entry.is_dir(), rel_parts + (entry.name,)
+            continue
+
+        # Only symlinked directories can lead back to one of their ancestors
+        dir_ancestors = ancestors
+        if entry.is_symlink():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            dir_id = (stat.st_dev, stat.st_ino)
+            if dir_id in ancestors:
+                continue
+            dir_ancestors = ancestors | {dir_id}
+
+        yield from _walk_sorted(
+            _scan(entry.path, errors),
+            rel_parts + (entry.name,),
+            max_depth,
+            dir_ancestors,
+            errors,
+            subtree_after,
+        )
+
+
+class DirectoryWalk:
+    """A resumable walk over a directory tree, excluding hidden entries.
+
+    Symlinks are followed like `find -L` does, and each directory is marked using the
+    type information `os.scandir` already has. Symlinks that point back to one of
+    their ancestor directories are listed but not descended into.
+
+    Pages are taken from a single lazy walk, so listing a huge tree page by page
+    does not scan it again for every page. A walk can also be restarted from a
+    cursor, in which case only the directories leading to the cursor are rescanned.
+    """
+
+    def __init__(
+        self, path: Path, max_depth: int = 2, after: tuple[str, ...] | None = None
+    ):
+        """Start a walk.
+
+        Args:
+            path: The directory to list.
+            max_depth: How many levels below `path` to include.
+            after: Relative path components of the last entry already listed. If
+                None, the walk starts with the root directory itself.
+        """
+        self.path = path
+        self.max_depth = max_depth
+        self.errors: list[str] = []
+        self._last: tuple[str, ...] | None = after
+
+        root = str(path)
+        root_stat = os.stat(root)
+        root_entries = _scan(root, self.errors)
+        self.hidden_count = sum(1 for entry in root_entries if _is_hidden(entry.name))
+        walk = _walk_sorted(
+            root_entries,
+            (),
+            max_depth,
+            frozenset({(root_stat.st_dev, root_stat.st_ino)}),
+            self.errors,
+            after or (),
+        )
+        if after is None:
+            root_entry: WalkEntry = (root, True, ())
+            walk = chain([root_entry], walk)
+        self._walk = walk
+        # Entry read ahead by `has_more`
+        self._next: WalkEntry | None = None
+
+    def next_page(
+        self, page_size: int | None = None, max_chars: int | None = None
+    ) -> list[tuple[str, bool]]:
+        """Get the next `page_size` entries, or all remaining entries if None.
+
+        If `max_chars` is given, the page also ends before the entry that would make
+        its paths, one per line and with a slash after directories, longer than
+        that. The page always has at least one entry if the walk has any left.
+        """
+        page: list[WalkEntry] = []
+        if self._next is not None and page_size != 0:
+            page.append(self._next)
+            self._next = None
+        remaining = None if page_size is None else page_size - len(page)
+        if max_chars is None:
+            page.extend(islice(self._walk, remaining))
+        else:
+            chars = sum(len(p) + is_dir for p, is_dir, _ in page)
+            for entry in islice(self._walk, remaining):
+                chars += len(entry[0]) + entry[1] + (1 if page else 0)
+                if page and chars > max_chars:
+                    # Keep the entry for the next page
+                    self._next = entry
+                    break
+                page.append(entry)
+        if page:
+            self._last = page[-1][2]
+        return [(p, is_dir) for p, is_dir, _ in page]
+
+    @property
+    def has_more(self) -> bool:
+        """Whether the walk has entries left, looking ahead by at most one entry."""
+        if self._next is None:
+            self._next = next(self._walk, None)
+        return self._next is not None
+
+    @property
+    def cursor(self) -> str:
+        """An opaque token to resume the walk right after the last listed entry."""
+        payload = json.dumps([str(self.path), self.max_depth, self._last])
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @classmethod
+    def from_cursor(cls, path: Path, cursor: str) -> 'DirectoryWalk':
+        """Restart a walk of `path` from a cursor returned by an earlier walk."""
+        try:
+            root, max_depth, after = json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii'))
+            )
+        except (binascii.Error, UnicodeError, ValueError, TypeError) as e:
+            raise InvalidCursorError(f'The cursor could not be decoded: {e}') from None
+        if (
+            not isinstance(root, str)
+            or not isinstance(max_depth, int)
+            or isinstance(max_depth, bool)
+            or max_depth < 0
+            or not (
+                after is None
+                or (isinstance(after, list) and all(isinstance(p, str) for p in after))
+            )
+        ):
+            raise InvalidCursorError('The cursor could not be decoded.')
+        if root != str(path):
+            raise InvalidCursorError(f'The cursor was created for {root}, not {path}.')
+        return cls(path, max_depth, None if after is None else tuple(after))
+
+
+def list_directory(path: Path, max_depth: int = 2) -> DirectoryListing:
+    """List a whole directory tree up to `max_depth` levels deep, excluding hidden entries.
+
+    Args:
+        path: The directory to list.
+        max_depth: How many levels below `path` to include.
+    """
+    walk = DirectoryWalk(path, max_depth)
+    entries = walk.next_page()
+    return DirectoryListing(
+        entries=entries, hidden_count=walk.hidden_count, errors=walk.errors
+    )
@@ -0,0 +1,175 @@
+"""EBCDIC code pages as byte translation tables, and detection of EBCDIC text.
+
+The EBCDIC code pages used for z/OS sources (cp037, cp500 and cp1047) all map
+the 256 byte values one-to-one onto the first 256 code points, i.e. Latin-1.
+Decoding looks every byte up in a 256-character table, and encoding is a Latin-1
+encode followed by a `bytes.translate`, so both run in C over the whole buffer
+(encoding this way is about twice as fast as a charmap encode). cp1047 is not in
+the standard library, so it is registered as a codec when this module is imported.
+"""
+
+import codecs
+
+# Code pages in order of preference when a sample fits more than one of them
+EBCDIC_CODE_PAGES = ('cp1047', 'cp037', 'cp500')
+
+# cp1047 is cp037 with these characters moved
+_CP1047_CHANGES = {
+    0x5F: '^',
+    0xAD: '[',
+    0xB0: '¬',
+    0xBA: 'Ý',
+    0xBB: '¨',
+    0xBD: ']',
+}
+
+# Names that `codecs.lookup` resolves to the codecs defined here, with `-` and `_`
+# removed
+_CODEC_NAMES = {'cp1047': 'cp1047', 'ibm1047': 'cp1047', '1047': 'cp1047'}
+
+# Number of bytes at the start of a file that EBCDIC detection looks at
+DETECTION_SAMPLE_SIZE = 64 * 1024
+# Largest fraction of bytes of a sample that may be something other than
+# printable characters, tabs and line breaks for it to be taken as EBCDIC text
+MAX_NON_TEXT_RATIO = 0.05
+# Smallest fraction of bytes of a sample that must be EBCDIC spaces (0x40)
+MIN_SPACE_RATIO = 0.01
+
+
+def _characters(code_page: str) -> str:
+    """The characters of the 256 byte values of a code page."""
+    if code_page == 'cp1047':
+        characters = list(bytes(range(256)).decode('cp037'))
+        for byte, character in _CP1047_CHANGES.items():
+            characters[byte] = character
+        return ''.join(characters)
+    return bytes(range(256)).decode(code_page)
+
+
+_CHARACTERS = {code_page: _characters(code_page) for code_page in EBCDIC_CODE_PAGES}
+# Latin-1 byte -> EBCDIC byte of the same character
+_ENCODING_TABLES = {
+    code_page: bytes.maketrans(characters.encode('latin-1'), bytes(range(256)))
+    for code_page, characters in _CHARACTERS.items()
+}
+
+
+def is_ebcdic(encoding: str) -> bool:
+    """Check whether an encoding name is one of the EBCDIC code pages handled here."""
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    return name in EBCDIC_CODE_PAGES
+
+
+def decode(data: bytes | bytearray | memoryview, code_page: str) -> str:
+    """Decode EBCDIC bytes; every byte value has a character, so this never fails."""
+    return codecs.charmap_decode(data, 'strict', _CHARACTERS[code_page])[0]
+
+
+def encode(text: str, code_page: str, errors: str = 'strict') -> bytes:
+    """Encode text as EBCDIC; only characters up to U+00FF can be encoded."""
+    try:
+        # Error handlers only produce ASCII replacements, which are translated too
+        latin1 = text.encode('latin-1', errors)
+    except UnicodeEncodeError as e:
+        raise UnicodeEncodeError(
+            code_page, e.object, e.start, e.end, e.reason
+        ) from None
+    return latin1.translate(_ENCODING_TABLES[code_page])
+
+
+def _make_codec_info(code_page: str) -> codecs.CodecInfo:
+    class Codec(codecs.Codec):
+        def encode(self, input, errors='strict'):
+            return encode(input, code_page, errors), len(input)
+
+        def decode(self, input, errors='strict'):
+            return decode(input, code_page), len(input)
+
+    class IncrementalEncoder(codecs.IncrementalEncoder):
+        def encode(self, input, final=False):
+            return encode(input, code_page, self.errors)
+
+    class IncrementalDecoder(codecs.IncrementalDecoder):
+        # Every byte is a character, so no state is carried between chunks
+        def decode(self, input, final=False):
+            return decode(input, code_page)
+
+    class StreamWriter(Codec, codecs.StreamWriter):
+        pass
+
+    class StreamReader(Codec, codecs.StreamReader):
+        pass
+
+    return codecs.CodecInfo(
+        name=code_page,
+        encode=Codec().encode,
+        decode=Codec().decode,
+        incrementalencoder=IncrementalEncoder,
+        incrementaldecoder=IncrementalDecoder,
+        streamwriter=StreamWriter,
+        streamreader=StreamReader,
+    )
+
+
+def _search_codec(name: str) -> codecs.CodecInfo | None:
+    code_page = _CODEC_NAMES.get(name.lower().replace('-', '').replace('_', ''))
+    return _make_codec_info(code_page) if code_page else None
+
+
+codecs.register(_search_codec)
+
+
+def _byte_set(predicate) -> bytes:
+    return bytes(b for b in range(256) if predicate(b))
+
+
+# Bytes that are printable ASCII characters, tabs or line breaks in any of the
+# code pages
+_TEXT_BYTES = _byte_set(
+    lambda b: any(
+        ' ' <= characters[b] <= '~' or characters[b] in '\t\n\r\x85'
+        for characters in _CHARACTERS.values()
+    )
+)
+# Bytes that are different characters in some of the code pages
+_DISTINGUISHING_BYTES = _byte_set(
+    lambda b: len({characters[b] for characters in _CHARACTERS.values()}) > 1
+)
+_OTHER_BYTES = _byte_set(lambda b: b not in _DISTINGUISHING_BYTES)
+
+
+def detect_ebcdic(sample: bytes) -> str | None:
+    """Recognize EBCDIC text from the distribution of its bytes.
+
+    Text in any EBCDIC code page consists almost entirely of a known set of bytes
+    (letters and digits are above 0x80) and has spaces at 0x40, while ASCII text
+    and binary data have many bytes outside of that set. The code page is then chosen by the
+    bytes that the code pages map differently: the one that decodes the fewest of
+    them to characters outside of ASCII wins, e.g. cp1047 when brackets are at 0xAD
+    and 0xBD. Every step is a `bytes.translate` or `bytes.count` over the sample.
+
+    Only the first `DETECTION_SAMPLE_SIZE` bytes of the sample are looked at.
+    Returns:
+        The code page, or None if the sample does not look like EBCDIC text
+    """
+    sample = sample[:DETECTION_SAMPLE_SIZE]
+    if not sample:
+        return None
+    non_text = len(sample.translate(None, _TEXT_BYTES))
+    if non_text > len(sample) * MAX_NON_TEXT_RATIO:
+        return None
+    if sample.count(0x40) < len(sample) * MIN_SPACE_RATIO:
+        return None
+
+    # Keep only the bytes that tell the code pages apart, which are few
+    distinguishing = sample.translate(None, _OTHER_BYTES)
+    counts = {b: distinguishing.count(b) for b in set(distinguishing)}
+
+    def non_ascii_count(code_page: str) -> int:
+        characters = _CHARACTERS[code_page]
+        return sum(count for b, count in counts.items() if characters[b] > '~')
+
+    return min(EBCDIC_CODE_PAGES, key=non_ascii_count)
@@ -1,31 +1,38 @@
-import os
 import re
-import shutil
-import tempfile
+from bisect import bisect_right
+from fnmatch import fnmatchcase
 from pathlib import Path
 from typing import Literal, get_args
 
-from binaryornot.check import is_binary
+from cachetools import LRUCache
 
 from openhands_aci.linter import DefaultLinter
-from openhands_aci.utils.shell import run_shell_cmd
+from openhands_aci.utils.atomic_write import FSYNC_POLICIES, FsyncPolicy, atomic_write
+from openhands_aci.utils.diff import get_unified_diff
 
-from .config import SNIPPET_CONTEXT_WINDOW
+from .config import DIRECTORY_PAGE_SIZE, MAX_RESPONSE_LEN_CHAR, SNIPPET_CONTEXT_WINDOW
+from .content_cache import ContentCache, FileContent
+from .directory import DirectoryWalk, InvalidCursorError, list_directory
 from .encoding import EncodingManager, with_encoding
 from .exceptions import (
     EditorToolParameterInvalidError,
     EditorToolParameterMissingError,
     FileValidationError,
+    PatchApplyError,
     ToolError,
 )
+from .file_state import FileStates
 from .history import FileHistoryManager
 from .md_converter import MarkdownConverter  # type: ignore
+from .patch import apply_hunks, parse_patch
 from .prompts import (
     BINARY_FILE_CONTENT_TRUNCATED_NOTICE,
     DIRECTORY_CONTENT_TRUNCATED_NOTICE,
+    DIRECTORY_PAGE_CONTINUATION_NOTICE,
     TEXT_FILE_CONTENT_TRUNCATED_NOTICE,
 )
-from .results import CLIResult, maybe_truncate
+from .records import FixedRecordFile, detect_record_length
+from .results import CLIResult, ResultMode, maybe_truncate
 
 Command = Literal[
     'view',
@@ -33,6 +40,8 @@ Command = Literal[
     'str_replace',
     'insert',
     'undo_edit',
+    'multi_edit',
+    'apply_patch',
 ]
 
 
@@ -50,6 +59,7 @@ class OHEditor:
 
     TOOL_NAME = 'oh_editor'
     MAX_FILE_SIZE_MB = 10  # Maximum file size in MB
+    MAX_DIRECTORY_WALKS = 8  # Maximum number of paginated directory walks kept
     SUPPORTED_BINARY_EXTENSIONS = [
         # Office files
         '.docx',
@@ -67,6 +77,9 @@ class OHEditor:
         self,
         max_file_size_mb: int | None = None,
         workspace_root: str | None = None,
+        fsync_policy: FsyncPolicy = 'none',
+        encoding_cache_path: str | None = None,
+        record_lengths: dict[str, int] | None = None,
     ):
         """Initialize the editor.
 
@@ -75,6 +88,14 @@ class OHEditor:
             workspace_root: Root directory that serves as the current working directory for relative path
                            suggestions. Must be an absolute path. If None, no path suggestions will be
                            provided for relative paths.
+            fsync_policy: When to fsync while writing files: 'none', 'file' (the file content) or
+                          'file+dir' (the file content and its directory entry).
+            encoding_cache_path: Path of a database to keep detected file encodings in, so editors
+                                 in other processes can reuse them. If None, encodings are only
+                                 cached in memory.
+            record_lengths: Record lengths of files stored as fixed-length records, by path or
+                            glob pattern. EBCDIC files without line breaks are detected as
+                            80-byte records.
         """
         self._linter = DefaultLinter()
         self._history_manager = FileHistoryManager(max_history_per_file=10)
@@ -82,8 +103,30 @@ class OHEditor:
             (max_file_size_mb or self.MAX_FILE_SIZE_MB) * 1024 * 1024
         )  # Convert to bytes
 
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(
+                f'fsync_policy must be one of {", ".join(FSYNC_POLICIES)}, got: {fsync_policy}'
+            )
+        self._fsync_policy = fsync_policy
+
         # Initialize encoding manager
-        self._encoding_manager = EncodingManager()
+        self._encoding_manager = EncodingManager(
+            persistent_cache_path=encoding_cache_path
+        )
+
+        # Cache decoded file contents so repeated views and edits skip re-decoding
+        self._content_cache = ContentCache()
+
+        # Stat and sniff each path at most once while a command runs
+        self._file_states = FileStates()
+
+        # Files whose lines are fixed-length records
+        self._record_lengths = dict(record_lengths or {})
+
+        # Directory walks that can be continued with the cursor of their last page
+        self._directory_walks: LRUCache[str, DirectoryWalk] = LRUCache(
+            maxsize=self.MAX_DIRECTORY_WALKS
+        )
 
         # Initialize Markdown converter
         self._markdown_converter = MarkdownConverter()
@@ -111,45 +154,74 @@ class OHEditor:
         new_str: str | None = None,
         insert_line: int | None = None,
         enable_linting: bool = False,
+        page_size: int | None = None,
+        cursor: str | None = None,
+        edits: list[dict[str, str]] | None = None,
+        patch: str | None = None,
+        result_mode: ResultMode = 'full',
         **kwargs,
     ) -> CLIResult:
-        _path = Path(path)
-        self.validate_path(command, _path)
-        if command == 'view':
-            return self.view(_path, view_range)
-        elif command == 'create':
-            if file_text is None:
-                raise EditorToolParameterMissingError(command, 'file_text')
-            self.write_file(_path, file_text)
-            self._history_manager.add_history(_path, file_text)
-            return CLIResult(
-                path=str(_path),
-                new_content=file_text,
-                prev_exist=False,
-                output=f'File created successfully at: {_path}',
-            )
-        elif command == 'str_replace':
-            if old_str is None:
-                raise EditorToolParameterMissingError(command, 'old_str')
-            if new_str == old_str:
+        # Look up the metadata of every path at most once for the whole command
+        with self._file_states.scope():
+            _path = Path(path)
+            self.validate_path(command, _path)
+            if result_mode not in get_args(ResultMode):
                 raise EditorToolParameterInvalidError(
-                    'new_str',
-                    new_str,
-                    'No replacement was performed. `new_str` and `old_str` must be different.',
+                    'result_mode',
+                    result_mode,
+                    f'Allowed values are: {", ".join(get_args(ResultMode))}.',
+                )
+
+            if command == 'view':
+                result = self.view(
+                    _path, view_range, page_size=page_size, cursor=cursor
+                )
+            elif command == 'create':
+                if file_text is None:
+                    raise EditorToolParameterMissingError(command, 'file_text')
+                self.write_file(_path, file_text)
+                self._history_manager.add_history(_path, file_text)
+                result = CLIResult(
+                    path=str(_path),
+                    new_content=file_text,
+                    prev_exist=False,
+                    output=f'File created successfully at: {_path}',
+                )
+            elif command == 'str_replace':
+                if old_str is None:
+                    raise EditorToolParameterMissingError(command, 'old_str')
+                if new_str == old_str:
+                    raise EditorToolParameterInvalidError(
+                        'new_str',
+                        new_str,
+                        'No replacement was performed. `new_str` and `old_str` must be different.',
+                    )
+                result = self.str_replace(_path, old_str, new_str, enable_linting)
+            elif command == 'insert':
+                if insert_line is None:
+                    raise EditorToolParameterMissingError(command, 'insert_line')
+                if new_str is None:
+                    raise EditorToolParameterMissingError(command, 'new_str')
+                result = self.insert(_path, insert_line, new_str, enable_linting)
+            elif command == 'undo_edit':
+                result = self.undo_edit(_path, result_mode)
+            elif command == 'multi_edit':
+                if edits is None:
+                    raise EditorToolParameterMissingError(command, 'edits')
+                self.validate_edits(edits)
+                result = self.multi_edit(_path, edits, enable_linting)
+            elif command == 'apply_patch':
+                if patch is None:
+                    raise EditorToolParameterMissingError(command, 'patch')
+                result = self.apply_patch(_path, patch, enable_linting)
+            else:
+                raise ToolError(
+                    f'Unrecognized command {command}. The allowed commands for the {self.TOOL_NAME} tool are: {", ".join(get_args(Command))}'
                 )
-            return self.str_replace(_path, old_str, new_str, enable_linting)
-        elif command == 'insert':
-            if insert_line is None:
-                raise EditorToolParameterMissingError(command, 'insert_line')
-            if new_str is None:
-                raise EditorToolParameterMissingError(command, 'new_str')
-            return self.insert(_path, insert_line, new_str, enable_linting)
-        elif command == 'undo_edit':
-            return self.undo_edit(_path)
-
-        raise ToolError(
-            f'Unrecognized command {command}. The allowed commands for the {self.TOOL_NAME} tool are: {", ".join(get_args(Command))}'
-        )
+
+            if result_mode == 'diff':
+                result = result.to_diff_result()
+            return result
 
     @with_encoding
     def _count_lines(self, path: Path, encoding: str = 'utf-8') -> int:
@@ -163,8 +235,49 @@ class OHEditor:
         Returns:
             The number of lines in the file
         """
-        with open(path, encoding=encoding) as f:
-            return sum(1 for _ in f)
+        try:
+            return self._content_cache.count_lines(
+                path, encoding, self._file_states.get(path).stat
+            )
+        except Exception as e:
+            raise ToolError(f'Ran into {e} while trying to read {path}') from None
+
+    def _find_unique_occurrence(
+        self, path: Path, file_content: str, old_str: str, new_str: str
+    ) -> tuple[int, str, str]:
+        """
+        Find the single occurrence of old_str in the file content.
+
+        If old_str does not appear verbatim, it is looked up again with the white
+        spaces at either end removed, in which case new_str is stripped as well.
+
+        Returns:
+            The position of the occurrence and the (possibly stripped) old_str and new_str.
+        """
+        idx = file_content.find(old_str)
+        if idx == -1:
+            # We found no occurrences, possibly because of extra white spaces at either the front or back of the string.
+            # Remove the white spaces and try again.
+            old_str = old_str.strip()
+            new_str = new_str.strip()
+            idx = file_content.find(old_str)
+            if idx == -1:
+                raise ToolError(
+                    f'No replacement was performed, old_str `{old_str}` did not appear verbatim in {path}.'
+                )
+
+        # Occurrences can not overlap, the same way regex matches do not
+        if file_content.find(old_str, idx + max(len(old_str), 1)) != -1:
+            line_numbers = sorted(
+                set(
+                    file_content.count('\n', 0, match.start()) + 1
+                    for match in re.finditer(re.escape(old_str), file_content)
+                )
+            )
+            raise ToolError(
+                f'No replacement was performed. Multiple occurrences of old_str `{old_str}` in lines {line_numbers}. Please ensure it is unique.'
+            )
+        return idx, old_str, new_str
 
     @with_encoding
     def str_replace(
@@ -188,65 +301,33 @@ class OHEditor:
         self.validate_file(path)
         new_str = new_str or ''
 
-        # Read the entire file first to handle both single-line and multi-line replacements
-        file_content = self.read_file(path)
-
-        # Find all occurrences using regex
-        # Escape special regex characters in old_str to match it literally
-        pattern = re.escape(old_str)
-        occurrences = [
-            (
-                file_content.count('\n', 0, match.start()) + 1,  # line number
-                match.group(),  # matched text
-                match.start(),  # start position
-            )
-            for match in re.finditer(pattern, file_content)
-        ]
-
-        if not occurrences:
-            # We found no occurrences, possibly because of extra white spaces at either the front or back of the string.
-            # Remove the white spaces and try again.
-            old_str = old_str.strip()
-            new_str = new_str.strip()
-            pattern = re.escape(old_str)
-            occurrences = [
-                (
-                    file_content.count('\n', 0, match.start()) + 1,  # line number
-                    match.group(),  # matched text
-                    match.start(),  # start position
-                )
-                for match in re.finditer(pattern, file_content)
-            ]
-            if not occurrences:
-                raise ToolError(
-                    f'No replacement was performed, old_str `{old_str}` did not appear verbatim in {path}.'
-                )
-        if len(occurrences) > 1:
-            line_numbers = sorted(set(line for line, _, _ in occurrences))
-            raise ToolError(
-                f'No replacement was performed. Multiple occurrences of old_str `{old_str}` in lines {line_numbers}. Please ensure it is unique.'
-            )
+        # Read the entire file once; the new content, the snippet and the history
+        # entry are all derived from this in-memory buffer
+        record_file = self._get_record_file(path, encoding=encoding)
+        file_content = (
+            record_file.read_text()
+            if record_file
+            else self.read_file(path, encoding=encoding)
+        )
 
-        # We found exactly one occurrence
-        replacement_line, matched_text, idx = occurrences[0]
+        idx, old_str, new_str = self._find_unique_occurrence(
+            path, file_content, old_str, new_str
+        )
+        replacement_line = file_content.count('\n', 0, idx) + 1
 
         # Create new content by replacing just the matched text
         new_file_content = (
-            file_content[:idx] + new_str + file_content[idx + len(matched_text) :]
+            file_content[:idx] + new_str + file_content[idx + len(old_str) :]
         )
 
-        # Write the new content to the file
-        self.write_file(path, new_file_content)
+        # Write the new content to the file and save the old one to history
+        new_content = FileContent(new_file_content)
+        self._write_edit(path, file_content, new_content, encoding, record_file)
 
-        # Save the content to history
-        self._history_manager.add_history(path, file_content)
-
-        # Create a snippet of the edited section
+        # Create a snippet of the edited section from the in-memory content
         start_line = max(0, replacement_line - SNIPPET_CONTEXT_WINDOW)
         end_line = replacement_line + SNIPPET_CONTEXT_WINDOW + new_str.count('\n')
-
-        # Read just the snippet range
-        snippet = self.read_file(path, start_line=start_line + 1, end_line=end_line)
+        snippet = new_content.get_line_range(start_line + 1, end_line)
 
         # Prepare the success message
         success_message = f'The file {path} has been edited. '
@@ -268,38 +349,254 @@ class OHEditor:
             new_content=new_file_content,
         )
 
-    def view(self, path: Path, view_range: list[int] | None = None) -> CLIResult:
+    @with_encoding
+    def multi_edit(
+        self,
+        path: Path,
+        edits: list[dict[str, str]],
+        enable_linting: bool,
+        encoding: str = 'utf-8',
+    ) -> CLIResult:
+        """
+        Implement the multi_edit command, which applies several replacements to the file content at once.
+
+        The edits are applied in order, each to the result of the previous ones, and
+        each old_str must be unique in the content it is applied to. Either all edits
+        are applied with a single write, or the file is left untouched.
+
+        Args:
+            path: Path to the file
+            edits: The replacements to make, as dicts with `old_str` and `new_str`
+            enable_linting: Whether to run linting on the changes
+            encoding: The encoding to use (auto-detected by decorator)
+        """
+        self.validate_file(path)
+        record_file = self._get_record_file(path, encoding=encoding)
+        file_content = (
+            record_file.read_text()
+            if record_file
+            else self.read_file(path, encoding=encoding)
+        )
+
+        new_file_content = file_content
+        # Spans of the content that were changed, in positions of new_file_content
+        edited_spans: list[tuple[int, int]] = []
+        for i, edit in enumerate(edits, start=1):
+            try:
+                idx, old_str, new_str = self._find_unique_occurrence(
+                    path, new_file_content, edit['old_str'], edit.get('new_str') or ''
+                )
+            except ToolError as e:
+                raise ToolError(
+                    f'Edit {i} of {len(edits)} failed, so none of the edits were applied. {e.message}'
+                ) from None
+            new_file_content = (
+                new_file_content[:idx]
+                + new_str
+                + new_file_content[idx + len(old_str) :]
+            )
+
+            # Shift the spans of earlier edits and merge those this edit touches
+            old_end = idx + len(old_str)
+            delta = len(new_str) - len(old_str)
+            span_start, span_end = idx, idx + len(new_str)
+            shifted_spans = []
+            for start, end in edited_spans:
+                if end < idx:
+                    shifted_spans.append((start, end))
+                elif start > old_end:
+                    shifted_spans.append((start + delta, end + delta))
+                else:
+                    span_start = min(span_start, start)
+                    span_end = max(span_end, end + delta if end > old_end else 0)
+            shifted_spans.append((span_start, span_end))
+            edited_spans = shifted_spans
+
+        if new_file_content == file_content:
+            raise ToolError(
+                f'No replacement was performed. The edits did not change the content of {path}.'
+            )
+
+        # Write the new content to the file and save the old one to history
+        new_content = FileContent(new_file_content)
+        self._write_edit(path, file_content, new_content, encoding, record_file)
+
+        # Turn the edited spans into line ranges with some context, merging those that overlap
+        line_starts = new_content.line_starts
+        line_ranges: list[list[int]] = []
+        for start, end in sorted(edited_spans):
+            first_line = bisect_right(line_starts, start) - SNIPPET_CONTEXT_WINDOW
+            last_line = bisect_right(line_starts, end) + SNIPPET_CONTEXT_WINDOW
+            first_line = max(1, first_line)
+            if line_ranges and first_line <= line_ranges[-1][1] + 1:
+                line_ranges[-1][1] = max(line_ranges[-1][1], last_line)
+            else:
+                line_ranges.append([first_line, last_line])
+
+        success_message = f'The file {path} has been edited with {len(edits)} edits. '
+        for first_line, last_line in line_ranges:
+            snippet = new_content.get_line_range(first_line, last_line)
+            success_message += self._make_output(
+                snippet, f'a snippet of {path}', first_line
+            )
+
+        if enable_linting:
+            # Run linting on the changes
+            lint_results = self._run_linting(file_content, new_file_content, path)
+            success_message += '\n' + lint_results + '\n'
+
+        success_message += 'Review the changes and make sure they are as expected. Edit the file again if necessary.'
+        return CLIResult(
+            output=success_message,
+            prev_exist=True,
+            path=str(path),
+            old_content=file_content,
+            new_content=new_file_content,
+        )
+
+    def apply_patch(self, root: Path, patch: str, enable_linting: bool) -> CLIResult:
+        """
+        Implement the apply_patch command, which applies a unified diff to files under a directory.
+
+        Every hunk is applied in memory first and the files are only written once the
+        whole patch applies, so a patch that does not apply leaves all files untouched.
+
+        Args:
+            root: Directory that the paths in the patch are relative to
+            patch: The unified diff to apply
+            enable_linting: Whether to run linting on the changes
+        """
+        file_patches = parse_patch(patch)
+        if not file_patches:
+            raise ToolError('No changes were made. The patch does not change any file.')
+
+        # (path, encoding, old content or None for new files, new content, notes)
+        changes: list[tuple[Path, str, str | None, str, list[str]]] = []
+        for file_patch in file_patches:
+            relative_path = Path(file_patch.path)
+            if relative_path.is_absolute() or '..' in relative_path.parts:
+                raise PatchApplyError(
+                    file_patch.path,
+                    'paths in the patch must be relative to the given directory and can not contain `..`.',
+                )
+            path = root / relative_path
+            if any(path == changed_path for changed_path, *_ in changes):
+                raise PatchApplyError(
+                    file_patch.path, 'the patch changes this file more than once.'
+                )
+
+            old_content: str | None
+            file_state = self._file_states.get(path)
+            if file_patch.is_new:
+                if file_state.exists:
+                    raise PatchApplyError(
+                        file_patch.path, f'the file already exists at {path}.'
+                    )
+                encoding = self._encoding_manager.default_encoding
+                old_content = None
+            else:
+                if not file_state.is_file:
+                    raise PatchApplyError(
+                        file_patch.path, f'there is no file at {path}.'
+                    )
+                if self.is_supported_binary_file(path):
+                    raise PatchApplyError(
+                        file_patch.path, 'binary files can not be patched.'
+                    )
+                self.validate_file(path)
+                encoding = self._encoding_manager.get_encoding(path, file_state)
+                old_content = self.read_file(path, encoding=encoding)
+
+            new_content, notes = apply_hunks(
+                file_patch.path, old_content or '', file_patch.hunks
+            )
+            changes.append((path, encoding, old_content, new_content, notes))
+
+        # Everything applies, so write all files; if a write still fails, restore
+        # the files written before it
+        written: list[tuple[Path, str, str | None]] = []
+        try:
+            for path, encoding, old_content, new_content, _ in changes:
+                if old_content is None:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                self.write_file(path, FileContent(new_content), encoding=encoding)
+                written.append((path, encoding, old_content))
+        except Exception:
+            for path, encoding, old_content in written:
+                if old_content is None:
+                    path.unlink(missing_ok=True)
+                    self._file_states.invalidate(path)
+                else:
+                    self.write_file(path, old_content, encoding=encoding)
+            raise
+
+        success_message = (
+            f'The patch has been applied to {len(changes)} files under {root}:\n'
+        )
+        for path, _, old_content, new_content, notes in changes:
+            # Save the content to history, the same way `create` does for new files
+            self._history_manager.add_history(
+                path, new_content if old_content is None else old_content
+            )
+            action = 'created' if old_content is None else 'edited'
+            details = f': {"; ".join(notes)}' if notes else ''
+            success_message += f'- {path} ({action}{details})\n'
+
+        if enable_linting:
+            for path, _, old_content, new_content, _ in changes:
+                # Run linting on the changes
+                lint_results = self._run_linting(old_content or '', new_content, path)
+                success_message += f'\n{path}: {lint_results}\n'
+
+        success_message += 'Review the changes and make sure they are as expected. Edit the files again if necessary.'
+        return CLIResult(
+            output=success_message,
+            prev_exist=True,
+            path=str(root),
+        )
+
+    def view(
+        self,
+        path: Path,
+        view_range: list[int] | None = None,
+        page_size: int | None = None,
+        cursor: str | None = None,
+    ) -> CLIResult:
         """
         View the contents of a file or a directory.
+
+        Directories can be listed page by page by passing `page_size` and then the
+        `cursor` returned with each page.
         """
-        if path.is_dir():
+        if self._file_states.get(path).is_dir:
             if view_range:
                 raise EditorToolParameterInvalidError(
                     'view_range',
                     view_range,
                     'The `view_range` parameter is not allowed when `path` points to a directory.',
                 )
+            if page_size is not None or cursor is not None:
+                return self._view_directory_page(path, page_size, cursor)
 
-            # First count hidden files/dirs in current directory only
-            # -mindepth 1 excludes . and .. automatically
-            _, hidden_stdout, _ = run_shell_cmd(
-                rf"find -L {path} -mindepth 1 -maxdepth 1 -name '.*'"
-            )
-            hidden_count = (
-                len(hidden_stdout.strip().split('\n')) if hidden_stdout.strip() else 0
-            )
+            listing = list_directory(path, max_depth=2)
+            is_dir_by_path = dict(listing.entries)
 
-            # Then get files/dirs up to 2 levels deep, excluding hidden entries at both depth 1 and 2
-            _, stdout, stderr = run_shell_cmd(
-                rf"find -L {path} -maxdepth 2 -not \( -path '{path}/\.*' -o -path '{path}/*/\.*' \) | sort",
+            # Lay the listing out like `find` output, so truncation happens at the same place
+            stdout = maybe_truncate(
+                ''.join(f'{p}\n' for p, _ in listing.entries),
                 truncate_notice=DIRECTORY_CONTENT_TRUNCATED_NOTICE,
             )
+            stderr = maybe_truncate(''.join(f'{e}\n' for e in listing.errors))
             if not stderr:
                 # Add trailing slashes to directories
                 paths = stdout.strip().split('\n') if stdout.strip() else []
                 formatted_paths = []
                 for p in paths:
-                    if Path(p).is_dir():
+                    is_dir = is_dir_by_path.get(p)
+                    if is_dir is None:
+                        # The last path may have been cut short by truncation
+                        is_dir = Path(p).is_dir()
+                    if is_dir:
                         formatted_paths.append(f'{p}/')
                     else:
                         formatted_paths.append(p)
@@ -308,9 +605,9 @@ class OHEditor:
                     f"Here's the files and directories up to 2 levels deep in {path}, excluding hidden items:\n"
                     + '\n'.join(formatted_paths)
                 ]
-                if hidden_count > 0:
+                if listing.hidden_count > 0:
                     msg.append(
-                        f"\n{hidden_count} hidden files/directories in this directory are excluded. You can use 'ls -la {path}' to see them."
+                        f"\n{listing.hidden_count} hidden files/directories in this directory are excluded. You can use 'ls -la {path}' to see them."
                     )
                 stdout = '\n'.join(msg)
             return CLIResult(
@@ -320,11 +617,16 @@ class OHEditor:
                 prev_exist=True,
             )
 
-        # Validate file and count lines
-        self.validate_file(path)
+        if page_size is not None or cursor is not None:
+            raise EditorToolParameterInvalidError(
+                'page_size' if page_size is not None else 'cursor',
+                page_size if page_size is not None else cursor,
+                'The `page_size` and `cursor` parameters are only allowed when `path` points to a directory.',
+            )
 
         # Handle supported binary files
         if self.is_supported_binary_file(path):
+            self.validate_file(path)
             file_content = self.read_file_markdown(path)
             return CLIResult(
                 output=self._make_output(
@@ -334,6 +636,15 @@ class OHEditor:
                 prev_exist=True,
             )
 
+        # A range of fixed-length records is read by slicing the file, so it can be
+        # viewed however large the file is
+        self.validate_file(path, check_size=False)
+        record_file = self._get_record_file(path)
+        if record_file is None or not view_range:
+            self.validate_file(path)
+        if record_file is not None:
+            return self._view_records(path, record_file, view_range)
+
         num_lines = self._count_lines(path)
 
         start_line = 1
@@ -347,6 +658,35 @@ class OHEditor:
                 prev_exist=True,
             )
 
+        start_line, end_line, warning_message = self._normalize_view_range(
+            view_range, num_lines
+        )
+        file_content = self.read_file(path, start_line=start_line, end_line=end_line)
+
+        # Get the detected encoding
+        output = self._make_output(
+            '\n'.join(file_content.splitlines()), str(path), start_line
+        )  # Remove extra newlines
+
+        # Prepend warning if we truncated the end_line
+        if warning_message:
+            output = f'NOTE: {warning_message}\n{output}'
+
+        return CLIResult(
+            path=str(path),
+            output=output,
+            prev_exist=True,
+        )
+
+    def _normalize_view_range(
+        self, view_range: list[int], num_lines: int
+    ) -> tuple[int, int, str | None]:
+        """
+        Check a view range against the number of lines of a file.
+
+        Returns:
+            The first and last line to show, and a warning if the range was cut short.
+        """
         if len(view_range) != 2 or not all(isinstance(i, int) for i in view_range):
             raise EditorToolParameterInvalidError(
                 'view_range',
@@ -376,26 +716,99 @@ class OHEditor:
                 view_range,
                 f'Its second element `{end_line}` should be greater than or equal to the first element `{start_line}`.',
             )
+        return start_line, end_line, warning_message
 
-        file_content = self.read_file(path, start_line=start_line, end_line=end_line)
-
-        # Get the detected encoding
-        output = self._make_output(
-            '\n'.join(file_content.splitlines()), str(path), start_line
-        )  # Remove extra newlines
+    def _view_records(
+        self, path: Path, record_file: FixedRecordFile, view_range: list[int] | None
+    ) -> CLIResult:
+        """
+        View a file of fixed-length records, showing every record as a line.
+        """
+        num_lines = record_file.num_records
+        if not view_range:
+            start_line, end_line, warning_message = 1, num_lines, None
+        else:
+            start_line, end_line, warning_message = self._normalize_view_range(
+                view_range, num_lines
+            )
+        try:
+            lines = record_file.read_lines(start_line, end_line)
+        except Exception as e:
+            raise ToolError(f'Ran into {e} while trying to read {path}') from None
 
-        # Prepend warning if we truncated the end_line
+        output = self._make_output('\n'.join(lines), str(path), start_line)
         if warning_message:
             output = f'NOTE: {warning_message}\n{output}'
-
         return CLIResult(
             path=str(path),
             output=output,
             prev_exist=True,
         )
 
+    def _view_directory_page(
+        self, path: Path, page_size: int | None, cursor: str | None
+    ) -> CLIResult:
+        """
+        View one page of a directory listing, continuing from `cursor` if given.
+        """
+        if page_size is None:
+            page_size = DIRECTORY_PAGE_SIZE
+        if not isinstance(page_size, int) or page_size < 1:
+            raise EditorToolParameterInvalidError(
+                'page_size', page_size, 'It should be a positive integer.'
+            )
+
+        errors_before = 0
+        if cursor is None:
+            walk = DirectoryWalk(path, max_depth=2)
+        else:
+            # Continue the walk that produced the cursor if we still have it,
+            # otherwise restart it from the position encoded in the cursor
+            cached_walk = self._directory_walks.pop(cursor, None)
+            if cached_walk is not None and cached_walk.path == path:
+                walk = cached_walk
+                errors_before = len(walk.errors)
+            else:
+                try:
+                    walk = DirectoryWalk.from_cursor(path, cursor)
+                except InvalidCursorError as e:
+                    raise EditorToolParameterInvalidError(
+                        'cursor', cursor, str(e)
+                    ) from None
+
+        # End the page early rather than truncating it, so no entry is skipped
+        entries = walk.next_page(page_size, max_chars=MAX_RESPONSE_LEN_CHAR)
+        # Looking ahead may scan the last listed directory, so do it before
+        # collecting the errors; a continued walk keeps those of earlier pages
+        has_more = walk.has_more
+        page_errors = walk.errors[errors_before:]
+        formatted_paths = [f'{p}/' if is_dir else p for p, is_dir in entries]
+        msg = [
+            f"Here's the files and directories up to 2 levels deep in {path}, excluding hidden items:\n"
+            + '\n'.join(formatted_paths)
+        ]
+        if cursor is None and walk.hidden_count > 0:
+            msg.append(
+                f"\n{walk.hidden_count} hidden files/directories in this directory are excluded. You can use 'ls -la {path}' to see them."
+            )
+        if has_more:
+            next_cursor = walk.cursor
+            self._directory_walks[next_cursor] = walk
+            msg.append(
+                '\n' + DIRECTORY_PAGE_CONTINUATION_NOTICE.format(cursor=next_cursor)
+            )
+
+        return CLIResult(
+            output='\n'.join(msg),
+            error=maybe_truncate('\n'.join(page_errors)) or None,
+            path=str(path),
+            prev_exist=True,
+        )
+
     @with_encoding
-    def write_file(self, path: Path, file_text: str, encoding: str = 'utf-8') -> None:
+    def write_file(
+        self, path: Path, file_text: str | FileContent, encoding: str = 'utf-8'
+    ) -> None:
         """
         Write the content of a file to a given path; raise a ToolError if an error occurs.
 
@@ -405,12 +818,25 @@ class OHEditor:
             encoding: The encoding to use when writing the file (auto-detected by decorator)
         """
         self.validate_file(path)
+        content = (
+            file_text if isinstance(file_text, FileContent) else FileContent(file_text)
+        )
         try:
-            # Use open with encoding instead of path.write_text
-            with open(path, 'w', encoding=encoding) as f:
-                f.write(file_text)
+            # Replace the file atomically so an interrupted write can not truncate it
+            atomic_write(path, content.text, encoding, fsync=self._fsync_policy)
         except Exception as e:
+            self._file_states.invalidate(path)
+            self._content_cache.invalidate(path)
             raise ToolError(f'Ran into {e} while trying to write to {path}') from None
+        # The file changed, so its metadata has to be looked up again
+        self._file_states.invalidate(path)
+
+        # Keep the written content and its encoding so the next command does not
+        # have to read the file back or detect its encoding again
+        file_state = self._file_states.get(path)
+        self._content_cache.update(path, encoding, content, file_state.stat)
+        if file_state.stat is not None:
+            self._encoding_manager.record_encoding(path, encoding, file_state.stat)
 
     @with_encoding
     def insert(
@@ -431,9 +857,16 @@ class OHEditor:
             enable_linting: Whether to run linting on the changes
             encoding: The encoding to use (auto-detected by decorator)
         """
-        # Validate file and count lines
+        # Validate file and read it once; everything below works on this buffer
         self.validate_file(path)
-        num_lines = self._count_lines(path)
+        record_file = self._get_record_file(path, encoding=encoding)
+        content = (
+            FileContent(record_file.read_text())
+            if record_file
+            else self._read_content(path, encoding)
+        )
+        file_text = content.text
+        num_lines = content.num_lines
 
         if insert_line < 0 or insert_line > num_lines:
             raise EditorToolParameterInvalidError(
@@ -444,48 +877,26 @@ class OHEditor:
 
         new_str_lines = new_str.split('\n')
 
-        # Create temporary file for the new content
-        with tempfile.NamedTemporaryFile(
-            mode='w', encoding=encoding, delete=False
-        ) as temp_file:
-            # Copy lines before insert point and save them for history
-            history_lines = []
-            with open(path, 'r', encoding=encoding) as f:
-                for i, line in enumerate(f, 1):
-                    if i > insert_line:
-                        break
-                    temp_file.write(line)
-                    history_lines.append(line)
-
-            # Insert new content
-            for line in new_str_lines:
-                temp_file.write(line + '\n')
-
-            # Copy remaining lines and save them for history
-            with open(path, 'r', encoding=encoding) as f:
-                for i, line in enumerate(f, 1):
-                    if i <= insert_line:
-                        continue
-                    temp_file.write(line)
-                    history_lines.append(line)
-
-        # Move temporary file to original location
-        shutil.move(temp_file.name, path)
-
-        # Read just the snippet range
+        # Splice the new lines in right after line `insert_line`
+        insert_offset = content.get_line_offset(insert_line + 1)
+        new_file_text = ''.join(
+            [
+                file_text[:insert_offset],
+                ''.join(line + '\n' for line in new_str_lines),
+                file_text[insert_offset:],
+            ]
+        )
+
+        new_content = FileContent(new_file_text)
+        self._write_edit(path, file_text, new_content, encoding, record_file)
+
+        # Build the snippet from the in-memory content
         start_line = max(0, insert_line - SNIPPET_CONTEXT_WINDOW)
         end_line = min(
             num_lines + len(new_str_lines),
             insert_line + SNIPPET_CONTEXT_WINDOW + len(new_str_lines),
         )
-        snippet = self.read_file(path, start_line=start_line + 1, end_line=end_line)
-
-        # Save history - we already have the lines in memory
-        file_text = ''.join(history_lines)
-        self._history_manager.add_history(path, file_text)
-
-        # Read new content for result
-        new_file_text = self.read_file(path)
+        snippet = new_content.get_line_range(start_line + 1, end_line)
 
         success_message = f'The file {path} has been edited. '
         success_message += self._make_output(
@@ -535,20 +946,28 @@ class OHEditor:
             )
 
         # Check if path and command are compatible
-        if command == 'create' and path.exists():
+        file_state = self._file_states.get(path)
+        if command == 'create' and file_state.exists:
             raise EditorToolParameterInvalidError(
                 'path',
                 path,
                 f'File already exists at: {path}. Cannot overwrite files using command `create`.',
             )
-        if command != 'create' and not path.exists():
+        if command != 'create' and not file_state.exists:
             raise EditorToolParameterInvalidError(
                 'path',
                 path,
                 f'The path {path} does not exist. Please provide a valid path.',
             )
-        if command != 'view':
-            if path.is_dir():
+        if command == 'apply_patch':
+            if not file_state.is_dir:
+                raise EditorToolParameterInvalidError(
+                    'path',
+                    path,
+                    f'The path {path} is not a directory. The `apply_patch` command takes the directory that the paths in the patch are relative to.',
+                )
+        elif command != 'view':
+            if file_state.is_dir:
                 raise EditorToolParameterInvalidError(
                     'path',
                     path,
@@ -562,43 +981,91 @@ class OHEditor:
                     f'The path {path} points to a binary file ({path.suffix}) and only the `view` command can be used on supported binary files.',
                 )
 
-    def undo_edit(self, path: Path) -> CLIResult:
+    def validate_edits(self, edits: list[dict[str, str]]) -> None:
         """
-        Implement the undo_edit command.
+        Check that the edits of a multi_edit command are well-formed.
+        """
+        if not isinstance(edits, list) or not edits:
+            raise EditorToolParameterInvalidError(
+                'edits', edits, 'It should be a non-empty list of edits.'
+            )
+        for i, edit in enumerate(edits, start=1):
+            if (
+                not isinstance(edit, dict)
+                or not isinstance(edit.get('old_str'), str)
+                or not isinstance(edit.get('new_str'), (str, type(None)))
+            ):
+                raise EditorToolParameterInvalidError(
+                    'edits',
+                    edits,
+                    f'Edit {i} should be an object with a string `old_str` and an optional `new_str`.',
+                )
+            if edit.get('new_str') == edit['old_str']:
+                raise EditorToolParameterInvalidError(
+                    'edits',
+                    edits,
+                    f'`new_str` and `old_str` of edit {i} must be different.',
+                )
+
+    def undo_edit(self, path: Path, result_mode: ResultMode = 'full') -> CLIResult:
         """
-        current_text = self.read_file(path)
-        old_text = self._history_manager.pop_last_history(path)
-        if old_text is None:
-            raise ToolError(f'No edit history found for {path}.')
+        Implement the undo_edit command.
 
-        self.write_file(path, old_text)
+        In 'diff' result mode, the output shows the change that was undone instead of
+        the whole restored file.
+        """
+        record_file = self._get_record_file(path)
+        current_text = record_file.read_text() if record_file else self.read_file(path)
+
+        # A snapshot of the file is moved back in place, which writes nothing
+        old_text = self._history_manager.restore_snapshot(path)
+        if old_text is not None:
+            self._file_states.invalidate(path)
+            self._content_cache.invalidate(path)
+        else:
+            old_text = self._history_manager.pop_last_history(path)
+            if old_text is None:
+                raise ToolError(f'No edit history found for {path}.')
+            if record_file:
+                self._write_edited_file(
+                    path, FileContent(old_text), record_file.encoding, record_file
+                )
+            else:
+                self.write_file(path, old_text)
 
+        if result_mode == 'diff':
+            diff = get_unified_diff(current_text, old_text, str(path))
+            output = f'Last edit to {path} undone successfully. The changes that were undone:\n{maybe_truncate(diff)}'
+        else:
+            output = f'Last edit to {path} undone successfully. {self._make_output(old_text, str(path))}'
         return CLIResult(
-            output=f'Last edit to {path} undone successfully. {self._make_output(old_text, str(path))}',
+            output=output,
             path=str(path),
             prev_exist=True,
             old_content=current_text,
             new_content=old_text,
         )
 
-    def validate_file(self, path: Path) -> None:
+    def validate_file(self, path: Path, check_size: bool = True) -> None:
         """
         Validate a file for reading or editing operations.
 
         Args:
             path: Path to the file to validate
+            check_size: Whether to reject files larger than the maximum file size
 
         Raises:
             FileValidationError: If the file fails validation
         """
+        file_state = self._file_states.get(path)
         # Skip validation for directories or non-existent files (for create command)
-        if not path.exists() or not path.is_file():
+        if not file_state.is_file:
             return
 
         # Check file size
-        file_size = os.path.getsize(path)
+        file_size = file_state.size
         max_size = self._max_file_size
-        if file_size > max_size:
+        if check_size and file_size > max_size:
             raise FileValidationError(
                 path=str(path),
                 reason=f'File is too large ({file_size / 1024 / 1024:.1f}MB). Maximum allowed size is {int(max_size / 1024 / 1024)}MB.',
@@ -609,7 +1076,7 @@ class OHEditor:
             return
 
         # Check file type
-        if is_binary(str(path)):
+        if file_state.is_binary:
             raise FileValidationError(
                 path=str(path),
                 reason='File appears to be binary and this file type cannot be read or edited by this tool.',
@@ -633,28 +1100,111 @@ class OHEditor:
             encoding: The encoding to use when reading the file (auto-detected by decorator)
         """
         self.validate_file(path)
-        try:
-            if start_line is not None and end_line is not None:
-                # Read only the specified line range
-                lines = []
-                with open(path, 'r', encoding=encoding) as f:
-                    for i, line in enumerate(f, 1):
-                        if i > end_line:
-                            break
-                        if i >= start_line:
-                            lines.append(line)
-                return ''.join(lines)
-            elif start_line is not None or end_line is not None:
-                raise ValueError(
-                    'Both start_line and end_line must be provided together'
+        if (start_line is None) != (end_line is None):
+            raise ToolError(
+                f'Both start_line and end_line must be provided together while trying to read {path}'
+            )
+        if start_line is not None and end_line is not None:
+            # Read only the specified line range
+            try:
+                return self._content_cache.read_line_range(
+                    path,
+                    encoding,
+                    start_line,
+                    end_line,
+                    self._file_states.get(path).stat,
                 )
-            else:
-                # Use line-by-line reading to avoid loading entire file into memory
-                with open(path, 'r', encoding=encoding) as f:
-                    return ''.join(f)
+            except Exception as e:
+                raise ToolError(f'Ran into {e} while trying to read {path}') from None
+        return self._read_content(path, encoding).text
+
+    def _read_content(self, path: Path, encoding: str) -> FileContent:
+        """
+        Get the decoded content of a file from the content cache, reading the file
+        only if it changed since it was last read or written by this editor.
+        """
+        try:
+            return self._content_cache.get(
+                path, encoding, self._file_states.get(path).stat
+            )
         except Exception as e:
             raise ToolError(f'Ran into {e} while trying to read {path}') from None
 
+    @with_encoding
+    def _get_record_file(
+        self, path: Path, encoding: str = 'utf-8'
+    ) -> FixedRecordFile | None:
+        """
+        Get the records of a file if it is configured or detected as a file of fixed-length records.
+        """
+        file_state = self._file_states.get(path)
+        if not file_state.is_file:
+            return None
+        record_length = next(
+            (
+                length
+                for pattern, length in self._record_lengths.items()
+                if fnmatchcase(str(path), pattern)
+            ),
+            None,
+        )
+        try:
+            if record_length is None:
+                record_length = detect_record_length(path, file_state.size, encoding)
+            if record_length is None:
+                return None
+            return FixedRecordFile(path, file_state.size, record_length, encoding)
+        except OSError as e:
+            raise ToolError(f'Ran into {e} while trying to read {path}') from None
+        except ValueError as e:
+            raise ToolError(
+                f'Can not read {path} as fixed-length records: {e}'
+            ) from None
+
+    def _write_edited_file(
+        self,
+        path: Path,
+        content: FileContent,
+        encoding: str,
+        record_file: FixedRecordFile | None,
+    ) -> None:
+        """
+        Write edited content, padding its lines to records if the file has fixed-length records.
+        """
+        if record_file is None:
+            self.write_file(path, content, encoding=encoding)
+            return
+        try:
+            data = record_file.encode_text(content.text)
+        except ValueError as e:
+            raise ToolError(f'No edit was performed. {e}') from None
+        self.write_file(path, data.decode(encoding), encoding=encoding)
+
+    def _write_edit(
+        self,
+        path: Path,
+        old_text: str,
+        new_content: FileContent,
+        encoding: str,
+        record_file: FixedRecordFile | None,
+    ) -> None:
+        """
+        Write edited content and save the content before the edit to the history.
+
+        Where the history supports it, the file is snapshotted before it is written
+        instead of storing its content, and undoing the edit moves the snapshot back.
+        """
+        snapshot = None if record_file else self._history_manager.take_snapshot(path)
+        try:
+            self._write_edited_file(path, new_content, encoding, record_file)
+        except BaseException:
+            if snapshot is not None:
+                self._history_manager.discard_snapshot(snapshot)
+            raise
+        self._history_manager.add_history(
+            path, old_text, snapshot=snapshot, encoding=encoding
+        )
+
     def read_file_markdown(self, path: Path) -> str:
         try:
             result = self._markdown_converter.convert(str(path))
@@ -708,26 +1258,16 @@ class OHEditor:
         """
         Run linting on file changes and return formatted results.
         """
-        # Create a temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create paths with exact filenames in temp directory
-            temp_old = Path(temp_dir) / f'old.{path.name}'
-            temp_new = Path(temp_dir) / f'new.{path.name}'
-
-            # Write content to temporary files
-            temp_old.write_text(old_content)
-            temp_new.write_text(new_content)
+        # The contents are linted in memory, without writing them to disk
+        results = self._linter.lint_text_diff(str(path), old_content, new_content)
 
-            # Run linting on the changes
-            results = self._linter.lint_file_diff(str(temp_old), str(temp_new))
-
-            if not results:
-                return 'No linting issues found in the changes.'
+        if not results:
+            return 'No linting issues found in the changes.'
 
-            # Format results
-            output = ['Linting issues found in the changes:']
-            for result in results:
-                output.append(
-                    f'- Line {result.line}, Column {result.column}: {result.message}'
-                )
-            return '\n'.join(output) + '\n'
+        # Format results
+        output = ['Linting issues found in the changes:']
+        for result in results:
+            output.append(
+                f'- Line {result.line}, Column {result.column}: {result.message}'
+            )
+        return '\n'.join(output) + '\n'
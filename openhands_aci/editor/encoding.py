@@ -1,5 +1,6 @@
 """Encoding management for file operations."""
 
+import codecs
 import functools
 import os
 from pathlib import Path
@@ -8,26 +9,79 @@ from typing import Tuple
 import charset_normalizer
 from cachetools import LRUCache
 
+from .ebcdic import detect_ebcdic
+from .encoding_store import EncodingStore
+from .file_state import FileState
+
+# Byte order marks and the codecs that strip them when decoding. The UTF-32 marks
+# come first since the little-endian one starts with the UTF-16 one.
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
 
 class EncodingManager:
     """Manages file encodings across multiple operations to ensure consistency."""
 
     # Default maximum number of entries in the cache
     DEFAULT_MAX_CACHE_SIZE = 1000  # ~= 300 KB
+    # Number of bytes at the start of a file used to detect its encoding
+    SAMPLE_SIZE = 1024 * 1024
+    # Number of bytes decoded at once when checking whether the sample is UTF-8
+    UTF8_CHECK_CHUNK_SIZE = 64 * 1024
 
-    def __init__(self, max_cache_size=None):
+    def __init__(self, max_cache_size=None, persistent_cache_path=None):
         # Cache detected encodings to avoid repeated detection on the same file
         # Format: {path_str: (encoding, mtime)}
         self._encoding_cache: LRUCache[str, Tuple[str, float]] = LRUCache(
             maxsize=max_cache_size or self.DEFAULT_MAX_CACHE_SIZE
         )
+        # Optional on-disk cache, so other processes do not detect the same files again
+        self._encoding_store = (
+            EncodingStore(persistent_cache_path) if persistent_cache_path else None
+        )
         # Default fallback encoding
         self.default_encoding = 'utf-8'
         # Confidence threshold for encoding detection
         self.confidence_threshold = 0.9
 
+    @staticmethod
+    def _detect_bom(raw_data: bytes) -> str | None:
+        """Get the encoding given by the byte order mark of the data, if it has one."""
+        for bom, encoding in _BOMS:
+            if raw_data.startswith(bom):
+                return encoding
+        return None
+
+    def _is_utf8(self, raw_data: bytes, final: bool) -> bool:
+        """Check whether the data is valid UTF-8, a chunk at a time.
+
+        The decoder is incremental, so unless the data is the whole file (`final`), a
+        character cut off at its end is not an error. It stops at the first chunk
+        that is not valid UTF-8.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')('strict')
+        data = memoryview(raw_data)
+        try:
+            for offset in range(0, len(data), self.UTF8_CHECK_CHUNK_SIZE):
+                decoder.decode(data[offset : offset + self.UTF8_CHECK_CHUNK_SIZE])
+            decoder.decode(b'', final=final)
+        except UnicodeDecodeError:
+            return False
+        return True
+
     def detect_encoding(self, path: Path) -> str:
         """Detect the encoding of a file without handling caching logic.
+
+        A byte order mark decides the encoding if there is one. Otherwise a sample that
+        is valid UTF-8 (which includes ASCII) is taken as UTF-8, and one that has the
+        byte distribution of EBCDIC text is taken as the EBCDIC code page it fits best.
+        Only other samples go through the much slower statistical detection of
+        charset_normalizer, which does not know EBCDIC.
         Args:
             path: Path to the file
         Returns:
@@ -38,9 +92,18 @@ class EncodingManager:
             return self.default_encoding
 
         # Read a sample of the file to detect encoding
-        sample_size = min(os.path.getsize(path), 1024 * 1024)  # Max 1MB sample
         with open(path, 'rb') as f:
-            raw_data = f.read(sample_size)
+            file_size = os.fstat(f.fileno()).st_size
+            raw_data = f.read(min(file_size, self.SAMPLE_SIZE))
+
+        bom_encoding = self._detect_bom(raw_data)
+        if bom_encoding is not None:
+            return bom_encoding
+        if self._is_utf8(raw_data, final=file_size <= self.SAMPLE_SIZE):
+            return self.default_encoding
+        ebcdic_encoding = detect_ebcdic(raw_data)
+        if ebcdic_encoding is not None:
+            return ebcdic_encoding
 
         # Use charset_normalizer instead of chardet
         results = charset_normalizer.detect(raw_data)
@@ -57,20 +120,26 @@ class EncodingManager:
 
         return encoding
 
-    def get_encoding(self, path: Path) -> str:
+    def get_encoding(self, path: Path, file_state: FileState | None = None) -> str:
         """Get encoding for a file, using cache or detecting if necessary.
         Args:
             path: Path to the file
+            file_state: Already looked up metadata of the file, to avoid another stat
         Returns:
             The encoding for the file
         """
         path_str = str(path)
-        # If file doesn't exist, return default encoding
-        if not path.exists():
-            return self.default_encoding
+        if file_state is not None:
+            if not file_state.exists:
+                return self.default_encoding
+            current_mtime = file_state.mtime
+        else:
+            # If file doesn't exist, return default encoding
+            if not path.exists():
+                return self.default_encoding
 
-        # Get current modification time
-        current_mtime = os.path.getmtime(path)
+            # Get current modification time
+            current_mtime = os.path.getmtime(path)
 
         # Check cache for valid entry
         if path_str in self._encoding_cache:
@@ -78,13 +147,35 @@ class EncodingManager:
             if cached_mtime == current_mtime:
                 return cached_encoding
 
-        # No valid cache entry, detect encoding
-        encoding = self.detect_encoding(path)
+        # No valid cache entry, look it up in the on-disk cache or detect encoding
+        if self._encoding_store is not None:
+            stat = file_state.stat if file_state is not None else None
+            stat = stat or os.stat(path)
+            encoding = self._encoding_store.get(stat)
+            if encoding is None:
+                encoding = self.detect_encoding(path)
+                self._encoding_store.put(stat, encoding)
+        else:
+            encoding = self.detect_encoding(path)
 
         # Cache the result with current modification time
         self._encoding_cache[path_str] = (encoding, current_mtime)
         return encoding
 
+    def record_encoding(self, path: Path, encoding: str, stat: os.stat_result) -> None:
+        """Remember the encoding a file was just written with.
+
+        This keeps the cache entry valid across our own writes, which change the
+        modification time, so the file does not have to be detected again.
+        Args:
+            path: Path to the file
+            encoding: The encoding the file was written with
+            stat: The stat result of the file after writing it
+        """
+        self._encoding_cache[str(path)] = (encoding, stat.st_mtime)
+        if self._encoding_store is not None:
+            self._encoding_store.put(stat, encoding)
+
 
 def with_encoding(method):
     """Decorator to handle file encoding for file operations.
@@ -98,21 +189,24 @@ def with_encoding(method):
 
     @functools.wraps(method)
     def wrapper(self, path: Path, *args, **kwargs):
+        # Use the metadata the editor already looked up for this command, if any
+        file_states = getattr(self, '_file_states', None)
+        file_state = file_states.get(path) if file_states is not None else None
+        is_dir = file_state.is_dir if file_state is not None else path.is_dir()
+        exists = file_state.exists if file_state is not None else path.exists()
+
         # Skip encoding handling for directories
-        if path.is_dir():
+        if is_dir:
             return method(self, path, *args, **kwargs)
 
         # For files that don't exist yet (like in 'create' command),
         # use the default encoding
-        if not path.exists():
+        if not exists:
             if 'encoding' not in kwargs:
                 kwargs['encoding'] = self._encoding_manager.default_encoding
-        else:
+        elif 'encoding' not in kwargs:
             # Get encoding from the encoding manager for existing files
-            encoding = self._encoding_manager.get_encoding(path)
-            # Add encoding to kwargs if the method accepts it
-            if 'encoding' not in kwargs:
-                kwargs['encoding'] = encoding
+            kwargs['encoding'] = self._encoding_manager.get_encoding(path, file_state)
 
         return method(self, path, *args, **kwargs)
 
@@ -0,0 +1,112 @@
+"""Persistent cache of detected file encodings, shared between processes."""
+
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from .content_cache import FileKey
+
+logger = logging.getLogger(__name__)
+
+
+class EncodingStore:
+    """Detected encodings stored in a SQLite database, keyed by file version.
+
+    Entries are keyed by (device, inode, size, mtime_ns) instead of by path, so a
+    file that changed is simply looked up under a new key and a stale encoding is
+    never returned. The database uses write-ahead logging, so any number of
+    processes can read it while another one writes to it.
+
+    The store is only a cache: database and file system errors are logged and
+    treated as misses.
+    """
+
+    # Default maximum number of entries kept; the oldest ones are pruned first
+    DEFAULT_MAX_ENTRIES = 100_000
+    # Number of inserts between two prunes of the oldest entries
+    PRUNE_INTERVAL = 1000
+    # Seconds to wait for a lock held by another process
+    TIMEOUT = 1.0
+
+    def __init__(self, path: str | Path, max_entries: int | None = None):
+        self.path = Path(path)
+        self.max_entries = max_entries or self.DEFAULT_MAX_ENTRIES
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._inserts = 0
+
+    @staticmethod
+    def _make_key(stat: os.stat_result) -> FileKey:
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection can not be used by a forked child process, so open a new one
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS encodings ('
+                'dev INTEGER NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL, '
+                'mtime_ns INTEGER NOT NULL, encoding TEXT NOT NULL, '
+                'PRIMARY KEY (dev, ino, size, mtime_ns))'
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, stat: os.stat_result) -> str | None:
+        """Get the encoding stored for this version of a file, if any."""
+        try:
+            with self._lock:
+                row = (
+                    self._connect()
+                    .execute(
+                        'SELECT encoding FROM encodings '
+                        'WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?',
+                        self._make_key(stat),
+                    )
+                    .fetchone()
+                )
+        except (sqlite3.Error, OSError, OverflowError) as e:
+            logger.warning(f'Could not read the encoding cache at {self.path}: {e}')
+            return None
+        return row[0] if row else None
+
+    def put(self, stat: os.stat_result, encoding: str) -> None:
+        """Store the encoding of this version of a file."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO encodings VALUES (?, ?, ?, ?, ?)',
+                    (*self._make_key(stat), encoding),
+                )
+                self._inserts += 1
+                if self._inserts % self.PRUNE_INTERVAL == 0:
+                    self._prune(conn)
+        except (sqlite3.Error, OSError, OverflowError) as e:
+            logger.warning(f'Could not write the encoding cache at {self.path}: {e}')
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        # Replaced entries get a new rowid, so the lowest rowids are the oldest
+        conn.execute(
+            'DELETE FROM encodings WHERE rowid <= '
+            '(SELECT MAX(rowid) FROM encodings) - ?',
+            (self.max_entries,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
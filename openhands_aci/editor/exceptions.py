@@ -39,3 +39,13 @@ class FileValidationError(ToolError):
         self.reason = reason
         self.message = f'File validation failed for {path}: {reason}'
         super().__init__(self.message)
+
+
+class PatchApplyError(ToolError):
+    """Raised when a patch can not be applied to a file."""
+
+    def __init__(self, path: str, reason: str):
+        self.path = path
+        self.reason = reason
+        self.message = f'Failed to apply the patch to {path}: {reason}'
+        super().__init__(self.message)
@@ -1,45 +1,365 @@
+import fcntl
 import hashlib
 import json
 import logging
 import os
-import time
+import re
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterator, NamedTuple, Optional
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Names of the subdirectories entries are spread over: the first two characters of
+# their hashed key
+_SHARD_NAME = re.compile(r'[0-9a-f]{2}')
+
+
+class _Entry(NamedTuple):
+    key: str
+    # Size of the entry's file, and the digest and size of the blob holding its value
+    size: int
+    blob: Optional[str] = None
+    blob_size: int = 0
+
 
 class FileCache:
-    def __init__(self, directory: str, size_limit: Optional[int] = None):
+    """A key-value store of JSON files in a directory.
+
+    Entries are spread over subdirectories named after the first two characters of
+    their hashed key, so no directory holds too many files. An in-memory index of
+    the entries, from the least to the most recently used, gives the number of
+    entries, their total size and the entry to evict without looking at the
+    directory. The index is kept in a journal of changes next to the entries, from
+    which it is rebuilt when the cache is opened again; caches in other processes
+    replay the changes appended to it, so they share the same view of the entries.
+    Reading an entry only moves it in the index in memory, so reads never write to
+    disk; the order they leave is recorded with the next change, or when the
+    journal is compacted.
+
+    In blob store mode, large string values are stored as zlib-compressed blobs
+    named after the hash of their content, so a value stored under several keys is
+    stored once and the entries only refer to it. Reading such a value decompresses
+    its blob without any JSON decoding. A blob is deleted with the last entry that
+    refers to it.
+
+    Caches in several processes can share a directory. Entries and blobs are
+    written to a temporary file that is then moved into place, so they are never
+    read half written, and changes are appended to the journal in a single write.
+    Updates that read a value before writing it back have to hold the lock of its
+    key, see `lock`.
+    """
+
+    JOURNAL_NAME = 'index.log'
+    BLOBS_DIRECTORY_NAME = 'blobs'
+    LOCKS_DIRECTORY_NAME = 'locks'
+    # Number of lock files the keys are spread over, and that of the blobs
+    LOCK_STRIPES = 64
+    # The journal is compacted once it has this many more lines than there are entries
+    JOURNAL_SLACK = 1000
+    # Strings shorter than this are stored in their entry even in blob store mode
+    BLOB_MIN_SIZE = 1024
+
+    def __init__(
+        self,
+        directory: str,
+        size_limit: Optional[int] = None,
+        blob_store: bool = False,
+    ):
         self.directory = Path(directory)
         self.directory.mkdir(parents=True, exist_ok=True)
         self.size_limit = size_limit
+        self.blob_store = blob_store
         self.current_size = 0
-        self._update_current_size()
+        # Hashed key -> entry, from the least to the most recently used
+        self._index: OrderedDict[str, _Entry] = OrderedDict()
+        # Blob digest -> number of entries that refer to it
+        self._blob_refs: dict[str, int] = {}
+        # Hashed keys read since the order of the index was last recorded, in order
+        self._unrecorded_reads: OrderedDict[str, None] = OrderedDict()
+        self._journal_path = self.directory / self.JOURNAL_NAME
+        # Inode and size of the journal up to where it was replayed
+        self._journal_inode: Optional[int] = None
+        self._journal_offset = 0
+        self._journal_lines = 0
+        if self._journal_path.exists():
+            self._sync()
+        else:
+            # Only one of the caches opened at the same time builds the journal
+            with self._flock('index', fcntl.LOCK_EX):
+                if self._journal_path.exists():
+                    self._sync()
+                else:
+                    self._rebuild_index()
         logger.debug(
             f'FileCache initialized with directory: {self.directory}, size_limit: {self.size_limit}, current_size: {self.current_size}'
         )
 
+    def _get_name(self, key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _get_path(self, name: str) -> Path:
+        return self.directory / name[:2] / f'{name}.json'
+
     def _get_file_path(self, key: str) -> Path:
-        hashed_key = hashlib.sha256(key.encode()).hexdigest()
-        return self.directory / f'{hashed_key}.json'
+        return self._get_path(self._get_name(key))
+
+    def _get_blob_path(self, blob: str) -> Path:
+        return self.directory / self.BLOBS_DIRECTORY_NAME / blob[:2] / blob
+
+    @contextmanager
+    def _flock(self, lock_name: str, operation: int) -> Iterator[None]:
+        """Hold a lock shared with the caches of this directory in all processes."""
+        lock_path = self.directory / self.LOCKS_DIRECTORY_NAME / f'{lock_name}.lock'
+        lock_path.parent.mkdir(exist_ok=True)
+        # Every holder opens the file itself, so threads exclude each other too
+        with open(lock_path, 'a') as f:
+            fcntl.flock(f.fileno(), operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _stripe(self, digest: str) -> int:
+        return int(digest[:8], 16) % self.LOCK_STRIPES
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        """Hold an exclusive lock on a key, across all caches of this directory.
+
+        Keys are spread over `LOCK_STRIPES` lock files, so updates of different keys
+        rarely wait for each other. The lock is not reentrant, and a process holding
+        it must not take the lock of another key, which may be the same lock file.
+        """
+        with self._flock(f'key-{self._stripe(self._get_name(key))}', fcntl.LOCK_EX):
+            yield
+
+    def _write_atomically(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(
+            f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp'
+        )
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _add_entry(self, name: str, entry: _Entry) -> None:
+        self._index[name] = entry
+        self.current_size += entry.size
+        if entry.blob is not None:
+            refs = self._blob_refs.get(entry.blob, 0)
+            # A blob takes space once, however many entries refer to it
+            if refs == 0:
+                self.current_size += entry.blob_size
+            self._blob_refs[entry.blob] = refs + 1
+
+    def _remove_entry(self, name: str) -> None:
+        entry = self._index.pop(name, None)
+        if entry is None:
+            return
+        self.current_size -= entry.size
+        if entry.blob is not None:
+            refs = self._blob_refs.pop(entry.blob) - 1
+            if refs:
+                self._blob_refs[entry.blob] = refs
+            else:
+                self.current_size -= entry.blob_size
+
+    def _apply(self, change: list) -> None:
+        """Apply a change recorded in the journal to the index."""
+        operation = change[0]
+        if operation == 'set':
+            # Earlier versions recorded entries without a blob
+            self._remove_entry(change[1])
+            self._add_entry(change[1], _Entry(*change[2:]))
+        elif operation == 'get':
+            if change[1] in self._index:
+                self._index.move_to_end(change[1])
+        elif operation == 'delete':
+            self._remove_entry(change[1])
+
+    def _reset_index(self) -> None:
+        self._index.clear()
+        self._blob_refs.clear()
+        self.current_size = 0
+        self._journal_inode = None
+        self._journal_offset = 0
+        self._journal_lines = 0
+
+    def _sync(self) -> None:
+        """Replay the changes appended to the journal since it was last read."""
+        try:
+            stat = self._journal_path.stat()
+        except FileNotFoundError:
+            # The cache was cleared
+            if self._journal_inode is not None:
+                self._reset_index()
+            return
+        if stat.st_ino != self._journal_inode:
+            # The journal was compacted or replaced, so read it from the start
+            self._reset_index()
+            self._journal_inode = stat.st_ino
+        if stat.st_size <= self._journal_offset:
+            return
+        with open(self._journal_path, 'rb') as f:
+            f.seek(self._journal_offset)
+            data = f.read(stat.st_size - self._journal_offset)
+        # A line may still be being written by another process
+        data = data[: data.rfind(b'\n') + 1]
+        for line in data.splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, TypeError):
+                logger.warning(f'Skipping invalid line in {self._journal_path}')
+        self._journal_offset += len(data)
+        self._journal_lines += data.count(b'\n')
+        # The reads of this cache that are not in the journal yet came after the
+        # changes in it
+        for name in list(self._unrecorded_reads):
+            if name in self._index:
+                self._index.move_to_end(name)
+            else:
+                del self._unrecorded_reads[name]
+
+    def _record(self, change: list) -> None:
+        """Apply a change to the index and append it, after the reads before it, to the journal."""
+        self._apply(change)
+        changes = [['get', name] for name in self._unrecorded_reads] + [change]
+        self._unrecorded_reads.clear()
+        data = ''.join(json.dumps(c) + '\n' for c in changes).encode('utf-8')
+        # Appends only exclude compaction, which would lose them. The lines are a
+        # single unbuffered write, so lines of different processes do not mix.
+        with self._flock('index', fcntl.LOCK_SH):
+            with open(self._journal_path, 'ab', buffering=0) as f:
+                f.write(data)
+        # The line is replayed by the next sync, which changes nothing
+        if self._journal_lines > 2 * len(self._index) + self.JOURNAL_SLACK:
+            self._compact_journal()
+
+    def _compact_journal(self) -> None:
+        """Rewrite the journal with a single line per entry."""
+        with self._flock('index', fcntl.LOCK_EX):
+            self._sync()
+            self._write_journal()
+        logger.debug(f'Compacted the journal of {self.directory}')
+
+    def _write_journal(self) -> None:
+        tmp_path = self._journal_path.with_name(f'{self.JOURNAL_NAME}.{os.getpid()}')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for name, entry in self._index.items():
+                f.write(json.dumps(['set', name, *entry]) + '\n')
+        os.replace(tmp_path, self._journal_path)
+        stat = self._journal_path.stat()
+        self._journal_inode = stat.st_ino
+        self._journal_offset = stat.st_size
+        self._journal_lines = len(self._index)
+        # The journal is in the order of the index, reads included
+        self._unrecorded_reads.clear()
 
-    def _update_current_size(self):
-        self.current_size = sum(
-            f.stat().st_size for f in self.directory.glob('*.json') if f.is_file()
+    def _rebuild_index(self) -> None:
+        """Index the entries in the directory when it has no journal.
+
+        Entries that are directly in the directory, where earlier versions put them,
+        are moved to their subdirectory.
+        """
+        paths = [p for p in self.directory.glob('*.json') if p.is_file()]
+        for shard in self.directory.iterdir():
+            if shard.is_dir() and _SHARD_NAME.fullmatch(shard.name):
+                paths.extend(shard.glob('*.json'))
+        if not paths:
+            self._write_journal()
+            return
+
+        entries = []
+        for path in paths:
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                stat = path.stat()
+                blob = data.get('blob')
+                blob_size = self._get_blob_path(blob).stat().st_size if blob else 0
+                entry = _Entry(data['key'], stat.st_size, blob, blob_size)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                logger.warning(f'Skipping invalid cache entry {path}')
+                continue
+            name = path.stem
+            if path.parent == self.directory:
+                self._get_path(name).parent.mkdir(exist_ok=True)
+                os.replace(path, self._get_path(name))
+            entries.append((stat.st_mtime, name, entry))
+        for _, name, entry in sorted(entries):
+            self._add_entry(name, entry)
+        self._write_journal()
+        logger.debug(
+            f'Rebuilt the index of {self.directory}: {len(self._index)} entries'
         )
-        logger.debug(f'Current size updated: {self.current_size}')
+
+    @contextmanager
+    def _blob_lock(self, blob: str) -> Iterator[None]:
+        """Lock a blob, so it is not deleted while an entry that refers to it is set."""
+        with self._flock(f'blob-{self._stripe(blob)}', fcntl.LOCK_EX):
+            yield
+
+    def _read_blob(self, blob: str) -> str:
+        with open(self._get_blob_path(blob), 'rb') as f:
+            return zlib.decompress(f.read()).decode('utf-8', 'surrogatepass')
+
+    def _delete_blob_if_unused(self, entry: Optional[_Entry]) -> None:
+        if entry is None or entry.blob is None:
+            return
+        with self._blob_lock(entry.blob):
+            # Another process may have set an entry that refers to it
+            self._sync()
+            if entry.blob in self._blob_refs:
+                return
+            try:
+                os.remove(self._get_blob_path(entry.blob))
+            except FileNotFoundError:
+                pass
 
     def set(self, key: str, value: Any) -> None:
-        file_path = self._get_file_path(key)
-        content = json.dumps({'key': key, 'value': value})
-        content_size = len(content.encode('utf-8'))
+        self._sync()
+        name = self._get_name(key)
+        file_path = self._get_path(name)
+        blob: Optional[str] = None
+        compressed = b''
+        if (
+            self.blob_store
+            and isinstance(value, str)
+            and len(value) >= self.BLOB_MIN_SIZE
+        ):
+            data = value.encode('utf-8', 'surrogatepass')
+            blob = hashlib.sha256(data).hexdigest()
+            compressed = zlib.compress(data)
+            content = json.dumps({'key': key, 'blob': blob})
+        else:
+            content = json.dumps({'key': key, 'value': value})
+        entry_size = len(content.encode('utf-8'))
+        content_size = entry_size
+        # A blob that is already stored takes no more space
+        if blob is not None and blob not in self._blob_refs:
+            content_size += len(compressed)
         logger.debug(f'Setting key: {key}, content_size: {content_size}')
 
         if self.size_limit is not None:
-            if file_path.exists():
-                old_size = file_path.stat().st_size
+            if name in self._index:
+                existing = self._index[name]
+                old_size = existing.size
+                # The old blob is deleted unless other entries refer to it
+                if existing.blob is not None and self._blob_refs[existing.blob] == 1:
+                    old_size += existing.blob_size
                 size_diff = content_size - old_size
                 logger.debug(
                     f'Existing file: old_size: {old_size}, size_diff: {size_diff}'
@@ -47,78 +367,103 @@ class FileCache:
                 if size_diff > 0:
                     while (
                         self.current_size + size_diff > self.size_limit
-                        and len(self) > 1
+                        and len(self._index) > 1
                     ):
-                        logger.debug(
-                            f'Evicting oldest (existing file case): current_size: {self.current_size}, size_limit: {self.size_limit}'
-                        )
-                        self._evict_oldest(file_path)
+                        self._evict_oldest(name)
             else:
                 while (
-                    self.current_size + content_size > self.size_limit and len(self) > 1
+                    self.current_size + content_size > self.size_limit
+                    and len(self._index) > 1
                 ):
-                    logger.debug(
-                        f'Evicting oldest (new file case): current_size: {self.current_size}, size_limit: {self.size_limit}'
-                    )
-                    self._evict_oldest(file_path)
-
-        if file_path.exists():
-            self.current_size -= file_path.stat().st_size
-            logger.debug(
-                f'Existing file removed from current_size: {self.current_size}'
-            )
+                    self._evict_oldest(name)
 
-        with open(file_path, 'w') as f:
-            f.write(content)
-
-        self.current_size += content_size
+        old_entry = self._index.get(name)
+        change = ['set', name, key, entry_size, blob, len(compressed)]
+        if blob is None:
+            self._write_atomically(file_path, content.encode('utf-8'))
+            self._record(change)
+        else:
+            # Written after evicting, which may have deleted the same blob
+            with self._blob_lock(blob):
+                blob_path = self._get_blob_path(blob)
+                if not blob_path.exists():
+                    self._write_atomically(blob_path, compressed)
+                self._write_atomically(file_path, content.encode('utf-8'))
+                self._record(change)
+        self._delete_blob_if_unused(old_entry)
         logger.debug(f'File written, new current_size: {self.current_size}')
-        os.utime(
-            file_path, (time.time(), time.time())
-        )  # Update access and modification time
-
-    def _evict_oldest(self, exclude_path: Optional[Path] = None):
-        oldest_file = min(
-            (
-                f
-                for f in self.directory.glob('*.json')
-                if f.is_file() and f != exclude_path
-            ),
-            key=os.path.getmtime,
-        )
-        evicted_size = oldest_file.stat().st_size
-        self.current_size -= evicted_size
-        os.remove(oldest_file)
+
+    def _evict_oldest(self, exclude_name: Optional[str] = None) -> None:
+        oldest_name = next(name for name in self._index if name != exclude_name)
+        evicted = self._index[oldest_name]
+        try:
+            os.remove(self._get_path(oldest_name))
+        except FileNotFoundError:
+            pass
+        self._record(['delete', oldest_name])
+        self._delete_blob_if_unused(evicted)
         logger.debug(
-            f'Evicted file: {oldest_file}, size: {evicted_size}, new current_size: {self.current_size}'
+            f'Evicted entry: {oldest_name}, size: {evicted.size}, new current_size: {self.current_size}'
         )
 
     def get(self, key: str, default: Any = None) -> Any:
-        file_path = self._get_file_path(key)
-        if not file_path.exists():
+        self._sync()
+        name = self._get_name(key)
+        entry = self._index.get(name)
+        try:
+            if entry is not None and entry.blob is not None:
+                value = self._read_blob(entry.blob)
+            else:
+                with open(self._get_path(name), 'r') as f:
+                    data = json.load(f)
+                # The entry may have been written by a cache in blob store mode
+                if 'blob' in data:
+                    value = self._read_blob(data['blob'])
+                else:
+                    value = data['value']
+        except FileNotFoundError:
             logger.debug(f'Get: Key not found: {key}')
             return default
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            os.utime(file_path, (time.time(), time.time()))  # Update access time
-            logger.debug(f'Get: Key found: {key}')
-            return data['value']
+        if name in self._index:
+            self._index.move_to_end(name)
+            self._unrecorded_reads[name] = None
+            self._unrecorded_reads.move_to_end(name)
+        logger.debug(f'Get: Key found: {key}')
+        return value
 
     def delete(self, key: str) -> None:
-        file_path = self._get_file_path(key)
-        if file_path.exists():
-            deleted_size = file_path.stat().st_size
-            self.current_size -= deleted_size
-            os.remove(file_path)
-            logger.debug(
-                f'Deleted key: {key}, size: {deleted_size}, new current_size: {self.current_size}'
-            )
+        self._sync()
+        name = self._get_name(key)
+        try:
+            os.remove(self._get_path(name))
+        except FileNotFoundError:
+            return
+        old_entry = self._index.get(name)
+        self._record(['delete', name])
+        self._delete_blob_if_unused(old_entry)
+        logger.debug(f'Deleted key: {key}, new current_size: {self.current_size}')
 
     def clear(self) -> None:
+        """Delete all entries, which must not be done while other caches update them."""
         for item in self.directory.glob('*.json'):
             if item.is_file():
                 os.remove(item)
-        self.current_size = 0
+        for shard in self.directory.iterdir():
+            if shard.is_dir() and _SHARD_NAME.fullmatch(shard.name):
+                for item in shard.glob('*.json'):
+                    os.remove(item)
+                try:
+                    shard.rmdir()
+                except OSError:
+                    pass
+        shutil.rmtree(self.directory / self.BLOBS_DIRECTORY_NAME, ignore_errors=True)
+        try:
+            os.remove(self._journal_path)
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(self.directory / self.LOCKS_DIRECTORY_NAME, ignore_errors=True)
+        self._reset_index()
+        self._unrecorded_reads.clear()
         logger.debug('Cache cleared')
 
     def __contains__(self, key: str) -> bool:
@@ -127,17 +472,14 @@ class FileCache:
         return exists
 
     def __len__(self) -> int:
-        length = sum(1 for _ in self.directory.glob('*.json') if _.is_file())
-        logger.debug(f'Cache length: {length}')
-        return length
-
-    def __iter__(self):
-        for file in self.directory.glob('*.json'):
-            if file.is_file():
-                with open(file, 'r') as f:
-                    data = json.load(f)
-                    logger.debug(f"Yielding key: {data['key']}")
-                    yield data['key']
+        self._sync()
+        return len(self._index)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the keys, from the least to the most recently used."""
+        self._sync()
+        for entry in list(self._index.values()):
+            yield entry.key
 
     def __getitem__(self, key: str) -> Any:
         return self.get(key)
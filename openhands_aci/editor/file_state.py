@@ -0,0 +1,107 @@
+"""Filesystem metadata of the paths touched by a single editor command."""
+
+import os
+import stat
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from binaryornot.check import is_binary
+
+
+class FileState:
+    """The stat result and binary-ness of a path, each looked up at most once.
+
+    The stat follows symlinks, like `Path.exists` and `Path.is_file` do, and a path
+    that can not be stat'ed is treated as not existing.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._stat: os.stat_result | None = None
+        self._stat_done = False
+        self._is_binary: bool | None = None
+
+    @property
+    def stat(self) -> os.stat_result | None:
+        """The stat result of the path, or None if it does not exist."""
+        if not self._stat_done:
+            try:
+                self._stat = os.stat(self.path)
+            except (OSError, ValueError):
+                self._stat = None
+            self._stat_done = True
+        return self._stat
+
+    @property
+    def exists(self) -> bool:
+        return self.stat is not None
+
+    @property
+    def is_file(self) -> bool:
+        st = self.stat
+        return st is not None and stat.S_ISREG(st.st_mode)
+
+    @property
+    def is_dir(self) -> bool:
+        st = self.stat
+        return st is not None and stat.S_ISDIR(st.st_mode)
+
+    @property
+    def size(self) -> int:
+        st = self.stat
+        if st is None:
+            raise FileNotFoundError(f'No such file or directory: {self.path}')
+        return st.st_size
+
+    @property
+    def mtime(self) -> float:
+        st = self.stat
+        if st is None:
+            raise FileNotFoundError(f'No such file or directory: {self.path}')
+        return st.st_mtime
+
+    @property
+    def is_binary(self) -> bool:
+        """Whether the content of the file looks binary, sniffed from its first bytes."""
+        if self._is_binary is None:
+            self._is_binary = is_binary(str(self.path))
+        return self._is_binary
+
+
+class FileStates:
+    """Memo of the `FileState` of every path used while a command runs.
+
+    Outside of `scope()` every lookup returns a fresh state, so callers that use the
+    editor methods directly always see the current filesystem.
+    """
+
+    def __init__(self) -> None:
+        self._states: dict[str, FileState] | None = None
+
+    @contextmanager
+    def scope(self) -> Iterator[None]:
+        """Memoize the file states until the block exits."""
+        if self._states is not None:
+            # Already inside the scope of a command
+            yield
+            return
+        self._states = {}
+        try:
+            yield
+        finally:
+            self._states = None
+
+    def get(self, path: Path) -> FileState:
+        if self._states is None:
+            return FileState(path)
+        key = str(path)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = FileState(path)
+        return state
+
+    def invalidate(self, path: Path) -> None:
+        """Forget the state of a path, e.g. after writing or deleting it."""
+        if self._states is not None:
+            self._states.pop(str(path), None)
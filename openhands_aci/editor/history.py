@@ -1,24 +1,59 @@
 """History management for file edits with disk-based storage and memory constraints."""
 
+import hashlib
 import logging
+import os
 import tempfile
+import uuid
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, List, Optional
 
+from ..utils.atomic_write import replace_file
+from ..utils.reflink import clone_file, supports_reflink
 from .file_cache import FileCache
 
 
 class FileHistoryManager:
-    """Manages file edit history with disk-based storage and memory constraints."""
+    """Manages file edit history with disk-based storage and memory constraints.
+
+    Only the newest entry of a file is stored in full, split into chunks that are
+    kept in their own cache. Every older entry is stored as a reverse delta: the
+    text that differs from the entry after it, between a common prefix and suffix.
+    When an entry is added, the chunks of the previous newest entry that did not
+    change are kept as they are, so the data written per edit grows with the size
+    of the change rather than with the size of the file. The chunk cache is a blob
+    store, so chunks and large deltas are compressed, and identical ones are stored
+    once.
+
+    Managers in several processes can share a history directory: every update of
+    a file's history holds the lock of its metadata key, so edits of different
+    files proceed in parallel and those of the same file are applied in turn.
+
+    When the history directory is on a filesystem with reflinks (btrfs, XFS), a
+    file can instead be snapshotted before it is edited, by cloning it into the
+    history directory. The clone shares the data of the file until it is written,
+    so it costs next to nothing whatever the size of the file, and undoing the edit
+    moves the clone back in place of the file. Snapshots share their data with the
+    files, so they do not count towards `max_total_size`.
+    """
+
+    # Number of characters per chunk of the newest entry of a file
+    CHUNK_SIZE = 16 * 1024
+    SNAPSHOTS_DIRECTORY_NAME = 'snapshots'
 
     def __init__(
-        self, max_history_per_file: int = 5, history_dir: Optional[Path] = None
+        self,
+        max_history_per_file: int = 5,
+        history_dir: Optional[Path] = None,
+        max_total_size: Optional[int] = None,
     ):
         """Initialize the history manager.
 
         Args:
             max_history_per_file: Maximum number of history entries to keep per file (default: 5)
             history_dir: Directory to store history files. If None, uses a temp directory
+            max_total_size: Maximum number of bytes of history kept for all files together.
+                The oldest entries of the least recently edited files are dropped first.
 
         Notes:
             - Each file's history is limited to the last N entries to conserve memory
@@ -29,6 +64,11 @@ class FileHistoryManager:
         if history_dir is None:
             history_dir = Path(tempfile.mkdtemp(prefix='oh_editor_history_'))
         self.cache = FileCache(str(history_dir))
+        self._chunks = FileCache(str(Path(history_dir) / 'chunks'), blob_store=True)
+        self._snapshots_dir = Path(history_dir) / self.SNAPSHOTS_DIRECTORY_NAME
+        self._snapshots_dir.mkdir(exist_ok=True)
+        self.supports_snapshots = supports_reflink(self._snapshots_dir)
+        self.max_total_size = max_total_size
         self.logger = logging.getLogger(__name__)
 
     def _get_metadata_key(self, file_path: Path) -> str:
@@ -37,52 +77,355 @@ class FileHistoryManager:
     def _get_history_key(self, file_path: Path, counter: int) -> str:
         return f'{file_path}.{counter}'
 
-    def add_history(self, file_path: Path, content: str):
-        """Add a new history entry for a file."""
-        metadata_key = self._get_metadata_key(file_path)
-        metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
-        counter = metadata['counter']
+    def _get_chunk_key(self, file_path: Path, digest: str) -> str:
+        return f'{file_path}.{digest}'
+
+    def _get_delta_key(self, file_path: Path, counter: int) -> str:
+        return f'{file_path}.delta.{counter}'
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.blake2b(
+            text.encode('utf-8', 'surrogatepass'), digest_size=16
+        ).hexdigest()
+
+    def _read_chunks(self, file_path: Path, chunks: list) -> Optional[str]:
+        texts = []
+        for _, digest in chunks:
+            value = self._chunks.get(self._get_chunk_key(file_path, digest))
+            if value is None:
+                return None
+            texts.append(value)
+        return ''.join(texts)
+
+    def _store_chunks(
+        self, file_path: Path, content: str, old_chunks: list
+    ) -> tuple[list, int, int, int, int]:
+        """Store content as chunks, keeping the chunks of the old content that did not change.
+
+        Returns:
+            The new chunks as [length, digest] pairs, the number of characters at the
+            start and at the end of the content covered by kept chunks, and the range
+            of old chunks that were replaced.
+        """
+        # Find the chunks at either end that are still the same
+        start, prefix_length = 0, 0
+        while start < len(old_chunks):
+            length, digest = old_chunks[start]
+            piece = content[prefix_length : prefix_length + length]
+            if len(piece) != length or self._digest(piece) != digest:
+                break
+            prefix_length += length
+            start += 1
+        end, suffix_length = len(old_chunks), 0
+        while end > start:
+            length, digest = old_chunks[end - 1]
+            if prefix_length + suffix_length + length > len(content):
+                break
+            piece_end = len(content) - suffix_length
+            if self._digest(content[piece_end - length : piece_end]) != digest:
+                break
+            suffix_length += length
+            end -= 1
+
+        # Split the changed middle into pieces of about the chunk size
+        middle = content[prefix_length : len(content) - suffix_length]
+        count = max(1, round(len(middle) / self.CHUNK_SIZE)) if middle else 0
+        piece_size = -(-len(middle) // count) if count else 0
+        new_middle = []
+        for offset in range(0, len(middle), piece_size or 1):
+            piece = middle[offset : offset + piece_size]
+            digest = self._digest(piece)
+            key = self._get_chunk_key(file_path, digest)
+            if key not in self._chunks:
+                self._chunks.set(key, piece)
+            new_middle.append([len(piece), digest])
+
+        chunks = old_chunks[:start] + new_middle + old_chunks[end:]
+        return chunks, prefix_length, suffix_length, start, end
+
+    def _delete_unused_chunks(self, file_path: Path, old_chunks: list, entries: list):
+        """Delete the chunks that none of the entries of a file still lists.
+
+        Chunks are named by their digest, so entries of the same file that were not
+        derived from each other, e.g. on either side of a snapshot, can share them.
+        """
+        unused = {digest for _, digest in old_chunks}
+        for counter in entries:
+            if not unused:
+                return
+            value = self.cache.get(self._get_history_key(file_path, counter))
+            if isinstance(value, dict) and 'chunks' in value:
+                unused.difference_update(digest for _, digest in value['chunks'])
+        for digest in unused:
+            self._chunks.delete(self._get_chunk_key(file_path, digest))
+
+    def _read_entry(
+        self, file_path: Path, value: Any, newer: Optional[str]
+    ) -> Optional[str]:
+        """Get the content of a history entry, given the content of the entry after it."""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # A full copy, as stored by earlier versions
+            return value
+        if 'chunks' in value:
+            return self._read_chunks(file_path, value['chunks'])
+        if 'snapshot' in value:
+            return self._read_snapshot(value)
+        if newer is None:
+            return None
+        if 'middle_key' in value:
+            middle = self._chunks.get(value['middle_key'])
+            if middle is None:
+                return None
+        else:
+            middle = value['middle']
+        return newer[: value['prefix']] + middle + newer[len(newer) - value['suffix'] :]
+
+    def _make_delta(
+        self, file_path: Path, counter: int, prefix: int, suffix: int, middle: str
+    ) -> dict:
+        """Make a delta entry, keeping a large middle in the chunk cache."""
+        delta: dict[str, Any] = {'prefix': prefix, 'suffix': suffix}
+        if len(middle) < self._chunks.BLOB_MIN_SIZE:
+            delta['middle'] = middle
+        else:
+            delta['middle_key'] = self._get_delta_key(file_path, counter)
+            self._chunks.set(delta['middle_key'], middle)
+        return delta
+
+    def _delete_entry_data(self, file_path: Path, value: Any, entries: list):
+        """Delete what an entry keeps in the chunk cache, unless `entries` still use it."""
+        if not isinstance(value, dict):
+            return
+        if 'chunks' in value:
+            self._delete_unused_chunks(file_path, value['chunks'], entries)
+        elif 'middle_key' in value:
+            self._chunks.delete(value['middle_key'])
+        elif 'snapshot' in value:
+            self.discard_snapshot(value['snapshot'])
+
+    def take_snapshot(self, file_path: Path) -> Optional[str]:
+        """Snapshot a file before it is edited, if it can be cloned into the history.
+
+        Returns:
+            The name of the snapshot, to pass to `add_history` once the file is
+            edited, or None if the file can not be cloned, e.g. because the history
+            directory does not support reflinks or is on another filesystem.
+        """
+        if not self.supports_snapshots:
+            return None
+        name = uuid.uuid4().hex
+        try:
+            cloned = clone_file(os.path.realpath(file_path), self._snapshots_dir / name)
+        except OSError:
+            return None
+        return name if cloned else None
+
+    def discard_snapshot(self, snapshot: str):
+        """Delete a snapshot, e.g. that of an edit that failed."""
+        try:
+            os.remove(self._snapshots_dir / snapshot)
+        except FileNotFoundError:
+            pass
+
+    def _read_snapshot(self, value: dict) -> Optional[str]:
+        try:
+            # Newlines are translated the same way as when the editor reads the file
+            with open(
+                self._snapshots_dir / value['snapshot'], encoding=value['encoding']
+            ) as f:
+                return f.read()
+        except (OSError, UnicodeError):
+            return None
 
-        # Add new entry
+    def _delete_entry(self, file_path: Path, counter: int, entries: list):
+        """Delete an entry that is no longer in `entries`, the ones the file keeps."""
         history_key = self._get_history_key(file_path, counter)
-        self.cache.set(history_key, content)
+        value = self.cache.get(history_key)
+        self.cache.delete(history_key)
+        self._delete_entry_data(file_path, value, entries)
+
+    def add_history(
+        self,
+        file_path: Path,
+        content: str,
+        snapshot: Optional[str] = None,
+        encoding: str = 'utf-8',
+    ):
+        """Add a new history entry for a file.
+
+        Args:
+            file_path: The file that was edited
+            content: The content of the file before the edit
+            snapshot: A snapshot of the file taken before the edit with
+                `take_snapshot`, which is kept instead of the content
+            encoding: The encoding to read the snapshot with
+        """
+        metadata_key = self._get_metadata_key(file_path)
+        with self.cache.lock(metadata_key):
+            metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
+            counter = metadata['counter']
+
+            # Reuse the chunks of the previous newest entry, which becomes a delta
+            old_chunks: list = []
+            if metadata['entries'] and snapshot is None:
+                previous_counter = metadata['entries'][-1]
+                previous_key = self._get_history_key(file_path, previous_counter)
+                previous = self.cache.get(previous_key)
+                if isinstance(previous, dict) and 'chunks' in previous:
+                    old_chunks = previous['chunks']
 
-        metadata['entries'].append(counter)
-        metadata['counter'] += 1
+            if snapshot is not None:
+                # The snapshot holds the whole content, so nothing else is stored
+                # and the previous entry stays as it is
+                chunks: list = []
+                value: dict = {'snapshot': snapshot, 'encoding': encoding}
+            else:
+                chunks, prefix, suffix, start, end = self._store_chunks(
+                    file_path, content, old_chunks
+                )
+                value = {'chunks': chunks}
+            if old_chunks:
+                old_middle = self._read_chunks(file_path, old_chunks[start:end])
+                if old_middle is None:
+                    self.logger.warning(f'History entry not found for {file_path}')
+                    self.cache.delete(previous_key)
+                else:
+                    delta = self._make_delta(
+                        file_path, previous_counter, prefix, suffix, old_middle
+                    )
+                    self.cache.set(previous_key, delta)
 
-        # Keep only last N entries
-        while len(metadata['entries']) > self.max_history_per_file:
-            old_counter = metadata['entries'].pop(0)
-            old_history_key = self._get_history_key(file_path, old_counter)
-            self.cache.delete(old_history_key)
+            # Add new entry
+            history_key = self._get_history_key(file_path, counter)
+            self.cache.set(history_key, value)
+
+            metadata['entries'].append(counter)
+            metadata['counter'] += 1
+            if old_chunks:
+                self._delete_unused_chunks(file_path, old_chunks, metadata['entries'])
+
+            # Keep only last N entries
+            while len(metadata['entries']) > self.max_history_per_file:
+                old_counter = metadata['entries'].pop(0)
+                self._delete_entry(file_path, old_counter, metadata['entries'])
+
+            self.cache.set(metadata_key, metadata)
 
-        self.cache.set(metadata_key, metadata)
+        # Other files are trimmed too, so not while holding the lock of this one
+        if self.max_total_size is not None:
+            self._enforce_total_size(file_path)
+
+    def _enforce_total_size(self, current_file: Path):
+        """Drop the oldest history entries until the history fits in max_total_size.
+
+        The files are visited from the least recently used, and the file that was
+        just edited comes last and always keeps its newest entry.
+        """
+        assert self.max_total_size is not None
+        current_key = self._get_metadata_key(current_file)
+        metadata_keys = [
+            key
+            for key in self.cache
+            if key.endswith('.metadata') and key != current_key
+        ]
+        for metadata_key in metadata_keys + [current_key]:
+            min_entries = 1 if metadata_key == current_key else 0
+            file_path = Path(metadata_key[: -len('.metadata')])
+            with self.cache.lock(metadata_key):
+                metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
+                while (
+                    self.cache.current_size + self._chunks.current_size
+                    > self.max_total_size
+                    and len(metadata['entries']) > min_entries
+                ):
+                    self._delete_entry(
+                        file_path, metadata['entries'].pop(0), metadata['entries']
+                    )
+                self.cache.set(metadata_key, metadata)
+            if (
+                self.cache.current_size + self._chunks.current_size
+                <= self.max_total_size
+            ):
+                return
 
     def pop_last_history(self, file_path: Path) -> Optional[str]:
         """Pop and return the most recent history entry for a file."""
         metadata_key = self._get_metadata_key(file_path)
-        metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
-        entries = metadata['entries']
+        with self.cache.lock(metadata_key):
+            metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
+            entries = metadata['entries']
 
-        if not entries:
-            return None
+            if not entries:
+                return None
 
-        # Pop and remove the last entry
-        last_counter = entries.pop()
-        history_key = self._get_history_key(file_path, last_counter)
-        content = self.cache.get(history_key)
+            # Pop and remove the last entry
+            last_counter = entries.pop()
+            history_key = self._get_history_key(file_path, last_counter)
+            value = self.cache.get(history_key)
+            content = self._read_entry(file_path, value, None)
 
-        if content is None:
-            self.logger.warning(f'History entry not found for {file_path}')
-        else:
-            # Remove the entry from the cache
-            self.cache.delete(history_key)
+            if content is None:
+                self.logger.warning(f'History entry not found for {file_path}')
+            elif entries and isinstance(value, dict) and 'chunks' in value:
+                # The entry before it becomes the newest one, so rebuild it from its
+                # delta and store it as chunks, mostly the ones of the popped entry.
+                # A snapshot is kept as it is.
+                previous_key = self._get_history_key(file_path, entries[-1])
+                previous_value = self.cache.get(previous_key)
+                previous = (
+                    None
+                    if isinstance(previous_value, dict) and 'snapshot' in previous_value
+                    else self._read_entry(file_path, previous_value, content)
+                )
+                if previous is not None:
+                    chunks = self._store_chunks(file_path, previous, value['chunks'])[0]
+                    self.cache.set(previous_key, {'chunks': chunks})
+                    self._delete_entry_data(file_path, previous_value, entries)
+
+            # Remove the entry from the cache, with any chunks left to it
+            self._delete_entry(file_path, last_counter, entries)
 
-        # Update metadata
-        metadata['entries'] = entries
-        self.cache.set(metadata_key, metadata)
+            # Update metadata
+            metadata['entries'] = entries
+            self.cache.set(metadata_key, metadata)
+
+            return content
+
+    def restore_snapshot(self, file_path: Path) -> Optional[str]:
+        """Undo the last edit of a file by moving its snapshot back in place.
+
+        Returns:
+            The restored content, or None if the last history entry of the file is
+            not a snapshot or can not be moved back, in which case it is left to
+            `pop_last_history`.
+        """
+        metadata_key = self._get_metadata_key(file_path)
+        with self.cache.lock(metadata_key):
+            metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
+            if not metadata['entries']:
+                return None
+            history_key = self._get_history_key(file_path, metadata['entries'][-1])
+            value = self.cache.get(history_key)
+            if not isinstance(value, dict) or 'snapshot' not in value:
+                return None
+            content = self._read_snapshot(value)
+            if content is None:
+                return None
+            # The file keeps its mode and owner; a file with other hard links is
+            # left to `pop_last_history`, which rewrites it in place
+            try:
+                if not replace_file(self._snapshots_dir / value['snapshot'], file_path):
+                    return None
+            except OSError:
+                return None
 
-        return content
+            self.cache.delete(history_key)
+            metadata['entries'].pop()
+            self.cache.set(metadata_key, metadata)
+            return content
 
     def get_metadata(self, file_path: Path):
         """Get metadata for a file (for testing purposes)."""
@@ -93,27 +436,30 @@ class FileHistoryManager:
     def clear_history(self, file_path: Path):
         """Clear history for a given file."""
         metadata_key = self._get_metadata_key(file_path)
-        metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
+        with self.cache.lock(metadata_key):
+            metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
 
-        # Delete all history entries
-        for counter in metadata['entries']:
-            history_key = self._get_history_key(file_path, counter)
-            self.cache.delete(history_key)
+            # Delete all history entries
+            for counter in metadata['entries']:
+                self._delete_entry(file_path, counter, [])
 
-        # Clear metadata
-        self.cache.set(metadata_key, {'entries': [], 'counter': 0})
+            # Clear metadata
+            self.cache.set(metadata_key, {'entries': [], 'counter': 0})
 
     def get_all_history(self, file_path: Path) -> List[str]:
         """Get all history entries for a file."""
         metadata_key = self._get_metadata_key(file_path)
-        metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
-        entries = metadata['entries']
+        with self.cache.lock(metadata_key):
+            metadata = self.cache.get(metadata_key, {'entries': [], 'counter': 0})
+            entries = metadata['entries']
 
-        history = []
-        for counter in entries:
-            history_key = self._get_history_key(file_path, counter)
-            content = self.cache.get(history_key)
-            if content is not None:
-                history.append(content)
+            # Rebuild the entries from the newest one backwards
+            history = []
+            newer: Optional[str] = None
+            for counter in reversed(entries):
+                history_key = self._get_history_key(file_path, counter)
+                newer = self._read_entry(file_path, self.cache.get(history_key), newer)
+                if newer is not None:
+                    history.append(newer)
 
-        return history
+            return history[::-1]
@@ -0,0 +1,331 @@
+"""Parsing and applying unified diffs for the `apply_patch` command."""
+
+import re
+from dataclasses import dataclass
+from itertools import groupby
+from operator import attrgetter
+from typing import Iterator
+
+import whatthepatch
+
+from .exceptions import PatchApplyError
+
+DEV_NULL = '/dev/null'
+_HUNK_HEADER = re.compile(r'^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@')
+# Maximum number of context lines that may be ignored at each end of a hunk
+MAX_FUZZ = 2
+
+
+@dataclass
+class Hunk:
+    """A hunk of a unified diff."""
+
+    # 0-based index of the first old line the hunk is expected at
+    old_start: int
+    # (' ' | '-' | '+', line) for every line of the hunk
+    ops: list[tuple[str, str]]
+    # Whether the last old (or new) line of the hunk is the end of a file that has
+    # no newline at its end, as marked by `\ No newline at end of file`
+    old_missing_newline: bool = False
+    new_missing_newline: bool = False
+
+    @property
+    def leading_context(self) -> int:
+        count = 0
+        for kind, _ in self.ops:
+            if kind != ' ':
+                break
+            count += 1
+        return count
+
+    @property
+    def trailing_context(self) -> int:
+        count = 0
+        for kind, _ in reversed(self.ops):
+            if kind != ' ':
+                break
+            count += 1
+        return count
+
+
+@dataclass
+class FilePatch:
+    """The hunks of a unified diff for a single file."""
+
+    path: str
+    is_new: bool
+    hunks: list[Hunk]
+
+
+def _strip_git_prefixes(old_path: str, new_path: str) -> tuple[str, str]:
+    """Remove the `a/` and `b/` prefixes of git-style diff headers."""
+    if (old_path == DEV_NULL or old_path.startswith('a/')) and (
+        new_path == DEV_NULL or new_path.startswith('b/')
+    ):
+        if old_path != DEV_NULL:
+            old_path = old_path[2:]
+        if new_path != DEV_NULL:
+            new_path = new_path[2:]
+    return old_path, new_path
+
+
+def _is_file_header(lines: list[str], i: int) -> bool:
+    return (
+        lines[i].startswith('--- ')
+        and i + 2 < len(lines)
+        and lines[i + 1].startswith('+++ ')
+        and lines[i + 2].startswith('@@')
+    )
+
+
+def _split_files(patch: str) -> list[str]:
+    """Split a patch into the sections for each file.
+
+    whatthepatch merges consecutive files of a diff without `diff` lines into one,
+    so a new section is started at every `diff` line or `---`/`+++` header that
+    follows a hunk. Hunk line counts are followed so removed lines that start with
+    `--` are not mistaken for headers.
+    """
+    lines = patch.splitlines(keepends=True)
+    sections: list[list[str]] = [[]]
+    has_hunk = False
+    old_left = new_left = 0
+    for i, line in enumerate(lines):
+        if (old_left > 0 or new_left > 0) and not _is_file_header(lines, i):
+            if line.startswith('-'):
+                old_left -= 1
+            elif line.startswith('+'):
+                new_left -= 1
+            elif not line.startswith('\\'):
+                old_left -= 1
+                new_left -= 1
+            sections[-1].append(line)
+            continue
+
+        old_left = new_left = 0
+        match = _HUNK_HEADER.match(line)
+        if match:
+            has_hunk = True
+            old_left = int(match.group(1) or 1)
+            new_left = int(match.group(2) or 1)
+        elif has_hunk and (line.startswith('diff ') or _is_file_header(lines, i)):
+            sections.append([])
+            has_hunk = False
+        sections[-1].append(line)
+    return [''.join(section) for section in sections if section]
+
+
+def _missing_newlines(diff_text: str) -> dict[int, tuple[bool, bool]]:
+    """Find the hunks with a `\\ No newline at end of file` marker in a file diff.
+
+    Returns whether the old and the new version miss the final newline, by the
+    1-based number of the hunk with the marker.
+    """
+    missing: dict[int, tuple[bool, bool]] = {}
+    hunk = 0
+    previous = ''
+    for line in diff_text.split('\n'):
+        if line.startswith('@@'):
+            hunk += 1
+        elif line.startswith('\\') and hunk:
+            old_missing, new_missing = missing.get(hunk, (False, False))
+            missing[hunk] = (
+                old_missing or previous[:1] in (' ', '-'),
+                new_missing or previous[:1] in (' ', '+'),
+            )
+        previous = line
+    return missing
+
+
+def parse_patch(patch: str) -> list[FilePatch]:
+    """Parse a unified diff into the hunks to apply to each file.
+
+    Raises:
+        PatchApplyError: If the patch deletes or renames a file, or has no hunks for a file.
+    """
+    file_patches = []
+    diffs = [
+        diff
+        for section in _split_files(patch)
+        for diff in whatthepatch.parse_patch(section)
+    ]
+    for diff in diffs:
+        if diff.header is None:
+            raise PatchApplyError('<unknown>', 'the patch is missing a file header.')
+        old_path, new_path = _strip_git_prefixes(
+            diff.header.old_path, diff.header.new_path
+        )
+        # The paths of git diffs come from the `diff --git` line, so new and
+        # deleted files are only marked in the extended header lines
+        header_lines = diff.text.split('\n@@', 1)[0].split('\n')
+        if '--- /dev/null' in header_lines or any(
+            line.startswith('new file mode') for line in header_lines
+        ):
+            old_path = DEV_NULL
+        if '+++ /dev/null' in header_lines or any(
+            line.startswith('deleted file mode') for line in header_lines
+        ):
+            new_path = DEV_NULL
+        if new_path == DEV_NULL:
+            raise PatchApplyError(old_path, 'deleting files is not supported.')
+        if old_path != DEV_NULL and old_path != new_path:
+            raise PatchApplyError(
+                old_path, f'renaming files (to {new_path}) is not supported.'
+            )
+        if not diff.changes:
+            raise PatchApplyError(new_path, 'the patch has no hunks for this file.')
+
+        hunks = []
+        missing_newlines = _missing_newlines(diff.text)
+        # Net number of lines added by the hunks before the current one
+        delta = 0
+        for hunk_number, changes in groupby(diff.changes, key=attrgetter('hunk')):
+            ops = []
+            old_start = new_start = None
+            for change in changes:
+                if change.old is not None and change.new is not None:
+                    ops.append((' ', change.line))
+                elif change.old is not None:
+                    ops.append(('-', change.line))
+                else:
+                    ops.append(('+', change.line))
+                if old_start is None and change.old is not None:
+                    old_start = change.old - 1
+                if new_start is None and change.new is not None:
+                    new_start = change.new - 1
+            if old_start is None:
+                # A hunk that only adds lines is positioned by its new line numbers
+                assert new_start is not None
+                old_start = new_start - delta
+            old_missing, new_missing = missing_newlines.get(hunk_number, (False, False))
+            hunk = Hunk(
+                old_start=old_start,
+                ops=ops,
+                old_missing_newline=old_missing,
+                new_missing_newline=new_missing,
+            )
+            delta += sum(kind == '+' for kind, _ in ops) - sum(
+                kind == '-' for kind, _ in ops
+            )
+            hunks.append(hunk)
+        file_patches.append(
+            FilePatch(path=new_path, is_new=old_path == DEV_NULL, hunks=hunks)
+        )
+    return file_patches
+
+
+def _candidates(expected: int, low: int, high: int) -> Iterator[int]:
+    """Yield the positions between low and high, nearest to expected first."""
+    expected = min(max(expected, low), high)
+    yield expected
+    for distance in range(1, high - low + 1):
+        if expected + distance <= high:
+            yield expected + distance
+        if expected - distance >= low:
+            yield expected - distance
+
+
+def _locate(
+    lines: list[str], old_lines: list[str], expected: int, low: int
+) -> tuple[int, bool] | None:
+    """Find where old_lines appear in lines, at or after low and nearest to expected.
+
+    Returns the position and whether it only matched after ignoring trailing white
+    spaces, or None if there is no match.
+    """
+    high = len(lines) - len(old_lines)
+    if high < low:
+        return None
+    for ignore_whitespace in (False, True):
+        if ignore_whitespace:
+            old_lines = [line.rstrip() for line in old_lines]
+        for start in _candidates(expected, low, high):
+            candidate = lines[start : start + len(old_lines)]
+            if ignore_whitespace:
+                candidate = [line.rstrip() for line in candidate]
+            if candidate == old_lines:
+                return start, ignore_whitespace
+    return None
+
+
+def apply_hunks(path: str, content: str, hunks: list[Hunk]) -> tuple[str, list[str]]:
+    """Apply the hunks for a file to its content.
+
+    Like `patch`, each hunk is looked up nearest to where it is expected, allowing for
+    lines added or removed elsewhere, and then again with trailing white spaces and up
+    to MAX_FUZZ lines of context at each end ignored. Context lines keep their current
+    content.
+
+    Returns:
+        The new content and notes about hunks that did not apply exactly as given.
+
+    Raises:
+        PatchApplyError: If a hunk does not match the content.
+    """
+    lines = content.split('\n') if content else []
+    ends_with_newline = content.endswith('\n')
+    if ends_with_newline:
+        lines.pop()
+
+    new_lines: list[str] = []
+    notes = []
+    # Index of the first line not consumed by the hunks applied so far
+    position = 0
+    # How far from its expected position the previous hunk applied
+    drift = 0
+    for i, hunk in enumerate(hunks, start=1):
+        match = None
+        trimmed = None
+        for fuzz in range(MAX_FUZZ + 1):
+            lead = min(fuzz, hunk.leading_context)
+            trail = min(fuzz, hunk.trailing_context)
+            if (lead, trail) == trimmed:
+                # There is no more context to ignore
+                break
+            trimmed = (lead, trail)
+            ops = hunk.ops[lead : len(hunk.ops) - trail]
+            old_lines = [line for kind, line in ops if kind != '+']
+            match = _locate(lines, old_lines, hunk.old_start + lead + drift, position)
+            if match is not None:
+                break
+        if match is None:
+            raise PatchApplyError(
+                path,
+                f'hunk {i} (expected at line {hunk.old_start + 1}) does not match the file content.',
+            )
+
+        start, ignored_whitespace = match
+        new_lines.extend(lines[position:start])
+        position = start
+        for kind, line in ops:
+            if kind == ' ':
+                new_lines.append(lines[position])
+                position += 1
+            elif kind == '-':
+                position += 1
+            else:
+                new_lines.append(line)
+
+        offset = start - (hunk.old_start + lead)
+        drift = offset
+        details = []
+        if offset:
+            details.append(f'offset {offset:+d} lines')
+        if lead or trail:
+            details.append(f'fuzz {max(lead, trail)}')
+        if ignored_whitespace:
+            details.append('ignoring trailing white spaces')
+        if details:
+            notes.append(f'hunk {i} applied with {", ".join(details)}')
+
+    new_lines.extend(lines[position:])
+    new_content = '\n'.join(new_lines)
+    # New files end with a newline unless the patch says otherwise, like `patch`
+    add_newline = ends_with_newline or not content
+    if hunks and hunks[-1].new_missing_newline:
+        add_newline = False
+    elif hunks and hunks[-1].old_missing_newline:
+        add_newline = True
+    if new_lines and add_newline:
+        new_content += '\n'
+    return new_content, notes
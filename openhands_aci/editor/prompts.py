@@ -5,3 +5,5 @@ TEXT_FILE_CONTENT_TRUNCATED_NOTICE: str = '<response clipped><NOTE>Due to the ma
 BINARY_FILE_CONTENT_TRUNCATED_NOTICE: str = '<response clipped><NOTE>Due to the max output limit, only part of this file has been shown to you. Please use Python libraries to view the entire file or search for specific content within the file.</NOTE>'
 
 DIRECTORY_CONTENT_TRUNCATED_NOTICE: str = '<response clipped><NOTE>Due to the max output limit, only part of this directory has been shown to you. You should use `ls -la` instead to view large directories incrementally.</NOTE>'
+
+DIRECTORY_PAGE_CONTINUATION_NOTICE: str = '<NOTE>Only part of this directory has been shown to you. To see the next entries, view this directory again with `cursor` set to `{cursor}`.</NOTE>'
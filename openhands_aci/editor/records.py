@@ -0,0 +1,94 @@
+"""Files of fixed-length records (RECFM=FB), the way mainframe sources are stored.
+
+Such a file has no line breaks: record N is the N-th slice of LRECL bytes, padded
+with spaces. The editor shows every record as a line without its padding, and pads
+the lines again when writing the file. Records are read by slicing the memory-mapped
+file, so reading a few records of a large file only touches the pages they are on.
+"""
+
+import mmap
+from pathlib import Path
+
+from .ebcdic import is_ebcdic
+
+# Record length of files detected as fixed-length records, that of card images
+DEFAULT_RECORD_LENGTH = 80
+# Number of bytes at the start of a file searched for line breaks when detecting
+# fixed-length records
+DETECTION_SAMPLE_SIZE = 64 * 1024
+
+
+def detect_record_length(path: Path, size: int, encoding: str) -> int | None:
+    """Detect an EBCDIC file of 80-byte records from the absence of line breaks.
+
+    Only EBCDIC files are detected, since text in other encodings without a single
+    line break is rarely made of records. Files of other record lengths or in other
+    encodings have to be configured.
+    """
+    if not is_ebcdic(encoding) or size == 0 or size % DEFAULT_RECORD_LENGTH:
+        return None
+    with open(path, 'rb') as f:
+        sample = f.read(min(size, DETECTION_SAMPLE_SIZE))
+    # EBCDIC has two line breaks, NL and LF, whose bytes differ between code pages
+    for line_break in ('\n', '\x85'):
+        if line_break.encode(encoding) in sample:
+            return None
+    return DEFAULT_RECORD_LENGTH
+
+
+class FixedRecordFile:
+    """A file of fixed-length records, read and written as lines of text."""
+
+    def __init__(self, path: Path, size: int, record_length: int, encoding: str):
+        if record_length < 1:
+            raise ValueError(f'Invalid record length: {record_length}')
+        self.path = path
+        self.size = size
+        self.record_length = record_length
+        self.encoding = encoding
+        self.padding = ' '.encode(encoding)
+        if len(self.padding) != 1:
+            raise ValueError(
+                f'Fixed-length records are only supported in single-byte encodings, not {encoding}.'
+            )
+
+    @property
+    def num_records(self) -> int:
+        # A short last record still counts
+        return -(-self.size // self.record_length)
+
+    def read_lines(self, start: int, end: int) -> list[str]:
+        """Read records `start` to `end` (1-based, inclusive) without their padding."""
+        if self.size == 0 or end < start:
+            return []
+        length = self.record_length
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = mm[(start - 1) * length : end * length]
+        return [
+            data[offset : offset + length].rstrip(self.padding).decode(self.encoding)
+            for offset in range(0, len(data), length)
+        ]
+
+    def read_text(self) -> str:
+        """Read all records as lines of text, each ending with a line break."""
+        return ''.join(line + '\n' for line in self.read_lines(1, self.num_records))
+
+    def encode_text(self, text: str) -> bytes:
+        """Encode lines of text as records, padding each of them to the record length.
+
+        Raises:
+            ValueError: If a line does not fit in a record
+        """
+        lines = text.split('\n')
+        if text.endswith('\n'):
+            lines.pop()
+        records = []
+        for number, line in enumerate(lines, start=1):
+            record = line.encode(self.encoding)
+            if len(record) > self.record_length:
+                raise ValueError(
+                    f'Line {number} is {len(record)} bytes long, which does not fit in a record of {self.record_length} bytes.'
+                )
+            records.append(record.ljust(self.record_length, self.padding))
+        return b''.join(records)
@@ -1,8 +1,21 @@
-from dataclasses import asdict, dataclass, fields
+import hashlib
+import json
+from dataclasses import dataclass, fields, replace
+from json.encoder import encode_basestring_ascii
+from typing import Any, Iterator, Literal
+
+from openhands_aci.utils.diff import get_unified_diff
 
 from .config import MAX_RESPONSE_LEN_CHAR
 from .prompts import CONTENT_TRUNCATED_NOTICE
 
+# Number of characters of a string that are escaped at once when streaming JSON
+JSON_CHUNK_SIZE = 64 * 1024
+
+# 'full' results carry the whole old and new content of edited files, 'diff'
+# results carry a unified diff and hashes of both versions instead
+ResultMode = Literal['full', 'diff']
+
 
 @dataclass
 class ToolResult:
@@ -14,14 +27,51 @@ class ToolResult:
     def __bool__(self):
         return any(getattr(self, field.name) for field in fields(self))
 
+    def _serialized_items(self) -> list[tuple[str, Any]]:
+        """The fields to serialize, as (name, value) pairs."""
+        return [(field.name, getattr(self, field.name)) for field in fields(self)]
+
     def to_dict(self, extra_field: dict | None = None) -> dict:
-        result = asdict(self)
+        result = dict(self._serialized_items())
 
         # Add extra fields if provided
         if extra_field:
             result.update(extra_field)
         return result
 
+    def iter_json(self, extra_field: dict | None = None) -> Iterator[str]:
+        """
+        Serialize the result as a JSON object in chunks, without copying its fields.
+
+        The output is the same as serializing `to_dict(extra_field)` key by key with
+        `json.dumps`, but long strings are escaped a slice at a time, so no escaped
+        copy of a whole field is ever held in memory.
+        """
+        items = self._serialized_items()
+        if extra_field:
+            items.extend(extra_field.items())
+        yield '{'
+        for i, (key, value) in enumerate(items):
+            yield f'{"," if i else ""}"{key}": '
+            yield from iter_json_value(value)
+        yield '}'
+
+
+def iter_json_value(value) -> Iterator[str]:
+    """Serialize a value like `json.dumps` does, escaping strings a chunk at a time."""
+    if not isinstance(value, str):
+        yield json.dumps(value)
+        return
+    yield '"'
+    for start in range(0, len(value), JSON_CHUNK_SIZE):
+        # Strip the quotes each escaped chunk is wrapped in
+        yield encode_basestring_ascii(value[start : start + JSON_CHUNK_SIZE])[1:-1]
+    yield '"'
+
+
+# The fields of a CLIResult that are only serialized for 'diff' results
+DIFF_FIELDS = ('diff', 'old_content_hash', 'new_content_hash')
+
 
 @dataclass
 class CLIResult(ToolResult):
@@ -32,6 +82,47 @@ class CLIResult(ToolResult):
     prev_exist: bool = True
     old_content: str | None = None
     new_content: str | None = None
+    # Set instead of the contents in 'diff' result mode
+    diff: str | None = None
+    old_content_hash: str | None = None
+    new_content_hash: str | None = None
+
+    def _serialized_items(self) -> list[tuple[str, Any]]:
+        items = super()._serialized_items()
+        if self.diff is None:
+            # Only results in 'diff' mode have these keys, so 'full' results keep
+            # the keys they always had
+            items = [(name, value) for name, value in items if name not in DIFF_FIELDS]
+        return items
+
+    def to_diff_result(self) -> 'CLIResult':
+        """
+        Replace the old and new content with a unified diff between them and their hashes.
+
+        The full content can still be read from the file, and the hashes tell whether
+        it is the same version this result describes.
+        """
+        if self.old_content is None and self.new_content is None:
+            return self
+        old_content = self.old_content or ''
+        new_content = self.new_content or ''
+        return replace(
+            self,
+            old_content=None,
+            new_content=None,
+            diff=get_unified_diff(old_content, new_content, self.path or 'file'),
+            old_content_hash=(
+                None if self.old_content is None else hash_content(self.old_content)
+            ),
+            new_content_hash=(
+                None if self.new_content is None else hash_content(self.new_content)
+            ),
+        )
+
+
+def hash_content(content: str) -> str:
+    """Get the SHA-256 hex digest of content, encoded as UTF-8."""
+    return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
 
 
 def maybe_truncate(
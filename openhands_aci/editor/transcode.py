@@ -0,0 +1,300 @@
+"""Bulk conversion of files between encodings, e.g. from EBCDIC to UTF-8 and back."""
+
+import codecs
+import os
+import stat
+import tempfile
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Iterator, Literal
+
+from ..utils.pool import batched, map_batches
+from .encoding import EncodingManager
+
+# Number of bytes read, converted and written at once
+CHUNK_SIZE = 1024 * 1024
+# Number of characters compared at once when looking for lossy characters
+COMPARE_BLOCK_SIZE = 4096
+# Maximum number of offsets of lossy characters listed in a report
+MAX_REPORTED_LOSSY_OFFSETS = 100
+# Number of files converted by one task of the process pool
+BATCH_SIZE = 32
+
+# 'converted': the destination was written. 'skipped': the file already is in the
+# target encoding and would be converted in place. 'lossy': some characters do not
+# survive the round trip, so the destination was not written. 'failed': the file
+# could not be read, decoded or written.
+TranscodeStatus = Literal['converted', 'skipped', 'lossy', 'failed']
+
+
+@dataclass
+class TranscodeReport:
+    """The outcome of converting one file."""
+
+    source: str
+    destination: str
+    status: TranscodeStatus = 'converted'
+    source_encoding: str | None = None
+    target_encoding: str | None = None
+    bytes_read: int = 0
+    bytes_written: int = 0
+    # Number of characters that do not survive the round trip through the target
+    # encoding, and the byte offsets in the source file of the first ones
+    lossy_count: int = 0
+    lossy_offsets: list[int] = field(default_factory=list)
+    error: str | None = None
+
+
+_BOMS = (
+    codecs.BOM_UTF8,
+    codecs.BOM_UTF16_LE,
+    codecs.BOM_UTF16_BE,
+    codecs.BOM_UTF32_LE,
+    codecs.BOM_UTF32_BE,
+)
+
+
+def _bom_length(encoding: str) -> int:
+    """Number of bytes of the byte order mark the encoding writes before any text."""
+    return len(''.encode(encoding))
+
+
+def _record_lossy(
+    report: TranscodeReport,
+    text: str,
+    round_trip: str,
+    offset: int,
+    source_encoding: str,
+) -> None:
+    """Record the characters of a chunk that changed in the round trip."""
+    # Only blocks that differ are compared character by character
+    changed_blocks = (
+        start
+        for start in range(0, len(text), COMPARE_BLOCK_SIZE)
+        if text[start : start + COMPARE_BLOCK_SIZE]
+        != round_trip[start : start + COMPARE_BLOCK_SIZE]
+    )
+    # Byte offsets are found by encoding the text between two lossy characters,
+    # without the byte order mark that is written each time
+    bom_length = _bom_length(source_encoding)
+    char_index, byte_offset = 0, offset
+    for start in changed_blocks:
+        for i in range(start, min(start + COMPARE_BLOCK_SIZE, len(text))):
+            if i < len(round_trip) and text[i] == round_trip[i]:
+                continue
+            report.lossy_count += 1
+            if len(report.lossy_offsets) < MAX_REPORTED_LOSSY_OFFSETS:
+                byte_offset += (
+                    len(text[char_index:i].encode(source_encoding)) - bom_length
+                )
+                char_index = i
+                report.lossy_offsets.append(byte_offset)
+            if len(text) != len(round_trip):
+                # A replacement changed the length, so the characters after the
+                # first change can not be matched up anymore
+                return
+
+
+def _convert(
+    source: Path, destination: Path, report: TranscodeReport, allow_lossy: bool
+) -> None:
+    source_encoding = report.source_encoding
+    target_encoding = report.target_encoding
+    assert source_encoding is not None and target_encoding is not None
+    decoder = codecs.getincrementaldecoder(source_encoding)()
+    # Characters the target can not encode become replacement characters, which
+    # the round trip check then finds
+    encoder = codecs.getincrementalencoder(target_encoding)('replace')
+    check_decoder = codecs.getincrementaldecoder(target_encoding)()
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    # Write next to the destination and move it over at the end, so the file is
+    # never half converted, even when converting in place
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f'.{destination.name}.', suffix='.tmp', dir=destination.parent
+    )
+    try:
+        with open(source, 'rb') as src, os.fdopen(fd, 'wb') as out:
+            os.fchmod(out.fileno(), stat.S_IMODE(os.fstat(src.fileno()).st_mode))
+            # Byte offset in the source of the next decoded character
+            offset = 0
+            buffered = 0
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                final = not chunk
+                text = decoder.decode(chunk, final)
+                data = encoder.encode(text, final)
+                round_trip = check_decoder.decode(data, final)
+                if round_trip != text:
+                    text_offset = offset
+                    if not report.bytes_read:
+                        # The decoder skips a byte order mark at the start
+                        bom_length = _bom_length(source_encoding)
+                        if bom_length and chunk[:bom_length] in _BOMS:
+                            text_offset += bom_length
+                    _record_lossy(
+                        report, text, round_trip, text_offset, source_encoding
+                    )
+                # A lossy file is still read to the end to report all of its lossy
+                # characters, but no longer written
+                if allow_lossy or not report.lossy_count:
+                    out.write(data)
+                    report.bytes_written += len(data)
+                report.bytes_read += len(chunk)
+                # The decoder may hold on to the start of a character cut off by
+                # the end of the chunk
+                still_buffered = len(decoder.getstate()[0])
+                offset += buffered + len(chunk) - still_buffered
+                buffered = still_buffered
+                if final:
+                    break
+        if report.lossy_count and not allow_lossy:
+            report.status = 'lossy'
+            report.bytes_written = 0
+            os.unlink(tmp_path)
+        else:
+            os.replace(tmp_path, destination)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def transcode_file(
+    source: str | Path,
+    destination: str | Path,
+    target_encoding: str,
+    source_encoding: str | None = None,
+    encoding_manager: EncodingManager | None = None,
+    allow_lossy: bool = False,
+) -> TranscodeReport:
+    """Convert a file to another encoding, streaming it a chunk at a time.
+
+    Every converted chunk is decoded again with the target encoding and compared to
+    the source text, so characters that the target encoding can not represent are
+    reported with their byte offsets in the source. A file with such characters is
+    not written unless `allow_lossy` is set, in which case they are replaced by `?`
+    and the file is reported as converted, with the lossy characters listed.
+
+    Args:
+        source: The file to convert.
+        destination: Where to write the converted file; it may be the source itself.
+        target_encoding: The encoding to convert to.
+        source_encoding: The encoding of the source. If None, it is detected.
+        encoding_manager: Used to detect the source encoding.
+        allow_lossy: Whether to write files that do not survive the round trip.
+    """
+    source, destination = Path(source), Path(destination)
+    report = TranscodeReport(source=str(source), destination=str(destination))
+    try:
+        report.target_encoding = codecs.lookup(target_encoding).name
+        if source_encoding is None:
+            source_encoding = (encoding_manager or EncodingManager()).get_encoding(
+                source
+            )
+        report.source_encoding = codecs.lookup(source_encoding).name
+        if report.source_encoding == report.target_encoding and (
+            destination == source
+            or (destination.exists() and destination.samefile(source))
+        ):
+            report.status = 'skipped'
+            return report
+        _convert(source, destination, report, allow_lossy)
+    except (OSError, UnicodeError, LookupError) as e:
+        report.status = 'failed'
+        report.error = str(e)
+    return report
+
+
+# The encoding manager of a worker process, so detected encodings are cached
+# across the files of all its tasks
+_worker_encoding_manager: EncodingManager | None = None
+
+
+def _init_worker(encoding_cache_path: str | None) -> None:
+    global _worker_encoding_manager
+    _worker_encoding_manager = EncodingManager(
+        persistent_cache_path=encoding_cache_path
+    )
+
+
+def _transcode_batch(
+    jobs: list[tuple[Path, Path]],
+    target_encoding: str,
+    source_encoding: str | None,
+    allow_lossy: bool,
+) -> list[TranscodeReport]:
+    return [
+        transcode_file(
+            source,
+            destination,
+            target_encoding,
+            source_encoding,
+            _worker_encoding_manager,
+            allow_lossy,
+        )
+        for source, destination in jobs
+    ]
+
+
+def _iter_files(root: Path, exclude: Path | None) -> Iterator[Path]:
+    """Regular files under a directory, skipping hidden entries and symlinks."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            name
+            for name in dirnames
+            if not name.startswith('.') and Path(dirpath, name) != exclude
+        )
+        for name in sorted(filenames):
+            path = Path(dirpath, name)
+            if not name.startswith('.') and not path.is_symlink():
+                yield path
+
+
+def transcode_tree(
+    source_root: str | Path,
+    target_encoding: str,
+    destination_root: str | Path | None = None,
+    source_encoding: str | None = None,
+    allow_lossy: bool = False,
+    max_workers: int | None = None,
+    encoding_cache_path: str | None = None,
+) -> Iterator[TranscodeReport]:
+    """Convert all files under a directory to another encoding in a process pool.
+
+    Files are handed to the workers in batches, and only a few batches per worker
+    are in flight at once, so memory stays bounded however many files there are.
+    Hidden files and directories and symlinks are skipped. Reports are yielded as
+    files are converted, which is not necessarily in order.
+
+    Args:
+        source_root: The directory to convert.
+        target_encoding: The encoding to convert to.
+        destination_root: Where to write the converted tree. If None, the files
+            are converted in place.
+        source_encoding: The encoding of all files. If None, it is detected per file.
+        allow_lossy: Whether to write files that do not survive the round trip.
+        max_workers: Number of worker processes; defaults to the number of CPUs.
+        encoding_cache_path: Database of detected encodings shared by the workers.
+    """
+    source_root = Path(source_root)
+    destination = Path(destination_root) if destination_root is not None else None
+    jobs = (
+        (path, destination / path.relative_to(source_root) if destination else path)
+        for path in _iter_files(source_root, exclude=destination)
+    )
+    yield from map_batches(
+        partial(
+            _transcode_batch,
+            target_encoding=target_encoding,
+            source_encoding=source_encoding,
+            allow_lossy=allow_lossy,
+        ),
+        batched(jobs, BATCH_SIZE),
+        max_workers,
+        initializer=_init_worker,
+        initargs=(encoding_cache_path,),
+    )
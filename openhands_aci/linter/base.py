@@ -1,3 +1,5 @@
+import os
+import tempfile
 from abc import ABC, abstractmethod
 
 from pydantic import BaseModel
@@ -77,3 +79,18 @@ class BaseLinter(ABC):
         file_path: The path to the file to lint. Required to be absolute.
         """
         pass
+
+    def lint_text(self, file_path: str, text: str) -> list[LintResult]:
+        """Lint the given text as the content of a file, without writing it to disk.
+
+        file_path: The path of the file the text is the content of. Its extension
+            decides how the text is linted, and the results refer to it.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = os.path.join(temp_dir, os.path.basename(file_path))
+            with open(temp_path, 'w', encoding=self.encoding) as f:
+                f.write(text)
+            return [
+                result.model_copy(update={'file': file_path})
+                for result in self.lint(temp_path)
+            ]
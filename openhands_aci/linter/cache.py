@@ -0,0 +1,58 @@
+import hashlib
+import threading
+
+from cachetools import LRUCache
+
+from .base import BaseLinter, LintResult
+
+# (linter, file extension, hash of the content)
+CacheKey = tuple[str, str, str]
+
+
+class LintResultCache:
+    """Bounded cache of lint results, keyed by linter, file extension and content hash.
+
+    The results of a content do not depend on where the file is, so they are
+    stored without their path and given the path of the file they are looked up
+    for. The cache is thread-safe and can be shared by several linters.
+    """
+
+    DEFAULT_MAX_ENTRIES = 256
+
+    def __init__(self, max_entries: int | None = None):
+        self._cache: LRUCache[CacheKey, list[LintResult]] = LRUCache(
+            maxsize=max_entries or self.DEFAULT_MAX_ENTRIES
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _make_key(linter: BaseLinter, extension: str, text: str) -> CacheKey:
+        digest = hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+        return (type(linter).__qualname__, extension, digest)
+
+    def lint_text(
+        self, linter: BaseLinter, extension: str, file_path: str, text: str
+    ) -> list[LintResult]:
+        """Lint a text with a linter, unless it was linted before."""
+        key = self._make_key(linter, extension, text)
+        with self._lock:
+            results = self._cache.get(key)
+            if results is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if results is None:
+            results = linter.lint_text(file_path, text)
+            with self._lock:
+                self._cache[key] = results
+        return [result.model_copy(update={'file': file_path}) for result in results]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared by the linters of all editors in the process
+shared_lint_cache = LintResultCache()
@@ -1,15 +1,102 @@
-from typing import List
+import io
+import logging
+import operator
+import subprocess
+import threading
+from typing import Any, List
 
 from openhands_aci.utils.logger import oh_aci_logger as logger
-from openhands_aci.utils.shell import run_shell_cmd
 
 from ..base import BaseLinter, LintResult
 
+# The flake8 checks of errors that keep the code from running
+FATAL_FLAKE8_CODES = 'F821,F822,F831,E112,E113,E999,E902'
 
-def python_compile_lint(fname: str) -> list[LintResult]:
+_flake8_lock = threading.Lock()
+_flake8: tuple[Any, Any] | None = None
+# Cleared when flake8 can not be run in this process, e.g. because its internals
+# changed, after which the flake8 command is run instead
+_flake8_in_process = True
+
+
+def _load_flake8() -> tuple[Any, Any]:
+    """Load the flake8 plugins and options once per process.
+
+    Finding and loading the plugins is most of the time a run of flake8 takes, so
+    they are kept for all the files linted afterwards.
+
+    Raises:
+        ImportError: If flake8 is not installed
+    """
+    global _flake8
+    with _flake8_lock:
+        if _flake8 is None:
+            from flake8.options.parse_args import parse_args
+
+            # flake8 logs every file and violation at debug level, which run as a
+            # command it kept to itself; do not let it flood the host's logs
+            logging.getLogger('flake8').setLevel(logging.WARNING)
+            _flake8 = parse_args(
+                [f'--select={FATAL_FLAKE8_CODES}', '--isolated', '--color=never']
+            )
+        return _flake8
+
+
+def _run_flake8(filepath: str, code: str | None) -> str:
+    """Run flake8 in this process and return its output, line for line the same as the command's."""
+    from flake8.checker import FileChecker
+    from flake8.formatting.default import Default
+    from flake8.processor import FileProcessor
+    from flake8.style_guide import StyleGuideManager
+
+    plugins, options = _load_flake8()
+    output: list[str] = []
+
+    class Collector(Default):
+        def handle(self, error):
+            output.append(self.format(error))
+
+    class TextChecker(FileChecker):
+        def _make_processor(self):
+            if code is None:
+                return super()._make_processor()
+            # The lines of the code as flake8 reads them from a file
+            lines = io.StringIO(code).readlines()
+            return FileProcessor(self.filename, self.options, lines=lines)
+
+    checker = TextChecker(filename=filepath, plugins=plugins.checkers, options=options)
+    _, results, _ = checker.run_checks()
+    guide = StyleGuideManager(options, Collector(options))
+    results.sort(key=operator.itemgetter(1, 2))
+    with guide.processing_file(filepath):
+        for error_code, line_number, column, text, physical_line in results:
+            guide.handle_error(
+                error_code, filepath, line_number, column, text, physical_line
+            )
+    return '\n'.join(output)
+
+
+def _run_flake8_command(filepath: str, code: str | None) -> str:
+    """Run the flake8 command and return its output, passing the code on stdin if given."""
+    cmd = ['flake8', f'--select={FATAL_FLAKE8_CODES}', '--isolated']
+    if code is None:
+        cmd.append(filepath)
+    else:
+        cmd += ['--stdin-display-name', filepath, '-']
     try:
-        with open(fname, 'r') as f:
-            code = f.read()
+        process = subprocess.run(
+            cmd, input=code, capture_output=True, text=True, timeout=120
+        )
+    except FileNotFoundError:
+        return ''
+    return process.stdout
+
+
+def python_compile_lint(fname: str, code: str | None = None) -> list[LintResult]:
+    try:
+        if code is None:
+            with open(fname, 'r') as f:
+                code = f.read()
         compile(code, fname, 'exec')  # USE TRACEBACK BELOW HERE
         return []
     except SyntaxError as err:
@@ -24,14 +111,28 @@ def python_compile_lint(fname: str) -> list[LintResult]:
         ]
 
 
-def flake_lint(filepath: str) -> list[LintResult]:
-    fatal = 'F821,F822,F831,E112,E113,E999,E902'
-    flake8_cmd = f'flake8 --select={fatal} --isolated {filepath}'
+def flake_lint(filepath: str, code: str | None = None) -> list[LintResult]:
+    """Lint a file for fatal errors with flake8, or the given code as if it were the file.
 
-    try:
-        cmd_outputs = run_shell_cmd(flake8_cmd, truncate_after=None)[1]
-    except FileNotFoundError:
-        return []
+    flake8 runs in this process, with the same results as `flake8 --select=...
+    --isolated <filepath>`, but without starting an interpreter and loading the
+    plugins for every file. That uses flake8 internals, so if it fails the command
+    is run instead.
+    """
+    global _flake8_in_process
+    cmd_outputs = None
+    if _flake8_in_process:
+        try:
+            cmd_outputs = _run_flake8(filepath, code)
+        except ImportError:
+            return []
+        except Exception as e:
+            logger.warning(
+                f'Could not run flake8 in process ({e!r}), running the flake8 command instead'
+            )
+            _flake8_in_process = False
+    if cmd_outputs is None:
+        cmd_outputs = _run_flake8_command(filepath, code)
     results: list[LintResult] = []
     if not cmd_outputs:
         return results
@@ -83,6 +184,12 @@ class PythonLinter(BaseLinter):
             error = python_compile_lint(file_path)
         return error
 
+    def lint_text(self, file_path: str, text: str) -> list[LintResult]:
+        error = flake_lint(file_path, text)
+        if not error:
+            error = python_compile_lint(file_path, text)
+        return error
+
     def compile_lint(self, file_path: str, code: str) -> List[LintResult]:
         try:
             compile(code, file_path, 'exec')
@@ -1,9 +1,15 @@
+import threading
 import warnings
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, cast
 
+from cachetools import LRUCache
 from grep_ast import TreeContext, filename_to_lang
 from grep_ast.parsers import PARSERS
-from tree_sitter_language_pack import get_parser
+from tree_sitter import Node, Parser, Point, Tree
+from tree_sitter_language_pack import SupportedLanguage, get_parser
 
+from ...utils.diff import common_prefix_length
 from ..base import BaseLinter, LintResult
 
 # tree_sitter is throwing a FutureWarning
@@ -31,35 +37,121 @@ def tree_context(fname, code, line_nums):
     return output
 
 
-def traverse_tree(node):
-    """Traverses the tree to find errors."""
-    errors = []
-    if node.type == 'ERROR' or node.is_missing:
-        line_no = node.start_point[0] + 1
-        col_no = node.start_point[1] + 1
-        error_type = 'Missing node' if node.is_missing else 'Syntax error'
-        errors.append((line_no, col_no, error_type))
+def traverse_tree(node: Node) -> list[tuple[int, int, str]]:
+    """Traverses the tree to find errors.
 
-    for child in node.children:
-        errors += traverse_tree(child)
+    Only the subtrees that contain errors are visited, so after an edit the walk is
+    limited to the nodes around the errors instead of the whole file.
+    """
+    errors: list[tuple[int, int, str]] = []
+    if not node.has_error:
+        return errors
+    cursor = node.walk()
+    while True:
+        current = cursor.node
+        assert current is not None
+        if current.type == 'ERROR' or current.is_missing:
+            line_no = current.start_point[0] + 1
+            col_no = current.start_point[1] + 1
+            error_type = 'Missing node' if current.is_missing else 'Syntax error'
+            errors.append((line_no, col_no, error_type))
+        if current.has_error and cursor.goto_first_child():
+            continue
+        # Skip to the next subtree, climbing up until there is one
+        while not cursor.goto_next_sibling():
+            if cursor.depth == 0 or not cursor.goto_parent():
+                return errors
 
-    return errors
+
+def _point_at(source: bytes, offset: int) -> Point:
+    """The (row, byte column) of a byte offset, as tree-sitter counts them."""
+    row = source.count(b'\n', 0, offset)
+    return Point(row, offset - (source.rfind(b'\n', 0, offset) + 1))
+
+
+def _edit_tree(tree: Tree, old_source: bytes, new_source: bytes) -> None:
+    """Tell a tree parsed from `old_source` that it was changed into `new_source`.
+
+    The change is taken to be the bytes between the common prefix and suffix of the
+    two sources, so reparsing the tree only has to look at that part of the file.
+    """
+    start = common_prefix_length(old_source, new_source)
+    suffix = min(
+        common_prefix_length(old_source, new_source, from_end=True),
+        len(old_source) - start,
+        len(new_source) - start,
+    )
+    old_end = len(old_source) - suffix
+    new_end = len(new_source) - suffix
+    tree.edit(
+        start_byte=start,
+        old_end_byte=old_end,
+        new_end_byte=new_end,
+        start_point=_point_at(old_source, start),
+        old_end_point=_point_at(old_source, old_end),
+        new_end_point=_point_at(new_source, new_end),
+    )
+
+
+class _ParserPool:
+    """Parsers for each language, reused across lints.
+
+    A parser can only parse one text at a time, so each thread takes one out of the
+    pool for as long as it needs it.
+    """
+
+    def __init__(self):
+        self._idle: dict[str, list[Parser]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def parser(self, lang: str) -> Iterator[Parser]:
+        with self._lock:
+            idle = self._idle.setdefault(lang, [])
+            parser = idle.pop() if idle else None
+        if parser is None:
+            parser = get_parser(cast(SupportedLanguage, lang))
+        try:
+            yield parser
+        finally:
+            parser.reset()
+            with self._lock:
+                self._idle[lang].append(parser)
+
+
+_parser_pool = _ParserPool()
+
+
+class _ParsedFile(NamedTuple):
+    lang: str
+    source: bytes
+    tree: Tree
 
 
 class TreesitterBasicLinter(BaseLinter):
+    # Number of files whose last syntax tree is kept to reparse them incrementally
+    TREE_CACHE_SIZE = 16
+
+    def __init__(self):
+        self._trees: LRUCache[str, _ParsedFile] = LRUCache(maxsize=self.TREE_CACHE_SIZE)
+        self._trees_lock = threading.Lock()
+
     @property
     def supported_extensions(self) -> list[str]:
         return list(PARSERS.keys())
 
     def lint(self, file_path: str) -> list[LintResult]:
         """Use tree-sitter to look for syntax errors, display them with tree context."""
+        with open(file_path, 'r') as f:
+            code = f.read()
+        return self.lint_text(file_path, code)
+
+    def lint_text(self, file_path: str, text: str) -> list[LintResult]:
         lang = filename_to_lang(file_path)
         if not lang:
             return []
-        parser = get_parser(lang)
-        with open(file_path, 'r') as f:
-            code = f.read()
-        tree = parser.parse(bytes(code, 'utf-8'))
+        source = bytes(text, 'utf-8')
+        tree = self._parse(file_path, lang, source)
         errors = traverse_tree(tree.root_node)
         if not errors:
             return []
@@ -72,3 +164,29 @@ class TreesitterBasicLinter(BaseLinter):
             )
             for line, col, error_details in errors
         ]
+
+    def _parse(self, file_path: str, lang: str, source: bytes) -> Tree:
+        """Parse the content of a file, reusing the tree of its previous content."""
+        # The cached tree is taken out while it is edited, so no other thread uses it
+        with self._trees_lock:
+            previous = self._trees.pop(file_path, None)
+        old_tree = None
+        # Error recovery can go differently when a tree with errors is reparsed than
+        # when the text is parsed from scratch, so only error-free trees are reused
+        if (
+            previous is not None
+            and previous.lang == lang
+            and not previous.tree.root_node.has_error
+        ):
+            old_tree = previous.tree
+            if previous.source != source:
+                _edit_tree(old_tree, previous.source, source)
+        with _parser_pool.parser(lang) as parser:
+            tree = (
+                parser.parse(source, old_tree)
+                if old_tree is not None
+                else parser.parse(source)
+            )
+        with self._trees_lock:
+            self._trees[file_path] = _ParsedFile(lang, source, tree)
+        return tree
@@ -1,14 +1,49 @@
+import io
 import os
 from collections import defaultdict
-from difflib import SequenceMatcher
+from typing import Iterable, Iterator
 
 from ..linter.base import BaseLinter, LinterException, LintResult
+from ..linter.cache import LintResultCache, shared_lint_cache
 from ..linter.impl.python import PythonLinter
 from ..linter.impl.treesitter import TreesitterBasicLinter
+from ..utils.diff import get_line_map, get_opcodes
+from ..utils.logger import oh_aci_logger as logger
+from ..utils.pool import batched, map_batches
+
+# Number of files linted by one task of the process pool of `lint_many`
+LINT_BATCH_SIZE = 16
+
+# The linter of a worker process, so its parsers and flake8 setup are reused
+# across the files of all its tasks
+_worker_linter: 'DefaultLinter | None' = None
+
+
+def _init_worker() -> None:
+    global _worker_linter
+    _worker_linter = DefaultLinter()
+
+
+def _lint_batch(file_paths: list[str]) -> list[LintResult]:
+    assert _worker_linter is not None
+    results: list[LintResult] = []
+    for file_path in file_paths:
+        try:
+            results.extend(_worker_linter.lint(file_path))
+        except Exception as e:
+            # One file that can not be linted does not stop the others
+            logger.warning(f'Could not lint {file_path}: {e!r}')
+    return results
 
 
 class DefaultLinter(BaseLinter):
-    def __init__(self):
+    def __init__(self, cache: LintResultCache | None = None):
+        """
+        Args:
+            cache: Where the results of linting texts are kept, so the same content
+                is not linted twice. Defaults to a cache shared by the process.
+        """
+        self.cache = cache if cache is not None else shared_lint_cache
         self.linters: dict[str, list[BaseLinter]] = defaultdict(list)
         self.linters['.py'] = [PythonLinter()]
 
@@ -35,6 +70,68 @@ class DefaultLinter(BaseLinter):
                 return res
         return []
 
+    def lint_many(
+        self, file_paths: Iterable[str], max_workers: int | None = None
+    ) -> Iterator[LintResult]:
+        """Lint many files in a process pool.
+
+        The files are grouped by extension and handed to the workers in batches.
+        Each worker keeps its own linter, so parsers and linter setup are reused
+        across all the files it lints. Files with unsupported extensions are
+        skipped. Results are yielded as batches finish, so they are not
+        necessarily in the order of the files.
+
+        Args:
+            file_paths: The files to lint. Required to be absolute.
+            max_workers: Number of worker processes; defaults to the number of CPUs.
+        """
+        by_extension: dict[str, list[str]] = defaultdict(list)
+        for file_path in file_paths:
+            if not os.path.isabs(file_path):
+                raise LinterException(f'File path {file_path} is not an absolute path')
+            file_extension = os.path.splitext(file_path)[1]
+            if file_extension in self.linters:
+                by_extension[file_extension].append(file_path)
+        if not by_extension:
+            return
+        paths = [p for group in by_extension.values() for p in group]
+        yield from map_batches(
+            _lint_batch,
+            batched(paths, LINT_BATCH_SIZE),
+            max_workers,
+            initializer=_init_worker,
+        )
+
+    def lint_text(self, file_path: str, text: str) -> list[LintResult]:
+        if not os.path.isabs(file_path):
+            raise LinterException(f'File path {file_path} is not an absolute path')
+        file_extension = os.path.splitext(file_path)[1]
+
+        linters: list[BaseLinter] = self.linters.get(file_extension, [])
+        for linter in linters:
+            res = self.cache.lint_text(linter, file_extension, file_path, text)
+            # We always return the first linter's result (higher priority)
+            if res:
+                return res
+        return []
+
+    def lint_text_diff(
+        self, file_path: str, original_text: str, updated_text: str
+    ) -> list[LintResult]:
+        """Only return lint errors that are introduced by a change to the content of a file.
+
+        The same as `lint_file_diff`, but for the content before and after the change,
+        which is linted without writing it to disk. The results of both are cached,
+        so the content before an edit, usually that after the previous one, is only
+        linted once.
+        """
+        return self._select_new_errors(
+            self.lint_text(file_path, original_text),
+            self.lint_text(file_path, updated_text),
+            io.StringIO(original_text).readlines(),
+            io.StringIO(updated_text).readlines(),
+        )
+
     def lint_file_diff(
         self, original_file_path: str, updated_file_path: str
     ) -> list[LintResult]:
@@ -47,43 +144,47 @@ class DefaultLinter(BaseLinter):
         Returns:
             A list of lint errors that are introduced by the diff.
         """
-        # 1. Lint the original and updated file
-        original_lint_errors: list[LintResult] = self.lint(original_file_path)
-        updated_lint_errors: list[LintResult] = self.lint(updated_file_path)
-
-        # 2. Load the original and updated file content
+        # 1. Load the original and updated file content
         with open(original_file_path, 'r') as f:
-            old_lines = f.readlines()
+            old_text = f.read()
         with open(updated_file_path, 'r') as f:
-            new_lines = f.readlines()
+            new_text = f.read()
+        old_lines = io.StringIO(old_text).readlines()
+        new_lines = io.StringIO(new_text).readlines()
 
+        # 2. Lint the original and updated content, reusing cached results
+        original_lint_errors = self.lint_text(original_file_path, old_text)
+        updated_lint_errors = self.lint_text(updated_file_path, new_text)
+
+        return self._select_new_errors(
+            original_lint_errors, updated_lint_errors, old_lines, new_lines
+        )
+
+    def _select_new_errors(
+        self,
+        original_lint_errors: list[LintResult],
+        updated_lint_errors: list[LintResult],
+        old_lines: list[str],
+        new_lines: list[str],
+    ) -> list[LintResult]:
         # 3. Get line numbers that are changed & unchanged
+        opcodes = get_opcodes(old_lines, new_lines)
         # Map the line number of the original file to the updated file
         # NOTE: this only works for lines that are not changed (i.e., equal)
-        old_to_new_line_no_mapping: dict[int, int] = {}
-        replace_or_inserted_lines: list[int] = []
-        for (
-            tag,
-            old_idx_start,
-            old_idx_end,
-            new_idx_start,
-            new_idx_end,
-        ) in SequenceMatcher(
-            isjunk=None,
-            a=old_lines,
-            b=new_lines,
-        ).get_opcodes():
-            if tag == 'equal':
-                for idx, _ in enumerate(old_lines[old_idx_start:old_idx_end]):
-                    old_to_new_line_no_mapping[old_idx_start + idx + 1] = (
-                        new_idx_start + idx + 1
+        old_to_new_line_no_mapping = {
+            old_idx + 1: new_idx + 1
+            for old_idx, new_idx in get_line_map(opcodes).items()
+        }
+        replace_or_inserted_lines: set[int] = set()
+        for tag, old_idx_start, old_idx_end, new_idx_start, _ in opcodes:
+            if tag == 'replace' or tag == 'insert':
+                replace_or_inserted_lines.update(
+                    range(
+                        new_idx_start + 1,
+                        new_idx_start + old_idx_end - old_idx_start + 1,
                     )
-            elif tag == 'replace' or tag == 'insert':
-                for idx, _ in enumerate(old_lines[old_idx_start:old_idx_end]):
-                    replace_or_inserted_lines.append(new_idx_start + idx + 1)
-            else:
-                # omit the case of delete
-                pass
+                )
+            # omit the case of delete
 
         # 4. Get pre-existing errors in unchanged lines
         # increased error elsewhere introduced by the newlines
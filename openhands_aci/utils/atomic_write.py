@@ -0,0 +1,181 @@
+import errno
+import os
+import stat
+import tempfile
+from pathlib import Path
+from typing import Literal, TextIO, get_args
+
+FsyncPolicy = Literal['none', 'file', 'file+dir']
+FSYNC_POLICIES: tuple[str, ...] = get_args(FsyncPolicy)
+
+# Number of characters encoded and written at once
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+
+def _current_umask() -> int:
+    # The umask can only be read by setting it, so put it right back
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _copy_metadata(fd: int, target_stat: os.stat_result | None) -> bool:
+    """Give a temporary file the mode and owner of the file it will replace.
+
+    Returns False if the owner can not be preserved.
+    """
+    if target_stat is None:
+        os.fchmod(fd, 0o666 & ~_current_umask())
+        return True
+
+    os.fchmod(fd, stat.S_IMODE(target_stat.st_mode))
+    tmp_stat = os.fstat(fd)
+    if (tmp_stat.st_uid, tmp_stat.st_gid) != (target_stat.st_uid, target_stat.st_gid):
+        try:
+            os.fchown(fd, target_stat.st_uid, target_stat.st_gid)
+        except PermissionError:
+            return False
+    return True
+
+
+def _stat_target(target: str) -> os.stat_result | None:
+    """Stat the file to replace, or return None if it does not exist.
+
+    Raises:
+        PermissionError: If the file exists but may not be written.
+    """
+    try:
+        target_stat = os.stat(target)
+    except FileNotFoundError:
+        return None
+    # Replacing a file only takes write access to its directory, so check that the
+    # file itself may be written, as opening it for writing would
+    if not os.access(target, os.W_OK):
+        raise PermissionError(errno.EACCES, os.strerror(errno.EACCES), target)
+    return target_stat
+
+
+def _write_text(f: TextIO, text: str) -> None:
+    # Writing a chunk at a time avoids encoding the whole text into one buffer
+    for start in range(0, len(text), WRITE_CHUNK_SIZE):
+        f.write(text[start : start + WRITE_CHUNK_SIZE])
+
+
+def _write_in_place(path: str, text: str, encoding: str, fsync: FsyncPolicy) -> None:
+    with open(path, 'w', encoding=encoding) as f:
+        _write_text(f, text)
+        if fsync != 'none':
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def atomic_write(
+    path: str | Path,
+    text: str,
+    encoding: str = 'utf-8',
+    fsync: FsyncPolicy = 'none',
+) -> None:
+    """Atomically replace the content of a text file.
+
+    The content is written to a temporary file in the same directory as the target
+    and then moved over it with `os.replace`, so readers never see a partially
+    written file and the move never turns into a copy across filesystems. If the
+    target is a symlink, the file it points to is replaced.
+
+    An existing file keeps its mode and, when possible, its owner and group; a new
+    file gets the default mode for the current umask. The file is written in place
+    instead when a temporary file can not be created next to it, when its owner can
+    not be preserved, or when it has other hard links that replacing it would break.
+
+    Args:
+        path: The file to write.
+        text: The new content of the file.
+        encoding: The encoding to write the content with.
+        fsync: 'none' leaves flushing to the OS, 'file' syncs the file content
+            before it replaces the target, and 'file+dir' also syncs the directory
+            so the replacement itself survives a crash.
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(
+            f'Invalid fsync policy: {fsync}. Expected one of {", ".join(FSYNC_POLICIES)}.'
+        )
+
+    target = os.path.realpath(path)
+    target_stat = _stat_target(target)
+    if target_stat is not None and target_stat.st_nlink > 1:
+        _write_in_place(target, text, encoding, fsync)
+        return
+
+    directory, name = os.path.split(target)
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f'.{name}.', suffix='.tmp', dir=directory or '.'
+        )
+    except OSError:
+        # e.g. the file is writable but its directory is not
+        _write_in_place(target, text, encoding, fsync)
+        return
+
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as f:
+            owner_kept = _copy_metadata(f.fileno(), target_stat)
+            if owner_kept:
+                _write_text(f, text)
+                if fsync != 'none':
+                    f.flush()
+                    os.fsync(f.fileno())
+        if owner_kept:
+            os.replace(tmp_path, target)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+    if not owner_kept:
+        _remove(tmp_path)
+        _write_in_place(target, text, encoding, fsync)
+        return
+
+    if fsync == 'file+dir':
+        _fsync_dir(directory or '.')
+
+
+def replace_file(source: str | Path, path: str | Path) -> bool:
+    """Move a file over another one, keeping the mode and owner of the replaced file.
+
+    Like `atomic_write`, a symlink target is resolved first. The target is left
+    alone and False is returned when its owner can not be preserved or when it has
+    other hard links that replacing it would break, so the caller can write the
+    content in place instead.
+
+    Raises:
+        PermissionError: If the target exists but may not be written.
+        OSError: If the source can not be moved, e.g. to another filesystem.
+    """
+    target = os.path.realpath(path)
+    target_stat = _stat_target(target)
+    if target_stat is not None and target_stat.st_nlink > 1:
+        return False
+    fd = os.open(source, os.O_RDONLY)
+    try:
+        owner_kept = _copy_metadata(fd, target_stat)
+    finally:
+        os.close(fd)
+    if not owner_kept:
+        return False
+    os.replace(source, target)
+    return True
@@ -1,20 +1,30 @@
 import difflib
+from typing import Sequence, TypeVar
 
 import whatthepatch
 
+# Number of characters compared at once when looking for the text shared by two versions
+_COMPARE_BLOCK_SIZE = 64 * 1024
+
+# Lines that occur more often than this in the old version are not used as anchors
+# by the histogram diff; if there are only such lines, difflib aligns them instead
+_HISTOGRAM_MAX_OCCURRENCES = 64
+
+# (tag, i1, i2, j1, j2), as returned by `difflib.SequenceMatcher.get_opcodes`
+Opcode = tuple[str, int, int, int, int]
+
+_Seq = TypeVar('_Seq', bound=Sequence)
+
 
 def get_diff(old_contents: str, new_contents: str, filepath: str = 'file') -> str:
-    diff = list(
-        difflib.unified_diff(
-            old_contents.split('\n'),
-            new_contents.split('\n'),
-            fromfile=filepath,
-            tofile=filepath,
-            # do not output unchange lines
-            # because they can cause `parse_diff` to fail
-            n=0,
-        )
-    )
+    old_lines = old_contents.split('\n')
+    new_lines = new_contents.split('\n')
+    # do not output unchange lines
+    # because they can cause `parse_diff` to fail
+    hunks = _format_hunks(old_lines, new_lines, get_opcodes(old_lines, new_lines), 0)
+    if not hunks:
+        return ''
+    diff = [f'--- {filepath}', f'+++ {filepath}'] + hunks
     return '\n'.join(map(lambda x: x.rstrip(), diff))
 
 
@@ -39,3 +49,326 @@ def parse_diff(diff_patch: str) -> list[whatthepatch.patch.Change]:
         if change.old != change.new:
             output_changes.append(change)
     return output_changes
+
+
+def _format_range(start: int, length: int) -> str:
+    """Format a hunk range the way `diff -u` does, with start being 0-based."""
+    if length == 1:
+        return f'{start + 1}'
+    if length == 0:
+        # An empty range is given as the line before it
+        return f'{start},0'
+    return f'{start + 1},{length}'
+
+
+def common_prefix_length(a: _Seq, b: _Seq, from_end: bool = False) -> int:
+    """Count the characters (or bytes, or items) shared at the start (or end) of two strings.
+
+    The strings are compared a block at a time, so only two blocks are copied at once,
+    and the first block that differs is bisected to find where.
+    """
+    limit = min(len(a), len(b))
+    length = 0
+    while length < limit:
+        size = min(_COMPARE_BLOCK_SIZE, limit - length)
+        if from_end:
+            block_a = a[len(a) - length - size : len(a) - length]
+            block_b = b[len(b) - length - size : len(b) - length]
+        else:
+            block_a = a[length : length + size]
+            block_b = b[length : length + size]
+        if block_a == block_b:
+            length += size
+            continue
+        # The blocks share `low` characters, but not `high`
+        low, high = 0, size
+        while high - low > 1:
+            middle = (low + high) // 2
+            if from_end:
+                shared = block_a[size - middle :] == block_b[size - middle :]
+            else:
+                shared = block_a[:middle] == block_b[:middle]
+            if shared:
+                low = middle
+            else:
+                high = middle
+        return length + low
+    return length
+
+
+def _find_anchor(
+    a: list[int], b: list[int], a0: int, a1: int, b0: int, b1: int
+) -> tuple[int, int, int] | None:
+    """Find the run of lines to align first in `a[a0:a1]` and `b[b0:b1]`.
+
+    This is the run of shared lines that contains the line that is the rarest in
+    `a`, and is the longest of those. Returns its start in `a` and `b` and its
+    length, or None if there is no run of lines that are rare enough.
+    """
+    occurrences: dict[int, list[int]] = {}
+    for i in range(a0, a1):
+        occurrences.setdefault(a[i], []).append(i)
+
+    best: tuple[int, int, int] | None = None
+    best_count = _HISTOGRAM_MAX_OCCURRENCES
+    j = b0
+    while j < b1:
+        positions = occurrences.get(b[j])
+        next_j = j + 1
+        if positions is not None and len(positions) <= best_count:
+            for i in positions:
+                start_a, start_b = i, j
+                count = len(positions)
+                while (
+                    start_a > a0 and start_b > b0 and a[start_a - 1] == b[start_b - 1]
+                ):
+                    start_a -= 1
+                    start_b -= 1
+                    count = min(count, len(occurrences[a[start_a]]))
+                end_a, end_b = i + 1, j + 1
+                while end_a < a1 and end_b < b1 and a[end_a] == b[end_b]:
+                    count = min(count, len(occurrences[a[end_a]]))
+                    end_a += 1
+                    end_b += 1
+                length = end_a - start_a
+                if count < best_count or (
+                    count == best_count and (best is None or length > best[2])
+                ):
+                    best = (start_a, start_b, length)
+                    best_count = count
+                # Lines inside this run can not start a longer one
+                next_j = max(next_j, end_b)
+        j = next_j
+    return best
+
+
+def _matching_blocks(a: list[int], b: list[int]) -> list[tuple[int, int, int]]:
+    """Align two lists of interned lines with a histogram diff.
+
+    The rarest shared lines are aligned first, and the lines before and after them
+    are aligned the same way, which keeps changes to repetitive lines (such as
+    blank lines and braces) from being matched with unrelated code. Returns the
+    (i, j, n) blocks where `a[i:i + n] == b[j:j + n]`, in order.
+    """
+    blocks: list[tuple[int, int, int]] = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        a0, a1, b0, b1 = regions.pop()
+        # Lines shared at the start or end of the region need no searching
+        shared = 0
+        while (
+            a0 + shared < a1 and b0 + shared < b1 and a[a0 + shared] == b[b0 + shared]
+        ):
+            shared += 1
+        if shared:
+            blocks.append((a0, b0, shared))
+            a0 += shared
+            b0 += shared
+        shared = 0
+        while (
+            a0 < a1 - shared
+            and b0 < b1 - shared
+            and a[a1 - shared - 1] == b[b1 - shared - 1]
+        ):
+            shared += 1
+        if shared:
+            a1 -= shared
+            b1 -= shared
+            blocks.append((a1, b1, shared))
+        if a0 == a1 or b0 == b1:
+            continue
+
+        anchor = _find_anchor(a, b, a0, a1, b0, b1)
+        if anchor is not None:
+            i, j, n = anchor
+            blocks.append(anchor)
+            regions.append((a0, i, b0, j))
+            regions.append((i + n, a1, j + n, b1))
+        elif not set(a[a0:a1]).isdisjoint(b[b0:b1]):
+            # The shared lines are all too frequent to be anchors
+            matcher = difflib.SequenceMatcher(None, a[a0:a1], b[b0:b1], autojunk=False)
+            blocks.extend(
+                (a0 + i, b0 + j, n) for i, j, n in matcher.get_matching_blocks() if n
+            )
+
+    blocks.sort()
+    merged: list[tuple[int, int, int]] = []
+    for i, j, n in blocks:
+        if (
+            merged
+            and merged[-1][0] + merged[-1][2] == i
+            and merged[-1][1] + merged[-1][2] == j
+        ):
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + n)
+        else:
+            merged.append((i, j, n))
+    return merged
+
+
+def get_opcodes(old_lines: Sequence[str], new_lines: Sequence[str]) -> list[Opcode]:
+    """Get the changes that turn `old_lines` into `new_lines`.
+
+    The opcodes have the format of `difflib.SequenceMatcher.get_opcodes()`, but the
+    lines are aligned with a histogram diff instead of difflib's longest matching
+    blocks, so the changes found may differ from difflib's when there are several
+    valid ways to align the lines. It is also much faster on long inputs: the lines
+    shared at the start and the end are skipped a block at a time, and the others
+    are interned as integers before they are aligned.
+    """
+    prefix = common_prefix_length(old_lines, new_lines)
+    suffix = min(
+        common_prefix_length(old_lines, new_lines, from_end=True),
+        len(old_lines) - prefix,
+        len(new_lines) - prefix,
+    )
+    old_end = len(old_lines) - suffix
+    new_end = len(new_lines) - suffix
+
+    ids: dict[str, int] = {}
+    a = [ids.setdefault(line, len(ids)) for line in old_lines[prefix:old_end]]
+    b = [ids.setdefault(line, len(ids)) for line in new_lines[prefix:new_end]]
+    blocks = [(0, 0, prefix)] if prefix else []
+    blocks.extend((i + prefix, j + prefix, n) for i, j, n in _matching_blocks(a, b))
+    if suffix:
+        blocks.append((old_end, new_end, suffix))
+
+    opcodes: list[Opcode] = []
+    i = j = 0
+    for block_i, block_j, n in blocks + [(len(old_lines), len(new_lines), 0)]:
+        if i < block_i and j < block_j:
+            opcodes.append(('replace', i, block_i, j, block_j))
+        elif i < block_i:
+            opcodes.append(('delete', i, block_i, j, block_j))
+        elif j < block_j:
+            opcodes.append(('insert', i, block_i, j, block_j))
+        if n:
+            # Blocks that follow each other are merged into one equal opcode
+            if opcodes and opcodes[-1][0] == 'equal' and opcodes[-1][2] == block_i:
+                opcodes[-1] = (
+                    'equal',
+                    opcodes[-1][1],
+                    block_i + n,
+                    opcodes[-1][3],
+                    block_j + n,
+                )
+            else:
+                opcodes.append(('equal', block_i, block_i + n, block_j, block_j + n))
+        i, j = block_i + n, block_j + n
+    return opcodes
+
+
+def get_line_map(opcodes: list[Opcode]) -> dict[int, int]:
+    """Map the (0-based) index of each unchanged old line to its index in the new lines."""
+    line_map: dict[int, int] = {}
+    for tag, i1, i2, j1, _ in opcodes:
+        if tag == 'equal':
+            line_map.update(zip(range(i1, i2), range(j1, j1 + i2 - i1)))
+    return line_map
+
+
+def _format_hunks(
+    old_lines: Sequence[str],
+    new_lines: Sequence[str],
+    opcodes: list[Opcode],
+    context: int,
+    start_line: int = 0,
+) -> list[str]:
+    """Format the changes as unified diff hunks, with `context` lines around them.
+
+    `start_line` is the number of lines before `old_lines` in the file, which is
+    added to the line numbers in the hunk headers.
+    """
+    # Group the changes that are close enough to share their context
+    groups: list[list[Opcode]] = []
+    for change in opcodes:
+        if change[0] == 'equal':
+            continue
+        if groups and change[1] - groups[-1][-1][2] <= 2 * context:
+            groups[-1].append(change)
+        else:
+            groups.append([change])
+
+    output = []
+    for group in groups:
+        old_start = max(0, group[0][1] - context)
+        new_start = group[0][3] - (group[0][1] - old_start)
+        old_stop = min(len(old_lines), group[-1][2] + context)
+        new_stop = group[-1][4] + (old_stop - group[-1][2])
+        old_range = _format_range(start_line + old_start, old_stop - old_start)
+        new_range = _format_range(start_line + new_start, new_stop - new_start)
+        output.append(f'@@ -{old_range} +{new_range} @@\n')
+
+        position = old_start
+        for _, i1, i2, j1, j2 in group:
+            output.extend(' ' + line for line in old_lines[position:i1])
+            output.extend('-' + line for line in old_lines[i1:i2])
+            output.extend('+' + line for line in new_lines[j1:j2])
+            position = i2
+        output.extend(' ' + line for line in old_lines[position:old_stop])
+    return output
+
+
+def _split_lines(text: str) -> list[str]:
+    """Split text into lines at newlines only, keeping the newlines."""
+    lines = [line + '\n' for line in text.split('\n')]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def get_unified_diff(
+    old_contents: str, new_contents: str, filepath: str = 'file', context: int = 3
+) -> str:
+    """Get a unified diff between two versions of a file, with `context` lines around changes.
+
+    The text shared at the start and the end of both versions is found without
+    splitting them into lines, and only the lines in between, plus their context,
+    are compared. A small edit to a large file therefore only costs a scan of it.
+    """
+    old, new = old_contents, new_contents
+    prefix = common_prefix_length(old, new)
+    if prefix == len(old) == len(new):
+        return ''
+    suffix = common_prefix_length(old, new, from_end=True)
+    suffix = min(suffix, len(old) - prefix, len(new) - prefix)
+
+    # Start at the line with the first difference and end after the last one, so
+    # both are at the same line boundaries in the old and new contents
+    core_start = old.rfind('\n', 0, prefix) + 1
+    newline = old.find('\n', len(old) - suffix)
+    core_end = len(old) if newline == -1 else newline + 1
+    # Add the lines that can show up as context around the changes
+    start, old_end = core_start, core_end
+    for _ in range(context):
+        if start > 0:
+            start = old.rfind('\n', 0, start - 1) + 1
+        if old_end < len(old):
+            newline = old.find('\n', old_end)
+            old_end = len(old) if newline == -1 else newline + 1
+    new_end = len(new) - (len(old) - old_end)
+
+    start_line = old.count('\n', 0, start)
+    old_lines = _split_lines(old[start:old_end])
+    new_lines = _split_lines(new[start:new_end])
+    # Mark a missing newline at the end of the file the way `diff` does
+    for lines in (old_lines, new_lines):
+        if lines and not lines[-1].endswith('\n'):
+            lines[-1] += '\n\\ No newline at end of file\n'
+
+    # Only compare the lines between the shared text; the context lines around
+    # them are known to be equal, so they are always available as context even if
+    # the matcher aligns a change differently within the compared lines
+    before = old.count('\n', start, core_start)
+    after = old.count('\n', core_end, old_end) + (
+        old_end == len(old) and not old.endswith('\n') and old_end > core_end
+    )
+    opcodes = [
+        (tag, i1 + before, i2 + before, j1 + before, j2 + before)
+        for tag, i1, i2, j1, j2 in get_opcodes(
+            old_lines[before : len(old_lines) - after],
+            new_lines[before : len(new_lines) - after],
+        )
+    ]
+    hunks = _format_hunks(old_lines, new_lines, opcodes, context, start_line)
+    return ''.join([f'--- {filepath}\n', f'+++ {filepath}\n'] + hunks)
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Split items into lists of `size` items, the last one possibly shorter."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def map_batches(
+    func: Callable[[list[T]], list[R]],
+    batches: Iterable[list[T]],
+    max_workers: int | None = None,
+    initializer: Callable[..., None] | None = None,
+    initargs: tuple[Any, ...] = (),
+) -> Iterator[R]:
+    """Run a function on batches of items in a process pool, yielding the results.
+
+    Only a few batches per worker are in flight at once, so memory stays bounded
+    however many batches there are. The results of a batch are yielded as soon as
+    it is done, so they are not necessarily in the order of the batches.
+
+    Args:
+        func: The function to run on each batch; it must be picklable.
+        batches: The batches of items, which are only read as workers free up.
+        max_workers: Number of worker processes; defaults to the number of CPUs.
+        initializer: Called in each worker process when it starts.
+        initargs: The arguments to pass to `initializer`.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        pending: set[Future[list[R]]] = set()
+        for batch in batches:
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(executor.submit(func, batch))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
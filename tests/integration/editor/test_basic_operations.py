@@ -1,5 +1,6 @@
 """Tests for basic file editor operations."""
 
+import hashlib
 import json
 import re
 
@@ -213,3 +214,46 @@ def test_tab_expansion(temp_file):
     result_json = parse_result(result)
     # Tabs should be expanded in the output
     assert '\tindented\tline' in result_json['formatted_output_and_error']
+
+
+def test_file_editor_diff_result_mode(temp_file):
+    with open(temp_file, 'w') as f:
+        f.write('This is a test file.\nThis file is for testing purposes.\n')
+
+    result_json = parse_result(
+        file_editor(
+            command='str_replace',
+            path=temp_file,
+            old_str='test file',
+            new_str='sample file',
+            result_mode='diff',
+        )
+    )
+    assert result_json['old_content'] is None
+    assert result_json['new_content'] is None
+    assert (
+        result_json['diff']
+        == f"""--- {temp_file}
++++ {temp_file}
+@@ -1,2 +1,2 @@
+-This is a test file.
++This is a sample file.
+ This file is for testing purposes.
+"""
+    )
+    assert (
+        result_json['new_content_hash']
+        == hashlib.sha256(
+            b'This is a sample file.\nThis file is for testing purposes.\n'
+        ).hexdigest()
+    )
+
+    # Undo shows the change that was undone rather than the whole file
+    result_json = parse_result(
+        file_editor(command='undo_edit', path=temp_file, result_mode='diff')
+    )
+    assert result_json['formatted_output_and_error'] == (
+        f'Last edit to {temp_file} undone successfully. The changes that were undone:\n'
+        + result_json['diff']
+    )
+    assert '-This is a sample file.\n+This is a test file.\n' in result_json['diff']
@@ -0,0 +1,108 @@
+"""Integration tests for editing files of fixed-length records."""
+
+import pytest
+
+from openhands_aci.editor.editor import OHEditor
+from openhands_aci.editor.exceptions import ToolError
+
+
+def make_records(lines, encoding='cp1047', length=80):
+    return b''.join(line.ljust(length).encode(encoding) for line in lines)
+
+
+@pytest.fixture
+def cobol_file(tmp_path):
+    path = tmp_path / 'PAYROLL.cbl'
+    lines = [f'{i * 100:06}     DISPLAY "LINE {i}".' for i in range(1, 21)]
+    path.write_bytes(make_records(lines))
+    return path, lines
+
+
+def test_view_range_of_records(cobol_file):
+    path, lines = cobol_file
+    editor = OHEditor()
+    result = editor(command='view', path=str(path), view_range=[3, 5])
+    assert result.output is not None
+    assert f'     3\t{lines[2]}\n' in result.output
+    assert f'     5\t{lines[4]}\n' in result.output
+    assert lines[5] not in result.output
+
+    result = editor(command='view', path=str(path))
+    assert result.output is not None
+    assert f'    20\t{lines[19]}\n' in result.output
+
+
+def test_view_range_of_records_beyond_the_size_limit(tmp_path):
+    path = tmp_path / 'LARGE.cbl'
+    lines = [f'{i:08}     MOVE A TO B.' for i in range(1, 30001)]
+    path.write_bytes(make_records(lines))
+    editor = OHEditor(max_file_size_mb=1)
+
+    result = editor(command='view', path=str(path), view_range=[25000, 25002])
+    assert result.output is not None
+    assert f' 25001\t{lines[25000]}\n' in result.output
+
+    # The whole file is still too large
+    with pytest.raises(ToolError, match='too large'):
+        editor(command='view', path=str(path))
+
+
+def test_str_replace_keeps_records_padded(cobol_file):
+    path, lines = cobol_file
+    editor = OHEditor()
+    result = editor(
+        command='str_replace',
+        path=str(path),
+        old_str='DISPLAY "LINE 7".',
+        new_str='DISPLAY "LINE 7".\n000750     DISPLAY "MORE".',
+    )
+    assert result.output is not None
+    assert '000750     DISPLAY "MORE".' in result.output
+
+    lines.insert(7, '000750     DISPLAY "MORE".')
+    assert path.read_bytes() == make_records(lines)
+
+    editor(command='undo_edit', path=str(path))
+    assert path.read_bytes() == make_records(lines[:7] + lines[8:])
+
+
+def test_insert_records(cobol_file):
+    path, lines = cobol_file
+    editor = OHEditor()
+    editor(
+        command='insert',
+        path=str(path),
+        insert_line=20,
+        new_str='002100     STOP RUN.',
+    )
+    assert path.read_bytes() == make_records(lines + ['002100     STOP RUN.'])
+
+
+def test_lines_longer_than_a_record_are_rejected(cobol_file):
+    path, lines = cobol_file
+    data = path.read_bytes()
+    editor = OHEditor()
+    with pytest.raises(ToolError, match='does not fit in a record of 80 bytes'):
+        editor(
+            command='str_replace',
+            path=str(path),
+            old_str='LINE 3',
+            new_str='LINE 3' + 'x' * 80,
+        )
+    assert path.read_bytes() == data
+
+
+def test_configured_record_length(tmp_path):
+    path = tmp_path / 'data' / 'CUSTOMERS.dat'
+    path.parent.mkdir()
+    path.write_bytes(make_records(['ALICE', 'BOB'], encoding='ascii', length=20))
+    editor = OHEditor(record_lengths={str(tmp_path / 'data' / '*.dat'): 20})
+
+    result = editor(command='view', path=str(path))
+    assert result.output is not None
+    assert '     2\tBOB\n' in result.output
+
+    editor(command='str_replace', path=str(path), old_str='BOB', new_str='ROBERT')
+    assert path.read_bytes() == make_records(
+        ['ALICE', 'ROBERT'], encoding='ascii', length=20
+    )
@@ -352,3 +352,29 @@ def test_mixed_encoding_workflow():
             os.unlink(path2)
         except FileNotFoundError:
             pass
+
+
+def test_str_replace_ebcdic_file(tmp_path):
+    """Test editing a COBOL source encoded in EBCDIC (cp1047)."""
+    path = tmp_path / 'HELLO.cbl'
+    source = (
+        '       IDENTIFICATION DIVISION.\n'
+        '       PROGRAM-ID. HELLO.\n'
+        '       PROCEDURE DIVISION.\n'
+        '           DISPLAY "HELLO, WORLD" WS-TABLE[1].\n'
+        '           STOP RUN.\n'
+    )
+    path.write_bytes(source.encode('cp1047'))
+
+    result = file_editor(
+        command='str_replace',
+        path=str(path),
+        old_str='HELLO, WORLD',
+        new_str='HELLO, Z/OS',
+        enable_linting=False,
+    )
+    result_json = parse_result(result)
+    assert 'HELLO, Z/OS' in result_json['formatted_output_and_error']
+
+    # The file is written back in the same code page
+    assert path.read_bytes() == source.replace('WORLD', 'Z/OS').encode('cp1047')
@@ -8,7 +8,7 @@ from pathlib import Path
 import psutil
 import pytest
 
-from openhands_aci.editor import file_editor
+from openhands_aci.editor import file_editor, file_editor_stream
 
 # Skip all tests in this module on non-Unix platforms
 pytestmark = pytest.mark.skipif(
@@ -233,6 +233,68 @@ def test_view_full_file_peak_memory():
         check_memory_usage(initial['max'], file_size, 'view_full')
 
 
+def test_streamed_str_replace_peak_memory():
+    """Test that streaming the result of an edit to a large file keeps peak memory low.
+
+    A full str_replace result holds both the old and the new content, so the edit
+    itself needs about 2x the file size and the overall growth is checked against
+    the same budget as `file_editor`. Serializing the result is what streaming
+    saves memory on, so it is checked on its own against 1x the file size.
+    """
+    import tracemalloc
+
+    with tempfile.NamedTemporaryFile() as temp_file:
+        path = Path(temp_file.name)
+        file_size = create_test_file(path)
+
+        # Force Python to release file handles and clear buffers
+        import gc
+
+        gc.collect()
+
+        # Get initial memory usage
+        initial = get_memory_info()
+        print(f'Initial memory usage: {initial["rss"] / 1024 / 1024:.2f} MB')
+
+        # Set memory limit
+        set_memory_limit(file_size)
+
+        # Write the result out chunk by chunk, like a server would
+        try:
+            chunks = file_editor_stream(
+                command='str_replace',
+                path=path,
+                old_str='Line 5000:',
+                new_str='Modified line:',
+                enable_linting=False,
+            )
+            with open(os.devnull, 'w') as sink:
+                # The edit runs before the first chunk is yielded
+                output_size = sink.write(next(chunks))
+                tracemalloc.start()
+                for chunk in chunks:
+                    sink.write(chunk)
+                    output_size += len(chunk)
+                _, serialization_peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+        except MemoryError:
+            pytest.fail('Memory limit exceeded - peak memory usage too high')
+        except Exception as e:
+            if 'Cannot allocate memory' in str(e):
+                pytest.fail('Memory limit exceeded - peak memory usage too high')
+            raise
+
+        # Both the old and the new content were serialized
+        assert output_size > 2 * file_size
+        print(f'Serialization peak: {serialization_peak / 1024 / 1024:.2f} MB')
+        assert serialization_peak < file_size, (
+            f'Peak memory of serializing the result too high: '
+            f'{serialization_peak / 1024 / 1024:.2f} MB '
+            f'(limit: {file_size / 1024 / 1024:.2f} MB)'
+        )
+        check_memory_usage(initial['max'], file_size, 'streamed str_replace')
+
+
 def test_large_history_insert():
     """Test inserting a large amount of data into the history cache."""
     import logging
@@ -1,7 +1,13 @@
+import os
+import re
+import shutil
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
+from openhands_aci.editor import history
+from openhands_aci.editor.config import MAX_RESPONSE_LEN_CHAR
 from openhands_aci.editor.editor import OHEditor
 from openhands_aci.editor.exceptions import (
     EditorToolParameterInvalidError,
@@ -55,6 +61,96 @@ def test_view_directory(editor):
     )
 
 
+def test_view_directory_in_pages(tmp_path):
+    editor = OHEditor()
+    for i in range(5):
+        (tmp_path / f'file{i}.txt').write_text('')
+    (tmp_path / '.hidden').write_text('')
+
+    result = editor(command='view', path=str(tmp_path), page_size=4)
+    assert result.output.startswith(
+        f"""Here's the files and directories up to 2 levels deep in {tmp_path}, excluding hidden items:
+{tmp_path}/
+{tmp_path}/file0.txt
+{tmp_path}/file1.txt
+{tmp_path}/file2.txt
+"""
+    )
+    assert '1 hidden files/directories' in result.output
+    cursor = re.search(r'`cursor` set to `([^`]+)`', result.output).group(1)
+
+    # A fresh editor can continue from the cursor as well
+    for ed in (editor, OHEditor()):
+        result = ed(command='view', path=str(tmp_path), page_size=4, cursor=cursor)
+        assert (
+            result.output
+            == f"""Here's the files and directories up to 2 levels deep in {tmp_path}, excluding hidden items:
+{tmp_path}/file3.txt
+{tmp_path}/file4.txt"""
+        )
+
+
+def test_view_directory_page_reports_only_its_own_errors(tmp_path):
+    editor = OHEditor()
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'file.txt').write_text('')
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if os.path.basename(path) in ('a', 'b'):
+            raise PermissionError(13, 'Permission denied')
+        return scandir(path)
+
+    with patch('openhands_aci.editor.directory.os.scandir', failing_scandir):
+        result = editor(command='view', path=str(tmp_path), page_size=2)
+        assert result.error == f'Cannot list {tmp_path / "a"}: Permission denied'
+        cursor = re.search(r'`cursor` set to `([^`]+)`', result.output).group(1)
+        result = editor(command='view', path=str(tmp_path), page_size=2, cursor=cursor)
+    assert result.error == f'Cannot list {tmp_path / "b"}: Permission denied'
+
+
+def test_view_directory_pages_with_long_names_list_every_entry(tmp_path):
+    editor = OHEditor()
+    names = [f'{"x" * 100}_{i:03}.txt' for i in range(300)]
+    for name in names:
+        (tmp_path / name).write_text('')
+
+    # Restarting from the cursor has to give the same pages as continuing the walk
+    for ed in (editor, None):
+        listed = []
+        cursor = None
+        while True:
+            result = (ed or OHEditor())(
+                command='view', path=str(tmp_path), page_size=250, cursor=cursor
+            )
+            assert len(result.output) < MAX_RESPONSE_LEN_CHAR + 1000
+            assert DIRECTORY_CONTENT_TRUNCATED_NOTICE not in result.output
+            listed += re.findall(r'^(/.*)$', result.output, re.MULTILINE)
+            match = re.search(r'`cursor` set to `([^`]+)`', result.output)
+            if match is None:
+                break
+            cursor = match.group(1)
+        assert listed == [f'{tmp_path}/'] + [str(tmp_path / name) for name in names]
+
+
+def test_view_directory_page_parameters_validation(tmp_path):
+    editor = OHEditor()
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('content')
+
+    with pytest.raises(EditorToolParameterInvalidError) as exc_info:
+        editor(command='view', path=str(test_file), page_size=10)
+    assert 'only allowed when `path` points to a directory' in str(
+        exc_info.value.message
+    )
+    with pytest.raises(EditorToolParameterInvalidError):
+        editor(command='view', path=str(tmp_path), page_size=0)
+    with pytest.raises(EditorToolParameterInvalidError) as exc_info:
+        editor(command='view', path=str(tmp_path), cursor='bogus')
+    assert 'cursor' in exc_info.value.message
+
+
 def test_view_with_a_specific_range(editor):
     editor, test_file = editor
 
@@ -287,6 +383,154 @@ def test_str_replace_with_none_old_str(editor):
     assert 'old_str' in str(exc_info.value.message)
 
 
+def test_multi_edit(editor):
+    editor, test_file = editor
+    test_file.write_text('\n'.join(f'Line {i}' for i in range(1, 21)) + '\n')
+    result = editor(
+        command='multi_edit',
+        path=str(test_file),
+        edits=[
+            {'old_str': 'Line 2\n', 'new_str': 'Second line\n'},
+            {'old_str': 'Line 18', 'new_str': 'Line eighteen'},
+            # Applied to the result of the first edit
+            {'old_str': 'Second line', 'new_str': 'Line two'},
+        ],
+    )
+    assert isinstance(result, CLIResult)
+    lines = test_file.read_text().split('\n')
+    assert lines[1] == 'Line two'
+    assert lines[17] == 'Line eighteen'
+    assert result.new_content == test_file.read_text()
+    # Edits far apart get a snippet each
+    assert result.output.count("Here's the result of running `cat -n`") == 2
+    assert '     2\tLine two' in result.output
+    assert '    18\tLine eighteen' in result.output
+    assert 'Line 10' not in result.output
+
+    # The whole batch is undone at once
+    editor(command='undo_edit', path=str(test_file))
+    assert test_file.read_text().split('\n')[1:18:16] == ['Line 2', 'Line 18']
+
+
+def test_multi_edit_fails_as_a_batch(editor):
+    editor, test_file = editor
+    original = test_file.read_text()
+    with pytest.raises(ToolError) as exc_info:
+        editor(
+            command='multi_edit',
+            path=str(test_file),
+            edits=[
+                {'old_str': 'test file', 'new_str': 'sample file'},
+                {'old_str': 'not in the file', 'new_str': 'anything'},
+            ],
+        )
+    assert exc_info.value.message.startswith(
+        'Edit 2 of 2 failed, so none of the edits were applied. No replacement was performed'
+    )
+    assert test_file.read_text() == original
+    with pytest.raises(ToolError, match='No edit history'):
+        editor(command='undo_edit', path=str(test_file))
+
+
+def test_multi_edit_parameter_validation(editor):
+    editor, test_file = editor
+    with pytest.raises(EditorToolParameterMissingError):
+        editor(command='multi_edit', path=str(test_file))
+    with pytest.raises(EditorToolParameterInvalidError):
+        editor(command='multi_edit', path=str(test_file), edits=[])
+    with pytest.raises(EditorToolParameterInvalidError):
+        editor(command='multi_edit', path=str(test_file), edits=[{'new_str': 'x'}])
+    with pytest.raises(EditorToolParameterInvalidError):
+        editor(
+            command='multi_edit',
+            path=str(test_file),
+            edits=[{'old_str': 'test', 'new_str': 1}],
+        )
+    with pytest.raises(EditorToolParameterInvalidError):
+        editor(
+            command='multi_edit',
+            path=str(test_file),
+            edits=[{'old_str': 'test', 'new_str': 'test'}],
+        )
+
+
+def test_apply_patch(tmp_path):
+    editor = OHEditor()
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'a.py').write_text('def a():\n    return 1\n')
+    (tmp_path / 'b.txt').write_text('first\nsecond\nthird\n')
+    patch = """diff --git a/pkg/a.py b/pkg/a.py
+--- a/pkg/a.py
++++ b/pkg/a.py
+@@ -1,2 +1,2 @@
+ def a():
+-    return 1
++    return 2
+diff --git a/b.txt b/b.txt
+--- a/b.txt
++++ b/b.txt
+@@ -1,3 +1,4 @@
+ first
+ second
++second and a half
+ third
+diff --git a/pkg/new.py b/pkg/new.py
+new file mode 100644
+--- /dev/null
++++ b/pkg/new.py
+@@ -0,0 +1 @@
++NEW = True
+"""
+    result = editor(command='apply_patch', path=str(tmp_path), patch=patch)
+    assert isinstance(result, CLIResult)
+    assert 'The patch has been applied to 3 files' in result.output
+    assert f'- {tmp_path}/pkg/new.py (created)' in result.output
+    assert (tmp_path / 'pkg' / 'a.py').read_text() == 'def a():\n    return 2\n'
+    assert (
+        tmp_path / 'b.txt'
+    ).read_text() == 'first\nsecond\nsecond and a half\nthird\n'
+    assert (tmp_path / 'pkg' / 'new.py').read_text() == 'NEW = True\n'
+
+    # Each edited file can be undone on its own
+    editor(command='undo_edit', path=str(tmp_path / 'b.txt'))
+    assert (tmp_path / 'b.txt').read_text() == 'first\nsecond\nthird\n'
+    assert (tmp_path / 'pkg' / 'a.py').read_text() == 'def a():\n    return 2\n'
+
+
+def test_apply_patch_fails_as_a_whole(tmp_path):
+    editor = OHEditor()
+    (tmp_path / 'a.txt').write_text('one\ntwo\n')
+    (tmp_path / 'b.txt').write_text('three\nfour\n')
+    patch = """--- a.txt
++++ a.txt
+@@ -1,2 +1,2 @@
+ one
+-two
++2
+--- b.txt
++++ b.txt
+@@ -1,2 +1,2 @@
+ three
+-five
++5
+"""
+    with pytest.raises(ToolError) as exc_info:
+        editor(command='apply_patch', path=str(tmp_path), patch=patch)
+    assert exc_info.value.message.startswith(
+        'Failed to apply the patch to b.txt: hunk 1'
+    )
+    assert (tmp_path / 'a.txt').read_text() == 'one\ntwo\n'
+
+    with pytest.raises(ToolError, match='can not contain `..`'):
+        editor(
+            command='apply_patch',
+            path=str(tmp_path),
+            patch=patch.replace('a.txt', '../a.txt'),
+        )
+    with pytest.raises(EditorToolParameterInvalidError, match='not a directory'):
+        editor(command='apply_patch', path=str(tmp_path / 'a.txt'), patch=patch)
+
+
 def test_insert_no_linting(editor):
     editor, test_file = editor
     result = editor(
@@ -433,6 +677,66 @@ def test_multiple_undo_edits(editor):
     assert 'test file' in test_file.read_text()  # Original content restored
 
 
+def test_undo_edit_restores_snapshot(tmp_path, monkeypatch):
+    # Copies stand in for reflinks, which the filesystem of the tests may not support
+    monkeypatch.setattr(history, 'supports_reflink', lambda directory: True)
+    monkeypatch.setattr(
+        history, 'clone_file', lambda src, dst: bool(shutil.copy(src, dst))
+    )
+    editor = OHEditor()
+    test_file = tmp_path / 'test.txt'
+    test_file.write_bytes(b'This is a test file.\r\nSecond line.\r\n')
+    editor(
+        command='str_replace',
+        path=str(test_file),
+        old_str='test file',
+        new_str='sample file',
+    )
+    assert 'sample file' in test_file.read_text()
+
+    with patch.object(editor, 'write_file') as write_file:
+        result = editor(command='undo_edit', path=str(test_file))
+    write_file.assert_not_called()
+    assert result.new_content == 'This is a test file.\nSecond line.\n'
+    # The file is restored byte for byte, line endings included
+    assert test_file.read_bytes() == b'This is a test file.\r\nSecond line.\r\n'
+    result = editor(command='view', path=str(test_file))
+    assert 'This is a test file.' in result.output
+
+
+def test_undo_edits_mixing_snapshots_and_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, 'supports_reflink', lambda directory: True)
+    monkeypatch.setattr(
+        history, 'clone_file', lambda src, dst: bool(shutil.copy(src, dst))
+    )
+    editor = OHEditor()
+    test_file = tmp_path / 'test.txt'
+    first = 'This is a test file.\n' + 'Some filler line.\n' * 3000
+    editor(command='create', path=str(test_file), file_text=first)
+    # str_replace snapshots the file, apply_patch keeps its content as chunks
+    editor(command='str_replace', path=str(test_file), old_str='test', new_str='sample')
+    second = test_file.read_text()
+    patch = """--- a/test.txt
++++ b/test.txt
+@@ -1,2 +1,2 @@
+-This is a sample file.
++This is a patched file.
+ Some filler line.
+"""
+    editor(command='apply_patch', path=str(tmp_path), patch=patch)
+    assert test_file.read_text().startswith('This is a patched file.')
+
+    editor(command='undo_edit', path=str(test_file))
+    assert test_file.read_text() == second
+    editor(command='undo_edit', path=str(test_file))
+    assert test_file.read_text() == first
+    # The entry of `create` is the content it created
+    editor(command='undo_edit', path=str(test_file))
+    assert test_file.read_text() == first
+    with pytest.raises(ToolError):
+        editor(command='undo_edit', path=str(test_file))
+
+
 def test_validate_path_invalid(editor):
     editor, test_file = editor
     invalid_file = test_file.parent / 'nonexistent.txt'
@@ -699,3 +1003,124 @@ def test_str_replace_and_insert_snippet_output_on_a_large_file(editor):
         new_str='Inserted line at 500',
     )
     assert '   500\tInserted line at 500' in result.output
+
+
+def test_insert_at_end_of_file_without_trailing_newline(editor):
+    editor, test_file = editor
+    result = editor(
+        command='insert', path=str(test_file), insert_line=2, new_str='Appended line'
+    )
+    assert (
+        test_file.read_text()
+        == 'This is a test file.\nThis file is for testing purposes.Appended line\n'
+    )
+    assert result.old_content == (
+        'This is a test file.\nThis file is for testing purposes.'
+    )
+    assert result.new_content == test_file.read_text()
+
+
+def test_insert_preserves_file_mode(editor):
+    editor, test_file = editor
+    test_file.chmod(0o644)
+    editor(command='insert', path=str(test_file), insert_line=0, new_str='First line')
+    assert test_file.stat().st_mode & 0o777 == 0o644
+
+
+def test_edits_replace_file_atomically(tmp_path):
+    editor = OHEditor(fsync_policy='file+dir')
+    test_file = tmp_path / 'test.txt'
+    editor(command='create', path=str(test_file), file_text='Line 1\nLine 2\n')
+    editor(command='str_replace', path=str(test_file), old_str='Line 1', new_str='One')
+    editor(command='insert', path=str(test_file), insert_line=2, new_str='Line 3')
+    editor(command='undo_edit', path=str(test_file))
+    assert test_file.read_text() == 'One\nLine 2\n'
+    # No temporary files are left next to the edited file
+    assert os.listdir(tmp_path) == ['test.txt']
+
+    with pytest.raises(ValueError):
+        OHEditor(fsync_policy='always')  # type: ignore[arg-type]
+
+
+def test_command_looks_up_file_metadata_once(editor):
+    editor, test_file = editor
+    # Warm up the encoding cache, which stats the file when detecting the encoding
+    editor(command='view', path=str(test_file))
+
+    stat_calls = []
+    real_stat = os.stat
+
+    def counting_stat(path, *args, **kwargs):
+        if str(path) == str(test_file):
+            stat_calls.append(path)
+        return real_stat(path, *args, **kwargs)
+
+    with patch('os.stat', side_effect=counting_stat), patch(
+        'openhands_aci.editor.file_state.is_binary', return_value=False
+    ) as mock_is_binary:
+        editor(
+            command='str_replace',
+            path=str(test_file),
+            old_str='test file',
+            new_str='new file',
+        )
+    # Once before the edit, once while writing and once for the written file
+    assert len(stat_calls) == 3
+    mock_is_binary.assert_called_once()
+    assert 'new file' in test_file.read_text()
+
+
+def test_edits_keep_the_detected_encoding(tmp_path):
+    editor = OHEditor()
+    test_file = tmp_path / 'test.txt'
+    test_file.write_bytes(
+        'Привет, мир! Это тестовый файл в кодировке windows-1251.\n'
+        'Вторая строка с русским текстом.\n'.encode('cp1251')
+    )
+    editor(command='str_replace', path=str(test_file), old_str='мир', new_str='свет')
+
+    # The encoding is recorded when writing, so the next edit does not detect it
+    with patch.object(editor._encoding_manager, 'detect_encoding') as mock_detect:
+        editor(command='insert', path=str(test_file), insert_line=2, new_str='Три')
+        mock_detect.assert_not_called()
+    assert test_file.read_bytes().decode('cp1251') == (
+        'Привет, свет! Это тестовый файл в кодировке windows-1251.\n'
+        'Вторая строка с русским текстом.\nТри\n'
+    )
+
+
+def test_view_after_edit_uses_written_content(editor):
+    editor, test_file = editor
+    result = editor(
+        command='str_replace',
+        path=str(test_file),
+        old_str='test file',
+        new_str='cached file',
+    )
+    # The edit stored the new content in the cache, so reading does not decode it again
+    assert editor.read_file(test_file) is result.new_content
+
+
+def test_view_picks_up_external_changes(editor):
+    editor, test_file = editor
+    editor(command='view', path=str(test_file))
+    test_file.write_text('Changed outside of the editor.\nSecond line.\nThird line.')
+    result = editor(command='view', path=str(test_file), view_range=[3, 3])
+    assert '3\tThird line.' in result.output
+
+
+def test_view_directory_with_symlink_cycle(tmp_path):
+    editor = OHEditor()
+    test_dir = tmp_path / 'test_dir'
+    (test_dir / 'sub').mkdir(parents=True)
+    (test_dir / 'sub' / 'loop').symlink_to(test_dir)
+
+    result = editor(command='view', path=str(test_dir))
+    assert not result.error
+    assert (
+        result.output
+        == f"""Here's the files and directories up to 2 levels deep in {test_dir}, excluding hidden items:
+{test_dir}/
+{test_dir}/sub/
+{test_dir}/sub/loop/"""
+    )
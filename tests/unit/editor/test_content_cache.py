@@ -0,0 +1,147 @@
+"""Unit tests for the decoded content cache."""
+
+import os
+
+import pytest
+
+from openhands_aci.editor.content_cache import (
+    ContentCache,
+    FileContent,
+    LineIndex,
+    supports_line_index,
+)
+
+
+def read_range(path, start_line, end_line):
+    """Read a line range by iterating over the file object."""
+    with open(path) as f:
+        return ''.join(
+            line for i, line in enumerate(f, 1) if start_line <= i <= end_line
+        )
+
+
+@pytest.mark.parametrize(
+    'text',
+    ['', '\n', 'single line', 'a\nb\nc', 'a\nb\nc\n', '\n\nx\n\n', 'ü\n😊\nend'],
+)
+def test_file_content_matches_file_iteration(tmp_path, text):
+    path = tmp_path / 'test.txt'
+    path.write_text(text, encoding='utf-8')
+    content = FileContent(text)
+
+    with open(path) as f:
+        assert content.num_lines == sum(1 for _ in f)
+
+    for start_line in range(1, 6):
+        for end_line in range(start_line - 1, 7):
+            assert content.get_line_range(start_line, end_line) == read_range(
+                path, start_line, end_line
+            )
+
+
+def test_line_starts(tmp_path):
+    content = FileContent('ab\n\ncde\nf')
+    assert list(content.line_starts) == [0, 3, 4, 8]
+    assert content.get_line_offset(1) == 0
+    assert content.get_line_offset(4) == 8
+    assert content.get_line_offset(10) == len(content.text)
+
+
+def test_get_reuses_content_until_file_changes(tmp_path):
+    path = tmp_path / 'test.txt'
+    path.write_text('first\n')
+    cache = ContentCache()
+
+    content = cache.get(path, 'utf-8')
+    assert cache.get(path, 'utf-8') is content
+
+    # A different encoding is a different entry
+    assert cache.get(path, 'latin-1') is not content
+
+    path.write_text('second version\n')
+    assert cache.get(path, 'utf-8').text == 'second version\n'
+
+
+def test_update_stores_written_content(tmp_path):
+    path = tmp_path / 'test.txt'
+    path.write_text('new content\n')
+    cache = ContentCache()
+    content = FileContent('new content\n')
+    cache.update(path, 'utf-8', content)
+    assert cache.get(path, 'utf-8') is content
+
+
+def test_update_skips_content_with_carriage_returns(tmp_path):
+    path = tmp_path / 'test.txt'
+    with open(path, 'w', newline='') as f:
+        f.write('line\r\n')
+    cache = ContentCache()
+    cache.update(path, 'utf-8', FileContent('line\r\n'))
+    assert cache.get(path, 'utf-8').text == 'line\n'
+
+
+def test_keeps_one_entry_per_path(tmp_path):
+    path = tmp_path / 'test.txt'
+    cache = ContentCache()
+    for i in range(3):
+        path.write_text(f'version {i}\n' * (i + 1))
+        os.utime(path, ns=(i, i))
+        cache.get(path, 'utf-8')
+    assert len(cache) == 1
+
+
+def test_size_limit(tmp_path):
+    cache = ContentCache(max_size=10)
+    small = tmp_path / 'small.txt'
+    small.write_text('12345')
+    large = tmp_path / 'large.txt'
+    large.write_text('x' * 100)
+
+    assert cache.get(small, 'utf-8').text == '12345'
+    # Content larger than the cache is returned but not kept
+    assert cache.get(large, 'utf-8').text == 'x' * 100
+    assert len(cache) == 1
+
+
+@pytest.mark.parametrize('text', ['', '\n', 'a\nb\nc', 'a\nb\nc\n', 'ü\n😊\nend\n'])
+def test_line_index_matches_file_iteration(tmp_path, text, monkeypatch):
+    monkeypatch.setattr(LineIndex, 'CHUNK_SIZE', 2)
+    path = tmp_path / 'test.txt'
+    path.write_text(text, encoding='utf-8')
+    line_index = LineIndex.build(path)
+    assert line_index is not None
+
+    with open(path) as f:
+        assert line_index.num_lines == sum(1 for _ in f)
+    for start_line in range(1, 5):
+        for end_line in range(start_line, 6):
+            assert line_index.read_line_range(
+                path, start_line, end_line, 'utf-8'
+            ) == read_range(path, start_line, end_line)
+
+
+def test_line_index_rejects_carriage_returns(tmp_path):
+    path = tmp_path / 'test.txt'
+    path.write_bytes(b'a\rb\r\n')
+    assert LineIndex.build(path) is None
+
+    cache = ContentCache()
+    assert cache.count_lines(path, 'utf-8') == 2
+    assert cache.read_line_range(path, 'utf-8', 2, 2) == 'b\n'
+
+
+def test_supports_line_index():
+    assert supports_line_index('utf-8')
+    assert supports_line_index('cp1251')
+    assert not supports_line_index('utf-16')
+    assert not supports_line_index('cp037')
+    assert not supports_line_index('utf-7')
+
+
+def test_read_line_range_does_not_cache_content(tmp_path):
+    path = tmp_path / 'test.txt'
+    path.write_text('a\nb\nc\n')
+    cache = ContentCache()
+    assert cache.count_lines(path, 'utf-8') == 3
+    assert cache.read_line_range(path, 'utf-8', 2, 3) == 'b\nc\n'
+    assert len(cache) == 0
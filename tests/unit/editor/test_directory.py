@@ -0,0 +1,163 @@
+"""Unit tests for the in-process directory listing."""
+
+import base64
+import json
+import os
+
+import pytest
+
+from openhands_aci.editor.directory import (
+    DirectoryWalk,
+    InvalidCursorError,
+    list_directory,
+)
+
+
+def make_tree(root):
+    (root / 'a' / 'b' / 'c').mkdir(parents=True)
+    (root / 'a' / 'f').write_text('')
+    (root / 'a' / '.g').write_text('')
+    (root / 'a' / 'b' / 'c' / 'deep').write_text('')
+    (root / 'a-b').mkdir()
+    (root / 'a-b' / 'y').write_text('')
+    (root / 'a.b').write_text('')
+    (root / '.hidden_dir').mkdir()
+    (root / '.hidden_dir' / 'x').write_text('')
+    (root / '.hidden').write_text('')
+
+
+def test_list_directory_order_and_depth(tmp_path):
+    make_tree(tmp_path)
+    listing = list_directory(tmp_path)
+
+    # Entries come in byte order of the full paths, like `find | sort`
+    assert listing.entries == [
+        (str(tmp_path), True),
+        (f'{tmp_path}/a', True),
+        (f'{tmp_path}/a-b', True),
+        (f'{tmp_path}/a-b/y', False),
+        (f'{tmp_path}/a.b', False),
+        (f'{tmp_path}/a/b', True),
+        (f'{tmp_path}/a/f', False),
+    ]
+    assert listing.hidden_count == 2
+    assert listing.errors == []
+
+
+def test_list_directory_follows_symlinks(tmp_path):
+    source = tmp_path / 'source'
+    (source / 'sub').mkdir(parents=True)
+    (source / 'sub' / 'file.txt').write_text('')
+    root = tmp_path / 'root'
+    root.mkdir()
+    (root / 'link').symlink_to(source / 'sub')
+    (root / 'broken').symlink_to(tmp_path / 'missing')
+
+    listing = list_directory(root)
+    assert listing.entries == [
+        (str(root), True),
+        (f'{root}/broken', False),
+        (f'{root}/link', True),
+        (f'{root}/link/file.txt', False),
+    ]
+
+
+def test_list_directory_stops_at_symlink_cycles(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'a' / 'loop').symlink_to(tmp_path)
+    (tmp_path / 'self').symlink_to('.')
+
+    listing = list_directory(tmp_path, max_depth=5)
+    assert listing.entries == [
+        (str(tmp_path), True),
+        (f'{tmp_path}/a', True),
+        (f'{tmp_path}/a/loop', True),
+        (f'{tmp_path}/self', True),
+    ]
+    assert listing.errors == []
+
+
+def test_list_directory_reports_unreadable_directories(tmp_path):
+    locked = tmp_path / 'locked'
+    locked.mkdir()
+    locked.chmod(0)
+    try:
+        if os.access(locked, os.R_OK):
+            # Running as root, permissions are not enforced
+            return
+        listing = list_directory(tmp_path)
+    finally:
+        locked.chmod(0o755)
+    assert (f'{locked}', True) in listing.entries
+    assert listing.errors == [f'Cannot list {locked}: Permission denied']
+
+
+def test_directory_walk_pages_match_full_listing(tmp_path):
+    make_tree(tmp_path)
+    expected = list_directory(tmp_path).entries
+
+    walk = DirectoryWalk(tmp_path)
+    pages = []
+    while True:
+        pages.append(walk.next_page(3))
+        if not walk.has_more:
+            break
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [entry for page in pages for entry in page] == expected
+
+
+def test_directory_walk_pages_up_to_max_chars(tmp_path):
+    make_tree(tmp_path)
+    expected = list_directory(tmp_path).entries
+
+    walk = DirectoryWalk(tmp_path)
+    pages = []
+    while walk.has_more:
+        pages.append(walk.next_page(100, max_chars=len(str(tmp_path)) + 10))
+    assert [entry for page in pages for entry in page] == expected
+    for page in pages:
+        # Pages are only longer than `max_chars` if they have a single entry
+        text = '\n'.join(f'{p}/' if is_dir else p for p, is_dir in page)
+        assert len(page) == 1 or len(text) <= len(str(tmp_path)) + 10
+
+
+def test_directory_walk_resumes_from_cursor(tmp_path):
+    make_tree(tmp_path)
+    expected = list_directory(tmp_path).entries
+
+    for page_size in range(1, len(expected)):
+        walk = DirectoryWalk(tmp_path)
+        entries = walk.next_page(page_size)
+        while walk.has_more:
+            # Restart from the cursor every time instead of continuing the walk
+            walk = DirectoryWalk.from_cursor(tmp_path, walk.cursor)
+            entries.extend(walk.next_page(page_size))
+        assert entries == expected
+
+
+def test_directory_walk_rejects_invalid_cursors(tmp_path):
+    other = tmp_path / 'other'
+    other.mkdir()
+    with pytest.raises(InvalidCursorError):
+        DirectoryWalk.from_cursor(tmp_path, 'not a cursor')
+    with pytest.raises(InvalidCursorError):
+        DirectoryWalk.from_cursor(tmp_path, DirectoryWalk(other).cursor)
+
+
+@pytest.mark.parametrize(
+    'payload',
+    [
+        [None, 2, None],
+        ['{root}', 2, 5],
+        ['{root}', 'x', None],
+        ['{root}', True, None],
+        ['{root}', -1, None],
+        ['{root}', 2, ['a', 1]],
+        ['{root}', 2, 'a'],
+    ],
+)
+def test_directory_walk_rejects_cursors_with_wrong_types(tmp_path, payload):
+    payload = [str(tmp_path) if p == '{root}' else p for p in payload]
+    cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    with pytest.raises(InvalidCursorError):
+        DirectoryWalk.from_cursor(tmp_path, cursor)
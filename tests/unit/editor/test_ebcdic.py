@@ -0,0 +1,80 @@
+import codecs
+import io
+
+import pytest
+
+from openhands_aci.editor.ebcdic import (
+    EBCDIC_CODE_PAGES,
+    decode,
+    detect_ebcdic,
+    encode,
+    is_ebcdic,
+)
+
+COBOL_SOURCE = (
+    '000100 IDENTIFICATION DIVISION.                                         \n'
+    '000200 PROGRAM-ID. PAYROLL.                                             \n'
+    '000300 PROCEDURE DIVISION.                                              \n'
+    '000400     MOVE WS-RATE(1) TO WS-TOTAL.                                 \n'
+    '000500     IF WS-CODE = "A" OR "B" DISPLAY "RATE: " WS-TOTAL.           \n'
+    '000600     STOP RUN.                                                    \n'
+)
+
+
+@pytest.mark.parametrize('code_page', EBCDIC_CODE_PAGES)
+def test_round_trip_of_all_bytes(code_page):
+    data = bytes(range(256))
+    text = decode(data, code_page)
+    assert len(text) == 256
+    assert encode(text, code_page) == data
+    assert codecs.decode(data, code_page) == text
+
+
+def test_cp1047_differs_from_cp037():
+    data = bytes([0x5F, 0xAD, 0xB0, 0xBA, 0xBB, 0xBD])
+    assert data.decode('cp037') == '¬Ý^[]¨'
+    assert data.decode('cp1047') == '^[¬Ý¨]'
+    # Everything else is the same
+    others = bytes(b for b in range(256) if b not in data)
+    assert others.decode('cp037') == others.decode('cp1047')
+
+
+def test_cp1047_codec_names_and_streams():
+    assert codecs.lookup('IBM-1047').name == 'cp1047'
+    assert codecs.lookup('ibm1047').name == 'cp1047'
+    assert is_ebcdic('IBM-1047') and is_ebcdic('cp037') and not is_ebcdic('utf-8')
+
+    data = COBOL_SOURCE.encode('cp1047')
+    assert io.TextIOWrapper(io.BytesIO(data), encoding='cp1047').read() == (
+        COBOL_SOURCE
+    )
+    with pytest.raises(UnicodeEncodeError, match='cp1047'):
+        'snowman ☃'.encode('cp1047')
+    assert 'snowman ☃'.encode('cp1047', 'replace').decode('cp1047') == 'snowman ?'
+
+
+@pytest.mark.parametrize(
+    'code_page, text',
+    [
+        ('cp1047', COBOL_SOURCE + '       01 WS-ARRAY[10] PIC X ^ 2.\n'),
+        ('cp037', COBOL_SOURCE + '       01 WS-ARRAY[10] PIC X ^ 2.\n'),
+        ('cp500', COBOL_SOURCE + '       01 WS-ARRAY[10] PIC X.\n'),
+        # Nothing tells the code pages apart, so the preferred one is picked
+        ('cp1047', COBOL_SOURCE),
+    ],
+)
+def test_detect_ebcdic(code_page, text):
+    assert detect_ebcdic(text.encode(code_page)) == code_page
+
+
+@pytest.mark.parametrize(
+    'sample',
+    [
+        b'',
+        COBOL_SOURCE.encode('ascii'),
+        'Привет, мир!'.encode('cp1251'),
+        bytes(range(256)) * 4,
+    ],
+)
+def test_detect_ebcdic_rejects_other_data(sample):
+    assert detect_ebcdic(sample) is None
@@ -103,6 +103,86 @@ def test_detect_encoding_none_result(encoding_manager, temp_file):
         assert encoding == encoding_manager.default_encoding
 
 
+@pytest.mark.parametrize(
+    'encoding, expected',
+    [
+        ('utf-8-sig', 'utf-8-sig'),
+        ('utf-16', 'utf-16'),
+        ('utf-32', 'utf-32'),
+    ],
+)
+def test_detect_encoding_bom(encoding_manager, temp_file, encoding, expected):
+    """Test that a byte order mark decides the encoding."""
+    with open(temp_file, 'wb') as f:
+        f.write('Hello, wörld!'.encode(encoding))
+
+    with patch('charset_normalizer.detect') as mock_detect:
+        assert encoding_manager.detect_encoding(temp_file) == expected
+        mock_detect.assert_not_called()
+
+
+def test_detect_encoding_utf8_fast_path(encoding_manager, temp_file):
+    """Test that valid UTF-8 is detected without charset_normalizer."""
+    encoding_manager.SAMPLE_SIZE = 1000
+    encoding_manager.UTF8_CHECK_CHUNK_SIZE = 100
+    # The sample ends in the middle of a two-byte character
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write('a' * 999 + 'é' * 10)
+
+    with patch('charset_normalizer.detect') as mock_detect:
+        assert encoding_manager.detect_encoding(temp_file) == 'utf-8'
+        mock_detect.assert_not_called()
+
+    # Invalid UTF-8 in a later chunk still goes through charset_normalizer
+    with open(temp_file, 'wb') as f:
+        f.write(b'ascii text ' * 50 + 'é'.encode('latin-1'))
+    with patch(
+        'charset_normalizer.detect',
+        return_value={'encoding': 'latin-1', 'confidence': 1.0},
+    ) as mock_detect:
+        assert encoding_manager.detect_encoding(temp_file) == 'latin-1'
+        mock_detect.assert_called_once()
+
+
+def test_detect_encoding_ebcdic(encoding_manager, temp_file):
+    """Test that EBCDIC text is detected without charset_normalizer."""
+    with open(temp_file, 'wb') as f:
+        f.write('       DISPLAY "HELLO" WS-TABLE[1].\n'.encode('cp1047') * 10)
+
+    with patch('charset_normalizer.detect') as mock_detect:
+        assert encoding_manager.detect_encoding(temp_file) == 'cp1047'
+        mock_detect.assert_not_called()
+
+
+def test_record_encoding(encoding_manager, temp_file):
+    """Test that a recorded encoding is used without detecting it again."""
+    with open(temp_file, 'w', encoding='cp1251') as f:
+        f.write('Привет')
+
+    encoding_manager.record_encoding(temp_file, 'cp1251', os.stat(temp_file))
+    with patch.object(encoding_manager, 'detect_encoding') as mock_detect:
+        assert encoding_manager.get_encoding(temp_file) == 'cp1251'
+        mock_detect.assert_not_called()
+
+
+def test_persistent_cache_is_shared(temp_file, tmp_path):
+    """Test that a new manager reuses encodings detected by another one."""
+    cache_path = tmp_path / 'encodings.db'
+    with open(temp_file, 'wb') as f:
+        f.write(
+            'Привет, мир! Это тестовый файл в кодировке windows-1251.'.encode('cp1251')
+        )
+
+    first = EncodingManager(persistent_cache_path=cache_path)
+    assert first.get_encoding(temp_file) == 'windows-1251'
+
+    # A manager in a new process starts with an empty in-memory cache
+    second = EncodingManager(persistent_cache_path=cache_path)
+    with patch.object(second, 'detect_encoding') as mock_detect:
+        assert second.get_encoding(temp_file) == 'windows-1251'
+        mock_detect.assert_not_called()
+
+
 def test_get_encoding_cache_hit(encoding_manager, temp_file):
     """Test that get_encoding uses cached values when available."""
     # Create a file
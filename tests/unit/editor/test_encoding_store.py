@@ -0,0 +1,65 @@
+import os
+
+from openhands_aci.editor.encoding_store import EncodingStore
+
+
+def test_put_and_get(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('hello\n')
+    store = EncodingStore(tmp_path / 'encodings.db')
+    stat = os.stat(test_file)
+    assert store.get(stat) is None
+
+    store.put(stat, 'utf-8')
+    assert store.get(stat) == 'utf-8'
+    # Another connection, as in another process, sees the entry
+    assert EncodingStore(tmp_path / 'encodings.db').get(stat) == 'utf-8'
+
+
+def test_changed_file_is_a_miss(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('hello\n')
+    store = EncodingStore(tmp_path / 'encodings.db')
+    store.put(os.stat(test_file), 'utf-8')
+
+    test_file.write_text('hello world\n')
+    assert store.get(os.stat(test_file)) is None
+
+
+def test_prunes_oldest_entries(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('hello\n')
+    store = EncodingStore(tmp_path / 'encodings.db', max_entries=5)
+    store.PRUNE_INTERVAL = 10
+    stats = []
+    for i in range(10):
+        os.utime(test_file, ns=(i, i))
+        stats.append(os.stat(test_file))
+        store.put(stats[-1], f'encoding-{i}')
+
+    assert [store.get(stat) for stat in stats] == [None] * 5 + [
+        f'encoding-{i}' for i in range(5, 10)
+    ]
+
+
+def test_database_errors_are_misses(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('hello\n')
+    db_path = tmp_path / 'encodings.db'
+    db_path.write_text('this is not a database')
+    store = EncodingStore(db_path)
+    stat = os.stat(test_file)
+
+    store.put(stat, 'utf-8')
+    assert store.get(stat) is None
+
+
+def test_file_system_errors_are_misses(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('hello\n')
+    # The directory of the database can not be created under a file
+    store = EncodingStore(test_file / 'cache' / 'encodings.db')
+    stat = os.stat(test_file)
+
+    store.put(stat, 'utf-8')
+    assert store.get(stat) is None
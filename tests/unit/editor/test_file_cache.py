@@ -1,5 +1,6 @@
 import os
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 import pytest
 
@@ -203,4 +204,197 @@ def test_size_limit_with_empty_key():
         assert cache.get('key3') == 'z' * 40
 
 
-# Add more tests as needed
+def test_entries_are_sharded(file_cache):
+    file_cache.set('test_key', 'test_value')
+    file_path = file_cache._get_file_path('test_key')
+    assert file_path.parent.parent == file_cache.directory
+    assert file_path.parent.name == file_path.name[:2]
+
+
+def test_index_is_reloaded():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir, size_limit=1000)
+        for i in range(5):
+            cache.set(f'key{i}', 'x' * i)
+        cache.get('key0')
+        cache.delete('key3')
+
+        reopened = FileCache(temp_dir, size_limit=1000)
+        assert len(reopened) == 4
+        assert list(reopened) == ['key1', 'key2', 'key4', 'key0']
+        assert reopened.current_size == cache.current_size
+
+
+def test_caches_share_changes():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache1 = FileCache(temp_dir)
+        cache2 = FileCache(temp_dir)
+        cache1.set('key1', 'value1')
+        cache2.set('key2', 'value2')
+        assert len(cache1) == 2
+        assert set(cache2) == {'key1', 'key2'}
+
+        cache1.clear()
+        assert len(cache2) == 0
+        cache2.set('key3', 'value3')
+        assert list(cache1) == ['key3']
+
+
+def test_journal_is_compacted():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir)
+        cache.JOURNAL_SLACK = 10
+        for i in range(100):
+            cache.set('key', f'value{i}')
+        journal = cache.directory / FileCache.JOURNAL_NAME
+        assert len(journal.read_text().splitlines()) < 20
+        assert len(FileCache(temp_dir)) == 1
+        assert cache.get('key') == 'value99'
+
+
+def test_entries_of_earlier_versions_are_indexed():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir)
+        cache.set('key1', 'value1')
+        cache.set('key2', 'value2')
+        # Earlier versions kept the entries directly in the directory, without a journal
+        for key in ('key1', 'key2'):
+            path = cache._get_file_path(key)
+            os.replace(path, cache.directory / path.name)
+        os.remove(cache.directory / FileCache.JOURNAL_NAME)
+
+        cache = FileCache(temp_dir)
+        assert set(cache) == {'key1', 'key2'}
+        assert cache.get('key1') == 'value1'
+        assert cache._get_file_path('key2').exists()
+
+
+def test_reads_do_not_write():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir)
+        cache.set('key1', 'value1')
+        cache.set('key2', 'value2')
+        journal = cache.directory / FileCache.JOURNAL_NAME
+        before = journal.read_bytes()
+        for _ in range(10):
+            assert cache.get('key1') == 'value1'
+        assert journal.read_bytes() == before
+        assert list(cache) == ['key2', 'key1']
+
+        # The order left by the reads is recorded with the next change
+        cache.set('key3', 'value3')
+        assert list(FileCache(temp_dir)) == ['key2', 'key1', 'key3']
+        cache.get('key2')
+        cache._compact_journal()
+        assert list(FileCache(temp_dir)) == ['key1', 'key3', 'key2']
+
+
+def test_eviction_follows_use():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir, size_limit=200)
+        cache.set('key1', 'x' * 50)
+        cache.set('key2', 'y' * 50)
+        # Reading key1 makes key2 the least recently used entry
+        cache.get('key1')
+        cache.set('key3', 'z' * 50)
+
+        assert 'key1' in cache
+        assert 'key2' not in cache
+        assert 'key3' in cache
+        assert cache.current_size == sum(
+            cache._get_file_path(key).stat().st_size for key in ('key1', 'key3')
+        )
+
+
+def _blob_files(cache):
+    return [p for p in (cache.directory / 'blobs').rglob('*') if p.is_file()]
+
+
+def test_blob_store_stores_values_once():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir, blob_store=True)
+        value = 'line of text\n' * 1000
+        cache.set('key1', value)
+        cache.set('key2', value)
+        cache.set('small', 'short value')
+
+        assert len(_blob_files(cache)) == 1
+        assert _blob_files(cache)[0].stat().st_size < len(value) // 10
+        # The entries only refer to the blob
+        assert cache._get_file_path('key1').stat().st_size < 200
+        assert cache.get('key1') == value
+        assert cache.get('key2') == value
+        assert cache.get('small') == 'short value'
+        assert cache.current_size == sum(
+            p.stat().st_size
+            for p in _blob_files(cache)
+            + [cache._get_file_path(key) for key in ('key1', 'key2', 'small')]
+        )
+
+
+def test_blob_store_reads_skip_json(monkeypatch):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir, blob_store=True)
+        value = 'x' * 10_000
+        cache.set('key', value)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('JSON was decoded')
+
+        monkeypatch.setattr('openhands_aci.editor.file_cache.json.load', fail)
+        assert cache.get('key') == value
+
+
+def test_blob_store_deletes_unused_blobs():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir, blob_store=True)
+        cache.set('key1', 'a' * 2000)
+        cache.set('key2', 'a' * 2000)
+        cache.delete('key1')
+        assert len(_blob_files(cache)) == 1
+        assert cache.get('key2') == 'a' * 2000
+
+        cache.set('key2', 'b' * 2000)
+        assert len(_blob_files(cache)) == 1
+        assert cache.get('key2') == 'b' * 2000
+        cache.delete('key2')
+        assert _blob_files(cache) == []
+        assert cache.current_size == 0
+
+
+def test_blob_store_index_is_reloaded():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = FileCache(temp_dir, blob_store=True)
+        cache.set('key1', 'a' * 2000)
+        cache.set('key2', 'a' * 2000)
+        size = cache.current_size
+
+        assert FileCache(temp_dir, blob_store=True).current_size == size
+        os.remove(cache.directory / FileCache.JOURNAL_NAME)
+        reloaded = FileCache(temp_dir, blob_store=True)
+        assert reloaded.current_size == size
+        assert reloaded.get('key1') == 'a' * 2000
+
+        reloaded.clear()
+        assert os.listdir(temp_dir) == []
+
+
+def _increment(directory, times):
+    cache = FileCache(directory, blob_store=True)
+    for _ in range(times):
+        with cache.lock('counter'):
+            cache.set('counter', cache.get('counter', 0) + 1)
+        cache.set(f'blob-{os.getpid()}', 'shared value\n' * 100)
+        cache.delete(f'blob-{os.getpid()}')
+
+
+def test_lock_across_processes():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with ProcessPoolExecutor(4) as executor:
+            list(executor.map(_increment, [temp_dir] * 4, [50] * 4))
+
+        cache = FileCache(temp_dir, blob_store=True)
+        assert cache.get('counter') == 200
+        assert list(cache) == ['counter']
+        # The blob set and deleted by all processes is gone
+        assert [p for p in (cache.directory / 'blobs').rglob('*') if p.is_file()] == []
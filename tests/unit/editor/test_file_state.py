@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from openhands_aci.editor.file_state import FileState, FileStates
+
+
+def test_file_state_of_file(tmp_path):
+    path = tmp_path / 'test.txt'
+    path.write_text('hello\n')
+    state = FileState(path)
+    assert state.exists and state.is_file and not state.is_dir
+    assert state.size == 6
+    assert state.mtime == path.stat().st_mtime
+    assert not state.is_binary
+
+
+def test_file_state_of_missing_path_and_directory(tmp_path):
+    missing = FileState(tmp_path / 'missing.txt')
+    assert missing.stat is None
+    assert not missing.exists and not missing.is_file and not missing.is_dir
+
+    directory = FileState(tmp_path)
+    assert directory.exists and directory.is_dir and not directory.is_file
+
+
+def test_file_state_is_looked_up_once(tmp_path):
+    path = tmp_path / 'test.txt'
+    path.write_text('hello\n')
+    state = FileState(path)
+    assert state.size == 6
+    path.write_text('hello world\n')
+    # The stat result is kept until the state is dropped
+    assert state.size == 6
+    assert FileState(path).size == 12
+
+
+def test_file_states_memoize_only_within_scope(tmp_path):
+    file_states = FileStates()
+    path = tmp_path / 'test.txt'
+    # Outside of a scope every lookup is fresh
+    assert file_states.get(path) is not file_states.get(path)
+
+    with file_states.scope():
+        state = file_states.get(path)
+        assert not state.exists
+        assert file_states.get(Path(str(path))) is state
+        with file_states.scope():
+            # Nested scopes share the states of the outer one
+            assert file_states.get(path) is state
+
+        path.write_text('hello\n')
+        assert not file_states.get(path).exists
+        file_states.invalidate(path)
+        assert file_states.get(path).exists
+
+    assert file_states.get(path) is not file_states.get(path)
@@ -0,0 +1,190 @@
+import pytest
+
+from openhands_aci.editor.exceptions import PatchApplyError
+from openhands_aci.editor.patch import apply_hunks, parse_patch
+from openhands_aci.utils.diff import get_diff
+
+ORIGINAL = ''.join(f'line {i}\n' for i in range(1, 21))
+
+
+def apply(patch: str, content: str = ORIGINAL) -> tuple[str, list[str]]:
+    (file_patch,) = parse_patch(patch)
+    return apply_hunks(file_patch.path, content, file_patch.hunks)
+
+
+def test_parse_patch_strips_git_prefixes():
+    patch = """diff --git a/src/x.py b/src/x.py
+--- a/src/x.py
++++ b/src/x.py
+@@ -1,1 +1,1 @@
+-a
++b
+diff --git a/new.txt b/new.txt
+new file mode 100644
+--- /dev/null
++++ b/new.txt
+@@ -0,0 +1,1 @@
++hello
+"""
+    file_patches = parse_patch(patch)
+    assert [(p.path, p.is_new) for p in file_patches] == [
+        ('src/x.py', False),
+        ('new.txt', True),
+    ]
+
+
+def test_parse_patch_splits_plain_multi_file_diffs():
+    patch = """--- a.txt
++++ a.txt
+@@ -1,3 +1,2 @@
+ one
+--- removed line that looks like a header
+ two
+--- b.txt
++++ b.txt
+@@ -1 +1 @@
+-three
++3
+"""
+    file_patches = parse_patch(patch)
+    assert [p.path for p in file_patches] == ['a.txt', 'b.txt']
+    assert file_patches[0].hunks[0].ops == [
+        (' ', 'one'),
+        ('-', '-- removed line that looks like a header'),
+        (' ', 'two'),
+    ]
+
+
+@pytest.mark.parametrize(
+    'header, reason',
+    [
+        ('--- a/x.py\n+++ /dev/null\n', 'deleting files'),
+        ('--- a/x.py\n+++ b/y.py\n', 'renaming files'),
+    ],
+)
+def test_parse_patch_rejects_deletes_and_renames(header, reason):
+    with pytest.raises(PatchApplyError, match=reason):
+        parse_patch(header + '@@ -1,1 +1,1 @@\n-a\n+b\n')
+
+
+def test_apply_hunks_exact():
+    new_content, notes = apply(
+        """--- a/f.txt
++++ b/f.txt
+@@ -2,3 +2,3 @@
+ line 2
+-line 3
++line three
+ line 4
+@@ -15,3 +15,4 @@
+ line 15
+ line 16
++line 16.5
+ line 17
+"""
+    )
+    expected = ORIGINAL.replace('line 3\n', 'line three\n').replace(
+        'line 16\n', 'line 16\nline 16.5\n'
+    )
+    assert new_content == expected
+    assert notes == []
+
+
+def test_apply_hunks_with_offset_and_fuzz():
+    # Two lines were added at the top and line 16 was changed since the patch was made
+    content = 'new 1\nnew 2\n' + ORIGINAL.replace('line 16\n', 'line sixteen\n')
+    new_content, notes = apply(
+        """--- a/f.txt
++++ b/f.txt
+@@ -2,3 +2,3 @@
+ line 2
+-line 3
++line three
+ line 4
+@@ -16,3 +16,3 @@
+ line 16
+-line 17
++line seventeen
+ line 18
+""",
+        content,
+    )
+    assert 'line three\nline 4' in new_content
+    assert 'line sixteen\nline seventeen\nline 18' in new_content
+    assert notes == [
+        'hunk 1 applied with offset +2 lines',
+        'hunk 2 applied with offset +2 lines, fuzz 1',
+    ]
+
+
+def test_apply_hunks_ignoring_trailing_whitespace():
+    content = ORIGINAL.replace('line 4\n', 'line 4   \n')
+    new_content, notes = apply(
+        """--- a/f.txt
++++ b/f.txt
+@@ -3,2 +3,2 @@
+-line 3
++line three
+ line 4
+""",
+        content,
+    )
+    # Context lines keep their current content
+    assert 'line three\nline 4   \n' in new_content
+    assert notes == ['hunk 1 applied with ignoring trailing white spaces']
+
+
+def test_apply_hunks_without_context():
+    new_content = ORIGINAL.replace('line 5\n', 'line 5\ninserted\n').replace(
+        'line 12\n', ''
+    )
+    patch = '--- f.txt\n+++ f.txt\n' + get_diff(ORIGINAL, new_content).split('\n', 2)[2]
+    assert apply(patch)[0] == new_content
+
+
+def test_apply_hunks_to_new_file():
+    assert apply('--- /dev/null\n+++ b/f.txt\n@@ -0,0 +1,2 @@\n+a\n+b\n', '') == (
+        'a\nb\n',
+        [],
+    )
+
+
+NO_NEWLINE = '\\ No newline at end of file\n'
+
+
+@pytest.mark.parametrize(
+    'hunk, content, expected',
+    [
+        # The last hunk removes the final newline
+        (
+            ' there\n-world\n+world\n' + NO_NEWLINE,
+            'hello\nthere\nworld\n',
+            'hello\nthere\nworld',
+        ),
+        # The last hunk adds the final newline
+        (
+            ' there\n-world\n' + NO_NEWLINE + '+world\n',
+            'hello\nthere\nworld',
+            'hello\nthere\nworld\n',
+        ),
+        # Neither version has a final newline
+        (
+            '-there\n+here\n world\n' + NO_NEWLINE,
+            'hello\nthere\nworld',
+            'hello\nhere\nworld',
+        ),
+    ],
+)
+def test_apply_hunks_with_no_newline_at_end_of_file(hunk, content, expected):
+    patch = 'diff --git a/f.txt b/f.txt\n--- a/f.txt\n+++ b/f.txt\n@@ -2,2 +2,2 @@\n'
+    assert apply(patch + hunk, content) == (expected, [])
+
+
+def test_apply_hunks_to_new_file_without_final_newline():
+    patch = '--- /dev/null\n+++ b/f.txt\n@@ -0,0 +1,2 @@\n+a\n+b\n' + NO_NEWLINE
+    assert apply(patch, '') == ('a\nb', [])
+
+
+def test_apply_hunks_mismatch():
+    with pytest.raises(PatchApplyError, match='hunk 1 .* does not match'):
+        apply('--- a/f.txt\n+++ b/f.txt\n@@ -1,1 +1,1 @@\n-missing\n+found\n')
@@ -0,0 +1,82 @@
+import pytest
+
+from openhands_aci.editor.records import FixedRecordFile, detect_record_length
+
+LINES = [
+    '       IDENTIFICATION DIVISION.',
+    '       PROGRAM-ID. PAYROLL.',
+    '       PROCEDURE DIVISION.',
+    '           DISPLAY "TOTAL [1]".',
+    '           STOP RUN.',
+]
+
+
+def write_records(path, lines, encoding='cp1047', length=80):
+    data = b''.join(line.ljust(length).encode(encoding) for line in lines)
+    path.write_bytes(data)
+    return data
+
+
+def test_detect_record_length(tmp_path):
+    path = tmp_path / 'PAYROLL.cbl'
+    data = write_records(path, LINES)
+    assert detect_record_length(path, len(data), 'cp1047') == 80
+    assert detect_record_length(path, len(data), 'cp037') == 80
+    # Records are only detected in EBCDIC files
+    assert detect_record_length(path, len(data), 'latin-1') is None
+
+
+@pytest.mark.parametrize('line_break', ['\n', '\x85'])
+def test_files_with_line_breaks_are_not_records(tmp_path, line_break):
+    path = tmp_path / 'PAYROLL.cbl'
+    text = line_break.join(LINES)
+    data = text.ljust(80 * (len(text) // 80 + 1)).encode('cp1047')
+    path.write_bytes(data)
+    assert detect_record_length(path, len(data), 'cp1047') is None
+
+
+def test_size_must_be_a_multiple_of_the_record_length(tmp_path):
+    path = tmp_path / 'PAYROLL.cbl'
+    data = write_records(path, LINES)[:-1]
+    path.write_bytes(data)
+    assert detect_record_length(path, len(data), 'cp1047') is None
+
+
+def test_read_lines(tmp_path):
+    path = tmp_path / 'PAYROLL.cbl'
+    data = write_records(path, LINES)
+    records = FixedRecordFile(path, len(data), 80, 'cp1047')
+    assert records.num_records == 5
+    assert records.read_lines(2, 4) == LINES[1:4]
+    assert records.read_lines(5, 5) == LINES[4:]
+    assert records.read_text() == ''.join(line + '\n' for line in LINES)
+
+
+def test_short_last_record(tmp_path):
+    path = tmp_path / 'PAYROLL.cbl'
+    data = write_records(path, LINES)[:-60]
+    path.write_bytes(data)
+    records = FixedRecordFile(path, len(data), 80, 'cp1047')
+    assert records.num_records == 5
+    assert records.read_lines(5, 5) == [LINES[4]]
+
+
+def test_encode_text_pads_records(tmp_path):
+    path = tmp_path / 'PAYROLL.cbl'
+    data = write_records(path, LINES)
+    records = FixedRecordFile(path, len(data), 80, 'cp1047')
+    assert records.encode_text(records.read_text()) == data
+    assert records.encode_text('A\nB') == 'A'.ljust(80).encode('cp1047') + 'B'.ljust(
+        80
+    ).encode('cp1047')
+
+
+def test_encode_text_rejects_long_lines(tmp_path):
+    records = FixedRecordFile(tmp_path / 'PAYROLL.cbl', 0, 10, 'cp1047')
+    with pytest.raises(ValueError, match='Line 2 is 11 bytes long'):
+        records.encode_text('short\n' + 'x' * 11 + '\n')
+
+
+def test_multi_byte_padding_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='single-byte'):
+        FixedRecordFile(tmp_path / 'PAYROLL.cbl', 0, 80, 'utf-16')
@@ -0,0 +1,130 @@
+import pytest
+
+from openhands_aci.editor import transcode
+from openhands_aci.editor.transcode import transcode_file, transcode_tree
+
+COBOL_SOURCE = (
+    '000100 IDENTIFICATION DIVISION.                                         \n'
+    '000200 PROGRAM-ID. PAYROLL.                                             \n'
+    '000300 PROCEDURE DIVISION.                                              \n'
+    '000400     MOVE WS-RATE(1) TO WS-TOTAL.                                 \n'
+    '000500     DISPLAY "TOTAL: [" WS-TOTAL "] ¬ PAID".                        \n'
+    '000600     STOP RUN.                                                    \n'
+)
+
+
+def test_round_trip_between_ebcdic_and_utf8(tmp_path):
+    source = tmp_path / 'PAYROLL.cbl'
+    original = COBOL_SOURCE.encode('cp1047')
+    source.write_bytes(original)
+
+    report = transcode_file(source, tmp_path / 'utf8' / 'PAYROLL.cbl', 'utf-8')
+    assert report.status == 'converted'
+    assert report.source_encoding == 'cp1047'
+    assert report.target_encoding == 'utf-8'
+    assert report.bytes_read == len(original)
+    assert (tmp_path / 'utf8' / 'PAYROLL.cbl').read_text() == COBOL_SOURCE
+
+    report = transcode_file(
+        tmp_path / 'utf8' / 'PAYROLL.cbl', tmp_path / 'back.cbl', 'cp1047'
+    )
+    assert report.status == 'converted'
+    assert (tmp_path / 'back.cbl').read_bytes() == original
+
+
+def test_characters_split_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcode, 'CHUNK_SIZE', 3)
+    source = tmp_path / 'source.txt'
+    source.write_text('aé☃bé\n' * 10)
+
+    report = transcode_file(source, tmp_path / 'out.txt', 'utf-16', 'utf-8')
+    assert report.status == 'converted'
+    assert (tmp_path / 'out.txt').read_text(encoding='utf-16') == 'aé☃bé\n' * 10
+
+
+def test_lossy_characters_are_reported_with_offsets(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcode, 'CHUNK_SIZE', 4)
+    source = tmp_path / 'source.txt'
+    source.write_text('ab☃cdé€\n')
+
+    report = transcode_file(source, tmp_path / 'out.txt', 'cp1047')
+    assert report.status == 'lossy'
+    assert report.lossy_count == 2
+    # Byte offsets of the snowman and the euro sign in the UTF-8 source
+    assert report.lossy_offsets == [2, 9]
+    assert report.bytes_written == 0
+    assert not (tmp_path / 'out.txt').exists()
+    assert [p.name for p in tmp_path.iterdir()] == ['source.txt']
+
+    report = transcode_file(source, tmp_path / 'out.txt', 'cp1047', allow_lossy=True)
+    assert report.status == 'converted'
+    assert report.lossy_offsets == [2, 9]
+    assert (tmp_path / 'out.txt').read_bytes() == 'ab?cdé?\n'.encode('cp1047')
+
+
+@pytest.mark.parametrize('chunk_size', [4, 1024])
+@pytest.mark.parametrize(
+    'source_encoding, offsets', [('utf-8-sig', [5, 10]), ('utf-16', [6, 12])]
+)
+def test_lossy_offsets_in_source_with_bom(
+    tmp_path, monkeypatch, chunk_size, source_encoding, offsets
+):
+    monkeypatch.setattr(transcode, 'CHUNK_SIZE', chunk_size)
+    source = tmp_path / 'source.txt'
+    source.write_bytes('ab☃cd€\n'.encode(source_encoding))
+
+    report = transcode_file(source, tmp_path / 'out.txt', 'cp1047', source_encoding)
+    assert report.status == 'lossy'
+    # The byte order mark is counted, but only once
+    assert report.lossy_offsets == offsets
+
+
+def test_undecodable_file_fails(tmp_path):
+    source = tmp_path / 'source.txt'
+    source.write_bytes(b'abc\xff')
+
+    report = transcode_file(source, tmp_path / 'out.txt', 'cp1047', 'utf-8')
+    assert report.status == 'failed'
+    assert report.error is not None
+    assert not (tmp_path / 'out.txt').exists()
+
+
+@pytest.mark.parametrize('in_place', [False, True])
+def test_transcode_tree(tmp_path, in_place):
+    root = tmp_path / 'library'
+    (root / 'src' / 'nested').mkdir(parents=True)
+    (root / '.git').mkdir()
+    (root / '.git' / 'HEAD').write_text('ref: refs/heads/main\n')
+    members = {f'src/MEMBER{i:02}.cbl': COBOL_SOURCE for i in range(40)}
+    members['src/nested/COPYBOOK.cpy'] = COBOL_SOURCE
+    for name, text in members.items():
+        (root / name).write_bytes(text.encode('cp1047'))
+    (root / 'src' / 'LOSSY.cbl').write_text('SNOWMAN ☃\n')
+
+    destination = root if in_place else tmp_path / 'converted'
+    reports = list(
+        transcode_tree(
+            root,
+            'cp1047',
+            destination_root=None if in_place else destination,
+            max_workers=2,
+        )
+    )
+    assert len(reports) == len(members) + 1
+    by_name = {r.source.removeprefix(f'{root}/'): r for r in reports}
+    assert by_name['src/LOSSY.cbl'].status == 'lossy'
+    assert by_name['src/LOSSY.cbl'].lossy_offsets == [8]
+    expected_status = 'skipped' if in_place else 'converted'
+    for name in members:
+        assert by_name[name].status == expected_status
+        assert (destination / name).read_bytes() == COBOL_SOURCE.encode('cp1047')
+    # Hidden entries are left alone
+    assert in_place or not (destination / '.git').exists()
+
+    # And back to UTF-8
+    reports = list(transcode_tree(destination, 'utf-8', max_workers=2))
+    assert len(reports) == len(members) + in_place
+    for report in reports:
+        assert report.status == ('skipped' if 'LOSSY' in report.source else 'converted')
+    for name in members:
+        assert (destination / name).read_text() == COBOL_SOURCE
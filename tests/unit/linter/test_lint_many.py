@@ -0,0 +1,61 @@
+import pytest
+
+from openhands_aci.linter import DefaultLinter
+from openhands_aci.linter import linter as linter_module
+from openhands_aci.linter.base import LinterException
+from openhands_aci.linter.impl.treesitter import TreesitterBasicLinter
+
+
+def test_lint_many(tmp_path):
+    sources = {
+        'ok.py': 'def foo():\n    return 1\n',
+        'undefined.py': 'x = UNDEFINED\n',
+        'broken.py': 'def foo(:\n    pass\n',
+        'broken.rb': 'def foo(\n',
+        'broken.js': 'function (\n',
+        'notes.txt': 'def foo(:\n',
+    }
+    for i in range(40):
+        sources[f'many/undefined_{i}.py'] = f'x = UNDEFINED_{i}\n'
+    for name, text in sources.items():
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text(text)
+    paths = [str(tmp_path / name) for name in sources]
+    paths += [str(tmp_path / 'missing.py'), str(tmp_path / 'missing.rb')]
+
+    linter = DefaultLinter()
+    results = list(linter.lint_many(paths, max_workers=2))
+
+    expected = [r for path in paths[:-1] for r in linter.lint(path)]
+    key = lambda r: (r.file, r.line, r.column, r.message)  # noqa: E731
+    assert sorted(results, key=key) == sorted(expected, key=key)
+    files = {r.file for r in results}
+    assert str(tmp_path / 'ok.py') not in files
+    assert str(tmp_path / 'broken.rb') in files
+    assert str(tmp_path / 'many' / 'undefined_39.py') in files
+    # Missing files are reported like `lint` does, or skipped if it can not read them
+    assert str(tmp_path / 'missing.py') in files
+    assert str(tmp_path / 'missing.rb') not in files
+    # Files with extensions there is no linter for are skipped
+    assert str(tmp_path / 'notes.txt') not in files
+
+
+def test_lint_many_requires_absolute_paths():
+    with pytest.raises(LinterException):
+        list(DefaultLinter().lint_many(['relative.py']))
+
+
+def test_lint_batch_keeps_going_after_a_failure(tmp_path, monkeypatch):
+    broken = str(tmp_path / 'broken.rb')
+    undefined = str(tmp_path / 'undefined.py')
+    (tmp_path / 'broken.rb').write_text('def foo(\n')
+    (tmp_path / 'undefined.py').write_text('x = UNDEFINED\n')
+
+    def failing_lint(self, file_path):
+        raise RuntimeError('tree-sitter failed')
+
+    monkeypatch.setattr(linter_module, '_worker_linter', None)
+    linter_module._init_worker()
+    monkeypatch.setattr(TreesitterBasicLinter, 'lint', failing_lint)
+    results = linter_module._lint_batch([broken, undefined])
+    assert [r.file for r in results] == [undefined]
@@ -1,4 +1,5 @@
-from openhands_aci.linter import DefaultLinter, LintResult
+from openhands_aci.linter import DefaultLinter, LintResult, LintResultCache
+from openhands_aci.linter.impl import python
 from openhands_aci.linter.impl.python import (
     PythonLinter,
     flake_lint,
@@ -82,3 +83,94 @@ def test_simple_correct_py_func_def(simple_correct_py_func_def):
     # Test python_compile_lint
     compile_result = python_compile_lint(simple_correct_py_func_def)
     assert compile_result == []
+
+
+def test_lint_text_matches_lint(tmp_path):
+    code = 'def foo():\n    return UNDEFINED\n\n\nx = other  # noqa\n'
+    file_path = tmp_path / 'test_file.py'
+    file_path.write_text(code)
+
+    linter = PythonLinter()
+    result = linter.lint(str(file_path))
+    assert result == [
+        LintResult(
+            file=str(file_path),
+            line=2,
+            column=12,
+            message="F821 undefined name 'UNDEFINED'",
+        )
+    ]
+    # The text is linted without being written anywhere
+    missing_path = str(tmp_path / 'missing' / 'test_file.py')
+    assert linter.lint_text(missing_path, code) == [
+        r.model_copy(update={'file': missing_path}) for r in result
+    ]
+    assert DefaultLinter().lint_text(str(file_path), code) == result
+
+
+def test_lint_text_diff(tmp_path):
+    file_path = str(tmp_path / 'test_file.py')
+    old = 'x = UNDEFINED\n'
+    new = 'x = UNDEFINED\ny = ANOTHER\n'
+    result = DefaultLinter().lint_text_diff(file_path, old, new)
+    assert result == [
+        LintResult(
+            file=file_path, line=2, column=5, message="F821 undefined name 'ANOTHER'"
+        )
+    ]
+
+
+def test_lint_results_are_cached(tmp_path, monkeypatch):
+    calls: list[str] = []
+    lint_text = PythonLinter.lint_text
+
+    def counting_lint_text(self, file_path, text):
+        calls.append(text)
+        return lint_text(self, file_path, text)
+
+    monkeypatch.setattr(PythonLinter, 'lint_text', counting_lint_text)
+    cache = LintResultCache(max_entries=2)
+    file_path = str(tmp_path / 'test_file.py')
+    first = 'x = UNDEFINED\n'
+    second = 'x = UNDEFINED\ny = ANOTHER\n'
+    third = 'x = UNDEFINED\ny = ANOTHER\nz = THIRD\n'
+
+    linter = DefaultLinter(cache=cache)
+    linter.lint_text_diff(file_path, first, second)
+    assert calls == [first, second]
+    # Only the new content of the next edit is linted
+    result = linter.lint_text_diff(file_path, second, third)
+    assert calls == [first, second, third]
+    assert [r.message for r in result] == ["F821 undefined name 'THIRD'"]
+
+    # The cache is shared between linters, and results get the path they are for
+    other_path = str(tmp_path / 'other_file.py')
+    result = DefaultLinter(cache=cache).lint_text(other_path, third)
+    assert calls == [first, second, third]
+    assert {r.file for r in result} == {other_path}
+    assert cache.hits == 2
+
+    # The least recently used content is dropped
+    linter.lint_text(file_path, first)
+    assert calls == [first, second, third, first]
+
+
+def test_flake_lint_falls_back_to_command(tmp_path, monkeypatch):
+    code = 'def foo():\n    return UNDEFINED\n'
+    file_path = tmp_path / 'test_file.py'
+    file_path.write_text(code)
+    expected = flake_lint(str(file_path))
+    assert expected
+
+    def broken_run_flake8(filepath, code):
+        raise TypeError('flake8 internals changed')
+
+    monkeypatch.setattr(python, '_run_flake8', broken_run_flake8)
+    monkeypatch.setattr(python, '_flake8_in_process', True)
+    assert flake_lint(str(file_path)) == expected
+    assert not python._flake8_in_process
+    # The code is passed to the command on stdin
+    missing_path = str(tmp_path / 'missing' / 'test_file.py')
+    assert flake_lint(missing_path, code) == [
+        r.model_copy(update={'file': missing_path}) for r in expected
+    ]
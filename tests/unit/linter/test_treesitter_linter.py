@@ -1,3 +1,5 @@
+from tree_sitter import Parser
+
 from openhands_aci.linter import DefaultLinter, LintResult
 from openhands_aci.linter.impl.treesitter import TreesitterBasicLinter
 
@@ -111,3 +113,42 @@ def test_parenthesis_incorrect_ruby_file(parenthesis_incorrect_ruby_file):
     general_linter = DefaultLinter()
     general_result = general_linter.lint(parenthesis_incorrect_ruby_file)
     assert general_result == result
+
+
+def test_incremental_reparse_matches_full_parse(monkeypatch):
+    linter = TreesitterBasicLinter()
+    file_path = '/workspace/test_file.ts'
+    lines = [
+        f'export function f{i}(a: number): number {{\n  return a + {i};\n}}\n'
+        for i in range(200)
+    ]
+    assert linter.lint_text(file_path, ''.join(lines)) == []
+
+    old_trees = []
+    parse = Parser.parse
+
+    def recording_parse(self, source, old_tree=None):
+        old_trees.append(old_tree)
+        return (
+            parse(self, source) if old_tree is None else parse(self, source, old_tree)
+        )
+
+    monkeypatch.setattr(Parser, 'parse', recording_parse)
+
+    # An edit that keeps the file valid reuses the previous tree
+    lines[100] = 'export function f100(a: number): number {\n  return a * 2;\n}\n'
+    assert linter.lint_text(file_path, ''.join(lines)) == []
+    assert old_trees[-1] is not None
+
+    # An edit that breaks the file is reported like a fresh parse would
+    lines[150] = 'export function f150(a: number: number {\n  return a;\n}\n'
+    result = linter.lint_text(file_path, ''.join(lines))
+    assert old_trees[-1] is not None
+    assert result
+    assert result == TreesitterBasicLinter().lint_text(file_path, ''.join(lines))
+    assert all(r.line == 451 for r in result)
+
+    # A tree with errors is not reused, as its error recovery may differ
+    lines[150] = 'export function f150(a: number): number {\n  return a;\n}\n'
+    assert linter.lint_text(file_path, ''.join(lines)) == []
+    assert old_trees[-1] is None
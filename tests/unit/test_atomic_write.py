@@ -0,0 +1,128 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from openhands_aci.utils.atomic_write import atomic_write, replace_file
+
+
+def test_atomic_write_replaces_content_and_keeps_mode(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('old content')
+    test_file.chmod(0o640)
+    old_inode = test_file.stat().st_ino
+
+    atomic_write(test_file, 'new content')
+
+    assert test_file.read_text() == 'new content'
+    assert test_file.stat().st_mode & 0o777 == 0o640
+    # The file was replaced rather than rewritten
+    assert test_file.stat().st_ino != old_inode
+    assert os.listdir(tmp_path) == ['test.txt']
+
+
+def test_atomic_write_new_file_uses_umask(tmp_path):
+    old_umask = os.umask(0o027)
+    try:
+        atomic_write(tmp_path / 'new.txt', 'content', fsync='file+dir')
+    finally:
+        os.umask(old_umask)
+    assert (tmp_path / 'new.txt').read_text() == 'content'
+    assert (tmp_path / 'new.txt').stat().st_mode & 0o777 == 0o640
+
+
+def test_atomic_write_through_symlink(tmp_path):
+    target = tmp_path / 'target.txt'
+    target.write_text('old')
+    link = tmp_path / 'link.txt'
+    link.symlink_to(target)
+
+    atomic_write(link, 'new', fsync='file')
+
+    assert link.is_symlink()
+    assert target.read_text() == 'new'
+
+
+def test_atomic_write_keeps_hard_links(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('old')
+    other_link = tmp_path / 'other.txt'
+    os.link(test_file, other_link)
+
+    atomic_write(test_file, 'new')
+
+    assert other_link.read_text() == 'new'
+
+
+def test_atomic_write_falls_back_to_in_place_write(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('old')
+    old_inode = test_file.stat().st_ino
+
+    with patch('tempfile.mkstemp', side_effect=PermissionError('read-only dir')):
+        atomic_write(test_file, 'new')
+
+    assert test_file.read_text() == 'new'
+    assert test_file.stat().st_ino == old_inode
+
+
+def test_atomic_write_refuses_read_only_file(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('old')
+    test_file.chmod(0o444)
+
+    # The tests may run as root, who can write any file
+    with patch('os.access', return_value=False) as access:
+        with pytest.raises(PermissionError):
+            atomic_write(test_file, 'new')
+    access.assert_called_once_with(str(test_file), os.W_OK)
+
+    assert test_file.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['test.txt']
+
+
+def test_atomic_write_failure_leaves_file_untouched(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('old content')
+
+    with pytest.raises(UnicodeEncodeError):
+        atomic_write(test_file, 'new content ü', encoding='ascii')
+
+    assert test_file.read_text() == 'old content'
+    assert os.listdir(tmp_path) == ['test.txt']
+
+
+def test_atomic_write_rejects_unknown_fsync_policy(tmp_path):
+    with pytest.raises(ValueError):
+        atomic_write(tmp_path / 'test.txt', 'content', fsync='always')  # type: ignore[arg-type]
+
+
+def test_replace_file_keeps_mode_and_owner(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('old')
+    test_file.chmod(0o640)
+    if os.geteuid() == 0:
+        os.chown(test_file, 1234, 1234)
+    source = tmp_path / 'source.txt'
+    source.write_text('new')
+
+    assert replace_file(source, test_file)
+
+    assert test_file.read_text() == 'new'
+    assert not source.exists()
+    assert test_file.stat().st_mode & 0o777 == 0o640
+    if os.geteuid() == 0:
+        assert (test_file.stat().st_uid, test_file.stat().st_gid) == (1234, 1234)
+
+
+def test_replace_file_leaves_hard_linked_files(tmp_path):
+    test_file = tmp_path / 'test.txt'
+    test_file.write_text('old')
+    os.link(test_file, tmp_path / 'other.txt')
+    source = tmp_path / 'source.txt'
+    source.write_text('new')
+
+    assert not replace_file(source, test_file)
+
+    assert test_file.read_text() == 'old'
+    assert source.read_text() == 'new'
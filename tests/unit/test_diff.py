@@ -0,0 +1,109 @@
+import random
+
+from openhands_aci.utils.diff import (
+    _HISTOGRAM_MAX_OCCURRENCES,
+    _find_anchor,
+    common_prefix_length,
+    get_line_map,
+    get_opcodes,
+    get_unified_diff,
+)
+
+
+def apply_opcodes(old_lines, new_lines, opcodes):
+    """Rebuild the new lines from the old ones, checking that the opcodes are valid."""
+    result = []
+    position = (0, 0)
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == position
+        if tag == 'equal':
+            assert old_lines[i1:i2] == new_lines[j1:j2]
+            result.extend(old_lines[i1:i2])
+        else:
+            result.extend(new_lines[j1:j2])
+        position = (i2, j2)
+    assert position == (len(old_lines), len(new_lines))
+    return result
+
+
+def test_get_opcodes_rebuilds_new_lines():
+    rng = random.Random(0)
+    vocabulary = ['', '{', '}', 'return x;', 'a', 'b', 'c', 'def f():']
+    for _ in range(500):
+        old_lines = [rng.choice(vocabulary) for _ in range(rng.randrange(30))]
+        new_lines = list(old_lines)
+        for _ in range(rng.randrange(5)):
+            index = rng.randrange(len(new_lines) + 1)
+            if rng.random() < 0.5 or not new_lines:
+                new_lines.insert(index, rng.choice(vocabulary + ['new']))
+            else:
+                del new_lines[min(index, len(new_lines) - 1)]
+        opcodes = get_opcodes(old_lines, new_lines)
+        assert apply_opcodes(old_lines, new_lines, opcodes) == new_lines
+
+
+def test_get_opcodes_aligns_rare_lines():
+    old_lines = ['def a():', '    pass', '', 'def b():', '    pass', '']
+    new_lines = ['def a():', '    pass', '', 'def c():', '    pass', '']
+    new_lines += old_lines[3:]
+    # The added function is reported as one insert, not mixed with `b`
+    assert get_opcodes(old_lines, new_lines) == [
+        ('equal', 0, 3, 0, 3),
+        ('insert', 3, 3, 3, 6),
+        ('equal', 3, 6, 6, 9),
+    ]
+
+
+def test_find_anchor_skips_lines_that_are_too_common():
+    for count in (_HISTOGRAM_MAX_OCCURRENCES, _HISTOGRAM_MAX_OCCURRENCES + 1):
+        a = [0, 1] * count
+        b = [1, 2]
+        anchor = _find_anchor(a, b, 0, len(a), 0, len(b))
+        if count <= _HISTOGRAM_MAX_OCCURRENCES:
+            assert anchor == (1, 0, 1)
+        else:
+            assert anchor is None
+
+
+def test_common_prefix_length():
+    text = 'x' * 200_000
+    assert common_prefix_length(text, text) == len(text)
+    assert common_prefix_length(text + 'a', text + 'b') == len(text)
+    assert common_prefix_length('a' + text, 'b' + text, from_end=True) == len(text)
+    assert common_prefix_length('abc', 'abd') == 2
+    assert common_prefix_length('', 'abc') == 0
+
+
+def test_get_line_map():
+    old_lines = ['a', 'b', 'c', 'd']
+    new_lines = ['a', 'x', 'c', 'd', 'e']
+    assert get_line_map(get_opcodes(old_lines, new_lines)) == {0: 0, 2: 2, 3: 3}
+
+
+def test_get_unified_diff_of_large_file():
+    old_lines = [f'line {i}\n' for i in range(50_000)]
+    new_lines = list(old_lines)
+    new_lines[20_000] = 'changed\n'
+    del new_lines[30_000]
+    diff = get_unified_diff(''.join(old_lines), ''.join(new_lines), 'f.txt')
+    assert diff == (
+        '--- f.txt\n'
+        '+++ f.txt\n'
+        '@@ -19998,7 +19998,7 @@\n'
+        ' line 19997\n'
+        ' line 19998\n'
+        ' line 19999\n'
+        '-line 20000\n'
+        '+changed\n'
+        ' line 20001\n'
+        ' line 20002\n'
+        ' line 20003\n'
+        '@@ -29998,7 +29998,6 @@\n'
+        ' line 29997\n'
+        ' line 29998\n'
+        ' line 29999\n'
+        '-line 30000\n'
+        ' line 30001\n'
+        ' line 30002\n'
+        ' line 30003\n'
+    )
@@ -1,8 +1,12 @@
 """Tests for file history management."""
 
+import os
+import shutil
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from openhands_aci.editor import history
 from openhands_aci.editor.history import FileHistoryManager
 
 
@@ -140,3 +144,276 @@ def test_pop_last_history_removes_entry():
         # Try to pop last history when there are no entries
         last_entry = manager.pop_last_history(path)
         assert last_entry is None
+
+
+def _versions(size: int = 200_000) -> list[str]:
+    """Versions of a file, each with one small edit to the previous one."""
+    lines = [f'line {i}: {"x" * (i % 50)}\n' for i in range(size // 30)]
+    versions = [''.join(lines)]
+    for i, position in enumerate([0, len(lines) // 2, len(lines) - 1, 10, 10]):
+        lines.insert(position, f'edit {i}\n')
+        versions.append(''.join(lines))
+    versions.append('')
+    versions.append('short\n')
+    return versions
+
+
+def _directory_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def test_history_rebuilds_every_version():
+    """Test that versions stored as chunks and deltas are rebuilt exactly."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'test.txt'
+        manager = FileHistoryManager(
+            max_history_per_file=10, history_dir=Path(temp_dir) / 'history'
+        )
+        versions = _versions()
+        for version in versions:
+            manager.add_history(path, version)
+
+        assert manager.get_all_history(path) == versions
+        for version in reversed(versions):
+            assert manager.pop_last_history(path) == version
+        assert manager.pop_last_history(path) is None
+
+        # No chunks are left behind
+        chunks_dir = Path(temp_dir) / 'history' / 'chunks'
+        assert list(chunks_dir.rglob('*.json')) == []
+        assert [p for p in (chunks_dir / 'blobs').rglob('*') if p.is_file()] == []
+
+
+def test_history_storage_grows_with_the_change():
+    """Test that a small edit to a large file stores little data."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'test.txt'
+        history_dir = Path(temp_dir) / 'history'
+        manager = FileHistoryManager(max_history_per_file=10, history_dir=history_dir)
+        original = ''.join(f'some line {i}\n' for i in range(200_000))
+        content = original
+        manager.add_history(path, content)
+        size = _directory_size(history_dir)
+
+        for i in range(5):
+            offset = 500_000 * (i + 1)
+            content = content[:offset] + f'inserted {i}\n' + content[offset:]
+            manager.add_history(path, content)
+        # Far less than a copy of the file per edit
+        assert _directory_size(history_dir) - size < len(content) // 10
+
+        for _ in range(5):
+            manager.pop_last_history(path)
+        assert manager.pop_last_history(path) == original
+
+
+def test_history_is_compressed_and_shared():
+    """Test that history is stored as compressed blobs shared between entries and files."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        history_dir = Path(temp_dir) / 'history'
+        manager = FileHistoryManager(max_history_per_file=10, history_dir=history_dir)
+        versions = _versions()
+        for version in versions:
+            manager.add_history(Path(temp_dir) / 'test.txt', version)
+        size = _directory_size(history_dir)
+        assert size < sum(len(version) for version in versions) // 10
+
+        # Copies of a file store no more blobs, only the records that refer to them
+        manager.add_history(Path(temp_dir) / 'copy0.txt', versions[0])
+        blobs = sorted((history_dir / 'chunks' / 'blobs').rglob('*'))
+        size = _directory_size(history_dir)
+        for i in range(1, 3):
+            manager.add_history(Path(temp_dir) / f'copy{i}.txt', versions[0])
+        assert sorted((history_dir / 'chunks' / 'blobs').rglob('*')) == blobs
+        assert _directory_size(history_dir) - size < len(versions[0]) // 10
+        assert manager.get_all_history(Path(temp_dir) / 'test.txt') == versions
+        assert manager.get_all_history(Path(temp_dir) / 'copy2.txt') == versions[:1]
+
+
+def test_history_trimming_removes_unused_chunks():
+    """Test that dropping and clearing entries removes their data."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'test.txt'
+        history_dir = Path(temp_dir) / 'history'
+        manager = FileHistoryManager(max_history_per_file=2, history_dir=history_dir)
+        versions = _versions()
+        for version in versions:
+            manager.add_history(path, version)
+        assert manager.get_all_history(path) == versions[-2:]
+
+        manager.clear_history(path)
+        assert manager.get_all_history(path) == []
+        chunks_dir = history_dir / 'chunks'
+        assert list(chunks_dir.rglob('*.json')) == []
+        assert [p for p in (chunks_dir / 'blobs').rglob('*') if p.is_file()] == []
+
+
+def test_history_reads_full_copies():
+    """Test that entries stored as full copies by earlier versions can still be read."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'test.txt'
+        manager = FileHistoryManager(history_dir=Path(temp_dir))
+        manager.cache.set(f'{path}.0', 'old content')
+        manager.cache.set(f'{path}.metadata', {'entries': [0], 'counter': 1})
+
+        manager.add_history(path, 'new content')
+        assert manager.get_all_history(path) == ['old content', 'new content']
+        assert manager.pop_last_history(path) == 'new content'
+        assert manager.pop_last_history(path) == 'old content'
+
+
+def test_history_total_size_limit():
+    """Test that the oldest entries of the least recently edited files are dropped first."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = FileHistoryManager(
+            max_history_per_file=10,
+            history_dir=Path(temp_dir),
+            max_total_size=25_000,
+        )
+        path1 = Path(temp_dir) / 'file1.txt'
+        path2 = Path(temp_dir) / 'file2.txt'
+        versions = [
+            ''.join(f'version {i} line {j}\n' for j in range(2_000)) for i in range(3)
+        ]
+        for version in versions:
+            manager.add_history(path1, version)
+        assert manager.get_all_history(path1) == versions
+
+        content2 = ''.join(f'other line {j}\n' for j in range(6_000))
+        manager.add_history(path2, content2)
+        assert manager.cache.current_size + manager._chunks.current_size <= 25_000
+        # The file that was just edited keeps its entry
+        assert manager.get_all_history(path2) == [content2]
+        # Only the oldest entry of the other file had to be dropped
+        assert manager.get_all_history(path1) == versions[1:]
+
+
+def _edit_files(history_dir, worker, edits):
+    manager = FileHistoryManager(max_history_per_file=100, history_dir=history_dir)
+    shared = Path(history_dir) / 'shared.txt'
+    own = Path(history_dir) / f'own{worker}.txt'
+    for i in range(edits):
+        manager.add_history(shared, f'worker {worker} edit {i}\n' * 200)
+        manager.add_history(own, f'edit {i}\n' * 200)
+    assert manager.pop_last_history(own) == f'edit {edits - 1}\n' * 200
+
+
+def test_history_shared_between_processes():
+    """Test that managers in several processes keep the history of every file."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with ProcessPoolExecutor(4) as executor:
+            futures = [executor.submit(_edit_files, temp_dir, w, 20) for w in range(4)]
+            for future in futures:
+                future.result()
+
+        manager = FileHistoryManager(max_history_per_file=100, history_dir=temp_dir)
+        for worker in range(4):
+            own = Path(temp_dir) / f'own{worker}.txt'
+            assert manager.get_all_history(own) == [
+                f'edit {i}\n' * 200 for i in range(19)
+            ]
+        shared = manager.get_all_history(Path(temp_dir) / 'shared.txt')
+        assert len(shared) == 80
+        assert manager.get_metadata(Path(temp_dir) / 'shared.txt')['counter'] == 80
+        for worker in range(4):
+            # The edits of each worker are in order
+            edits = [text for text in shared if text.startswith(f'worker {worker} ')]
+            assert edits == [f'worker {worker} edit {i}\n' * 200 for i in range(20)]
+
+
+def _copy_file(source, destination):
+    # Stands in for a reflink, which the filesystem of the tests may not support
+    shutil.copy(source, destination)
+    return True
+
+
+def test_history_snapshots(monkeypatch):
+    """Test that snapshots taken before edits are kept and moved back on undo."""
+    monkeypatch.setattr(history, 'supports_reflink', lambda directory: True)
+    monkeypatch.setattr(history, 'clone_file', _copy_file)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'test.txt'
+        manager = FileHistoryManager(history_dir=Path(temp_dir) / 'history')
+        assert manager.supports_snapshots
+        path.write_bytes(b'first\r\n')
+        manager.add_history(path, 'first\n', manager.take_snapshot(path))
+        path.write_bytes(b'second\r\n')
+        manager.add_history(path, 'second\n')
+        path.write_bytes(b'third\r\n')
+        manager.add_history(path, 'third\n', manager.take_snapshot(path))
+        path.write_bytes(b'fourth\r\n')
+        assert manager.get_all_history(path) == ['first\n', 'second\n', 'third\n']
+
+        # The last entry is a snapshot, which replaces the file
+        assert manager.restore_snapshot(path) == 'third\n'
+        assert path.read_bytes() == b'third\r\n'
+        # The next one is not, so it is popped as usual
+        assert manager.restore_snapshot(path) is None
+        assert manager.pop_last_history(path) == 'second\n'
+        assert manager.get_all_history(path) == ['first\n']
+
+        manager.clear_history(path)
+        assert list(manager._snapshots_dir.iterdir()) == []
+
+
+def test_history_snapshot_restore_keeps_file_metadata(monkeypatch):
+    """Test that undoing to a snapshot keeps the mode and hard links of the file."""
+    monkeypatch.setattr(history, 'supports_reflink', lambda directory: True)
+    monkeypatch.setattr(history, 'clone_file', _copy_file)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'test.txt'
+        manager = FileHistoryManager(history_dir=Path(temp_dir) / 'history')
+        path.write_text('first\n')
+        path.chmod(0o640)
+        manager.add_history(path, 'first\n', manager.take_snapshot(path))
+        path.write_text('second\n')
+        assert manager.restore_snapshot(path) == 'first\n'
+        assert path.read_text() == 'first\n'
+        assert path.stat().st_mode & 0o777 == 0o640
+
+        # A file with other hard links is left to be rewritten in place
+        other_link = Path(temp_dir) / 'other.txt'
+        os.link(path, other_link)
+        manager.add_history(path, 'first\n', manager.take_snapshot(path))
+        path.write_text('second\n')
+        assert manager.restore_snapshot(path) is None
+        assert manager.pop_last_history(path) == 'first\n'
+        assert list(manager._snapshots_dir.iterdir()) == []
+
+
+def test_history_chunks_shared_across_a_snapshot(monkeypatch):
+    """Test that chunks listed by two entries are kept until neither uses them."""
+    monkeypatch.setattr(history, 'supports_reflink', lambda directory: True)
+    monkeypatch.setattr(history, 'clone_file', _copy_file)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'test.txt'
+        manager = FileHistoryManager(history_dir=Path(temp_dir) / 'history')
+        content = 'line\n' * 20_000
+        path.write_text(content)
+        manager.add_history(path, content)
+        manager.add_history(path, content, manager.take_snapshot(path))
+        # Stored as the same chunks as the first entry
+        manager.add_history(path, content)
+
+        assert manager.pop_last_history(path) == content
+        assert manager.restore_snapshot(path) == content
+        assert manager.pop_last_history(path) == content
+        assert manager.pop_last_history(path) is None
+        assert len(manager._chunks) == 0
+
+
+def test_history_without_snapshot_support(monkeypatch):
+    """Test that no snapshots are taken where files can not be cloned."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / 'test.txt'
+        path.write_text('content')
+        monkeypatch.setattr(history, 'supports_reflink', lambda directory: False)
+        manager = FileHistoryManager(history_dir=Path(temp_dir) / 'history')
+        assert manager.take_snapshot(path) is None
+
+        # e.g. the file is on another filesystem than the history
+        monkeypatch.setattr(history, 'supports_reflink', lambda directory: True)
+        monkeypatch.setattr(history, 'clone_file', lambda source, destination: False)
+        manager = FileHistoryManager(history_dir=Path(temp_dir) / 'history')
+        assert manager.take_snapshot(path) is None
+        assert manager.take_snapshot(Path(temp_dir) / 'missing.txt') is None
@@ -1,6 +1,13 @@
+import json
+
 from openhands_aci.editor.config import MAX_RESPONSE_LEN_CHAR
 from openhands_aci.editor.prompts import CONTENT_TRUNCATED_NOTICE
-from openhands_aci.editor.results import ToolResult, maybe_truncate
+from openhands_aci.editor.results import (
+    CLIResult,
+    ToolResult,
+    hash_content,
+    maybe_truncate,
+)
 
 
 def test_tool_result_bool():
@@ -41,3 +48,66 @@ def test_maybe_truncate_no_limit():
     content = 'Content that exceeds the default max length'
     result = maybe_truncate(content, truncate_after=None)
     assert result == content  # No truncation applied when limit is None
+
+
+def test_cli_result_to_diff_result():
+    result = CLIResult(
+        output='edited',
+        path='/test.txt',
+        old_content='a\nb\nc\n',
+        new_content='a\nB\nc\n',
+    )
+    diff_result = result.to_diff_result()
+    assert diff_result.old_content is None
+    assert diff_result.new_content is None
+    assert (
+        diff_result.diff
+        == '--- /test.txt\n+++ /test.txt\n@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n'
+    )
+    assert diff_result.old_content_hash == hash_content('a\nb\nc\n')
+    assert diff_result.new_content_hash != diff_result.old_content_hash
+
+    # Results without content, like views, are left as they are
+    view_result = CLIResult(output='viewed', path='/test.txt')
+    assert view_result.to_diff_result() is view_result
+
+
+def test_diff_fields_are_only_serialized_for_diff_results():
+    result = CLIResult(output='edited', path='/test.txt', old_content='a\n')
+    # 'full' results keep the keys they always had
+    assert list(result.to_dict()) == [
+        'output',
+        'error',
+        'path',
+        'prev_exist',
+        'old_content',
+        'new_content',
+    ]
+    assert json.loads(''.join(result.iter_json())) == result.to_dict()
+
+    diff_result = result.to_diff_result()
+    assert {'diff', 'old_content_hash', 'new_content_hash'} <= set(
+        diff_result.to_dict()
+    )
+    assert json.loads(''.join(diff_result.iter_json())) == diff_result.to_dict()
+
+
+def test_iter_json_matches_json_dumps(monkeypatch):
+    # Escape strings in small chunks to exercise the chunk boundaries
+    monkeypatch.setattr('openhands_aci.editor.results.JSON_CHUNK_SIZE', 3)
+    result = CLIResult(
+        output='line 1\n"quoted"\ttab \\ ünïcode 😀 \x00',
+        path='/test.txt',
+        prev_exist=False,
+        new_content='',
+    )
+    serialized = ''.join(result.iter_json({'extra': [1, None]}))
+    assert json.loads(serialized) == result.to_dict({'extra': [1, None]})
+    assert serialized == (
+        '{'
+        + ','.join(
+            f'"{key}": {json.dumps(value)}'
+            for key, value in result.to_dict({'extra': [1, None]}).items()
+        )
+        + '}'
+    )